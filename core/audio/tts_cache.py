@@ -0,0 +1,230 @@
+# tts_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional
+
+from core.config.config import (
+    TTS_CACHE_ENABLED,
+    TTS_CACHE_DIR,
+    TTS_CACHE_MEMORY_MAX_BYTES,
+    TTS_CACHE_MEMORY_MAX_ENTRIES,
+    TTS_CACHE_DISK_MAX_BYTES,
+)
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def normalize_ssml(text: str) -> str:
+    """
+    ทำให้ SSML ที่พูดเหมือนกันได้ key เดียวกัน
+    - ตัดช่องว่างซ้ำ / ช่องว่างระหว่าง tag
+    - ใช้ double quote ใน attribute เสมอ (rate='108%' == rate="108%")
+    """
+    text = text.strip()
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r">\s+<", "><", text)
+    text = re.sub(r"=\s*'([^']*)'", r'="\1"', text)
+    return text
+
+
+def make_cache_key(text: str, voice: str, speaking_rate=None, pitch=None, encoding: str = "MP3", is_ssml: bool = True) -> str:
+    payload = json.dumps(
+        [normalize_ssml(text), is_ssml, voice, speaking_rate, pitch, encoding],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """
+    Cache เสียง TTS แบบ content-addressed (key = hash ของ SSML + voice + rate + pitch + encoding)
+    - tier 1: memory (LRU จำกัดทั้งจำนวน entry และจำนวน byte)
+    - tier 2: disk (ไฟล์ <key>.mp3, LRU จำกัดจำนวน byte) อยู่รอดข้ามการ restart
+    hit จาก disk จะถูกดึงขึ้น memory ด้วย
+    """
+
+    def __init__(
+        self,
+        disk_dir: Optional[str] = TTS_CACHE_DIR,
+        max_memory_bytes: int = TTS_CACHE_MEMORY_MAX_BYTES,
+        max_memory_entries: int = TTS_CACHE_MEMORY_MAX_ENTRIES,
+        max_disk_bytes: int = TTS_CACHE_DISK_MAX_BYTES,
+    ):
+        self.disk_dir = disk_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory = OrderedDict()  # key -> bytes
+        self._memory_bytes = 0
+        self._disk = OrderedDict()  # key -> size
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        entries = []
+        for filename in os.listdir(self.disk_dir):
+            if not filename.endswith(".mp3"):
+                continue
+            path = os.path.join(self.disk_dir, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, filename[:-4], stat.st_size))
+
+        # เก่าสุดอยู่หน้า (ถูก evict ก่อน)
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        logger.info(f"🗂️ TTS disk cache: {len(self._disk)} entries, {self._disk_bytes} bytes")
+        self._evict_disk()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.mp3")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return audio
+
+            if key not in self._disk:
+                self.misses += 1
+                return None
+
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                audio = f.read()
+        except OSError:
+            with self._lock:
+                self._drop_disk_entry(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self._put_memory(key, audio)
+        return audio
+
+    def put(self, key: str, audio: bytes):
+        with self._lock:
+            self._put_memory(key, audio)
+            if not self.disk_dir or key in self._disk or len(audio) > self.max_disk_bytes:
+                return
+
+        path = self._disk_path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(audio)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Failed to write TTS cache file: {e}")
+            return
+
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(audio)
+                self._disk_bytes += len(audio)
+            self._evict_disk()
+
+    def _put_memory(self, key: str, audio: bytes):
+        if len(audio) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory and (
+            len(self._memory) > self.max_memory_entries or self._memory_bytes > self.max_memory_bytes
+        ):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _evict_disk(self):
+        while self._disk and self._disk_bytes > self.max_disk_bytes:
+            key = next(iter(self._disk))
+            self._drop_disk_entry(key)
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+            self.evictions += 1
+
+    def _drop_disk_entry(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def get_or_synthesize(self, key: str, synthesize: Callable[[], bytes]) -> bytes:
+        audio = self.get(key)
+        if audio is None:
+            audio = synthesize()
+            self.put(key, audio)
+        return audio
+
+    def warm_up(self, phrases: Iterable[str], synthesize: Callable[[str], bytes], make_key: Callable[[str], str]) -> int:
+        """
+        สังเคราะห์ประโยคที่ใช้บ่อยเก็บไว้ล่วงหน้า (ข้ามอันที่อยู่ใน cache แล้ว) คืนจำนวนที่สังเคราะห์ใหม่
+        """
+        synthesized = 0
+        for phrase in phrases:
+            key = make_key(phrase)
+            with self._lock:
+                cached = key in self._memory or key in self._disk
+            if cached:
+                continue
+            try:
+                self.put(key, synthesize(phrase))
+                synthesized += 1
+            except Exception as e:
+                logger.warning(f"⚠️ TTS warm-up failed for '{phrase[:30]}': {e}")
+        logger.info(f"🔥 TTS cache warm-up done: {synthesized} new phrase(s)")
+        return synthesized
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+
+def load_warmup_phrases(path: str) -> list:
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Singleton instance for global use (None = ปิด cache)
+tts_cache = TTSCache() if TTS_CACHE_ENABLED else None
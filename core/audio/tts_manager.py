@@ -5,10 +5,38 @@ import os
 import platform
 import html
 import re
+import threading
 from core.utils.usage_tracker_instance import usage_tracker
- 
+from core.audio.tts_cache import tts_cache, make_cache_key
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_tts_client() -> texttospeech.TextToSpeechClient:
+    """
+    TextToSpeechClient ตัวเดียวใช้ร่วมกันทั้ง process
+    (สร้าง gRPC channel + โหลด credential ครั้งเดียว client เป็น thread-safe)
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = texttospeech.TextToSpeechClient()
+                logger.info("🔌 TextToSpeechClient created")
+    return _client
+
 class TTSManager:
-    def __init__(self):
+    LANGUAGE_CODE = "th-TH"
+    VOICE_GENDER = "FEMALE"
+    SPEAKING_RATE = 0.75
+    PITCH = 1.0
+    AUDIO_ENCODING = "MP3"
+
+    def __init__(self, cache=tts_cache):
+        self.cache = cache
 
         system = platform.system()
         if system == "Linux" and os.path.exists("/dev/shm"):
@@ -123,7 +151,57 @@ class TTSManager:
         return text
 
     def synthesize(self, text: str, is_ssml=False) -> str:
-        client = texttospeech.TextToSpeechClient()
+        audio_content = self.synthesize_bytes(text, is_ssml=is_ssml)
+
+        filename = os.path.join(self.output_dir, f"tts_{uuid.uuid4()}.mp3")
+        with open(filename, "wb") as out:
+            out.write(audio_content)
+
+        return filename  # return path to mp3
+
+    def cache_key(self, text: str, is_ssml=False) -> str:
+        return make_cache_key(
+            text,
+            voice=f"{self.LANGUAGE_CODE}/{self.VOICE_GENDER}",
+            speaking_rate=self.SPEAKING_RATE,
+            pitch=self.PITCH,
+            encoding=self.AUDIO_ENCODING,
+            is_ssml=is_ssml,
+        )
+
+    def synthesize_bytes(self, text: str, is_ssml=False) -> bytes:
+        """
+        สังเคราะห์เสียงแล้วคืน MP3 เป็น bytes (ไม่เขียนไฟล์)
+        ข้อความที่เคยสังเคราะห์แล้วจะดึงจาก tts_cache แทนการเรียก Google TTS ซ้ำ
+        """
+        if self.cache is None:
+            return self._synthesize_remote(text, is_ssml)
+
+        key = self.cache_key(text, is_ssml)
+        audio = self.cache.get(key)
+        if audio is not None:
+            logger.debug(f"🎯 TTS cache hit: {key[:12]}")
+            return audio
+
+        audio = self._synthesize_remote(text, is_ssml)
+        self.cache.put(key, audio)
+        return audio
+
+    def warm_up_cache(self, phrases: list) -> int:
+        """
+        สังเคราะห์ประโยคที่ใช้บ่อยเก็บลง cache ล่วงหน้า (SSML ต้องขึ้นต้นด้วย <speak>)
+        """
+        if self.cache is None or not phrases:
+            return 0
+        is_ssml = lambda phrase: phrase.strip().startswith("<speak>")
+        return self.cache.warm_up(
+            phrases,
+            synthesize=lambda phrase: self._synthesize_remote(phrase, is_ssml=is_ssml(phrase)),
+            make_key=lambda phrase: self.cache_key(phrase, is_ssml=is_ssml(phrase)),
+        )
+
+    def _synthesize_remote(self, text: str, is_ssml=False) -> bytes:
+        client = get_tts_client()
 
         if is_ssml:
             text = self.strip_unsupported_tags(text)
@@ -141,13 +219,13 @@ class TTSManager:
         # )
 
         voice = texttospeech.VoiceSelectionParams(
-            language_code="th-TH",
-            ssml_gender=texttospeech.SsmlVoiceGender.FEMALE
+            language_code=self.LANGUAGE_CODE,
+            ssml_gender=texttospeech.SsmlVoiceGender[self.VOICE_GENDER]
         )
         audio_config = texttospeech.AudioConfig(
-                audio_encoding=texttospeech.AudioEncoding.MP3,
-                speaking_rate=0.75,
-                pitch=1.0
+                audio_encoding=texttospeech.AudioEncoding[self.AUDIO_ENCODING],
+                speaking_rate=self.SPEAKING_RATE,
+                pitch=self.PITCH
             )        
 
         response = client.synthesize_speech(
@@ -156,11 +234,7 @@ class TTSManager:
             audio_config=audio_config
         )
 
-        filename = os.path.join(self.output_dir, f"tts_{uuid.uuid4()}.mp3")
-        with open(filename, "wb") as out:
-            out.write(response.audio_content)
-        
         #log tts usage
         usage_tracker.log_tts_usage(len(text), is_ssml=is_ssml)
 
-        return filename  # return path to mp3
\ No newline at end of file
+        return response.audio_content
\ No newline at end of file
@@ -0,0 +1,196 @@
+# tts_pipeline.py
+import asyncio
+import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Iterator, List
+
+from core.audio.tts_manager import TTSManager
+from core.config.config import TTS_PIPELINE_MAX_WORKERS, TTS_CHUNK_MIN_CHARS, TTS_CHUNK_MAX_CHARS
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+TAG_OR_TEXT = re.compile(r"<[^>]+>|[^<]+")
+TAG_NAME = re.compile(r"</?\s*([\w:-]+)")
+
+# จุดจบประโยค: เครื่องหมายวรรคตอน, ขึ้นบรรทัดใหม่ หรือคำลงท้ายภาษาไทยตามด้วยช่องว่าง
+THAI_ENDINGS = ["ค่ะ", "คะ", "ครับ", "นะ", "จ้ะ", "จ้า", "จ๊ะ"]
+SENTENCE_END = re.compile(
+    r"(?<=[.!?…])\s+|\n+|(?:" + "|".join(f"(?<={word})" for word in THAI_ENDINGS) + r")\s+"
+)
+
+# tag ที่ปิดแล้วถือว่าจบประโยค
+BLOCK_TAGS = {"s", "p"}
+
+
+class TTSPipeline:
+    """
+    แบ่งข้อความ / SSML เป็นประโยค แล้วสังเคราะห์เสียงแต่ละ chunk พร้อมกันด้วย worker pool จำกัดขนาด
+    ส่ง MP3 ออกไปตามลำดับ ทำให้ประโยคแรกเริ่มเล่นได้ขณะที่ประโยคถัดไปยังสังเคราะห์อยู่
+
+    - แต่ละ chunk เป็น SSML ที่สมบูรณ์ในตัว: ห่อด้วย <speak> และเปิด <prosody>/<emphasis>
+      ที่ค้างอยู่ใหม่ทุกครั้ง
+    - จำนวน chunk ที่สังเคราะห์ค้างอยู่ไม่เกิน max_workers (จำกัดทั้ง thread และหน่วยความจำ)
+    """
+
+    def __init__(
+        self,
+        tts_manager: TTSManager = None,
+        max_workers: int = TTS_PIPELINE_MAX_WORKERS,
+        min_chars: int = TTS_CHUNK_MIN_CHARS,
+        max_chars: int = TTS_CHUNK_MAX_CHARS,
+    ):
+        self.tts_manager = tts_manager or TTSManager()
+        self.max_workers = max_workers
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts-pipeline")
+
+    # ---------- Splitting ----------
+
+    def split(self, text: str, is_ssml: bool = False) -> List[str]:
+        if is_ssml:
+            return self.split_ssml(text)
+        return self.split_text(text)
+
+    def split_text(self, text: str) -> List[str]:
+        chunks = []
+        current = ""
+        for sentence in self._split_sentences(text):
+            current = f"{current} {sentence}" if current else sentence
+            if len(current) >= self.min_chars:
+                chunks.append(current)
+                current = ""
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def split_ssml(self, ssml: str) -> List[str]:
+        chunks = []
+        open_tags = []  # [(name, raw open tag)] ที่ยังไม่ถูกปิด (ไม่รวม <speak>)
+        parts = []
+        text_len = 0
+
+        def flush():
+            nonlocal parts, text_len
+            if text_len == 0:
+                return
+            closing = "".join(f"</{name}>" for name, _ in reversed(open_tags))
+            chunks.append(f"<speak>{''.join(parts)}{closing}</speak>")
+            parts = [raw for _, raw in open_tags]
+            text_len = 0
+
+        for token in TAG_OR_TEXT.findall(ssml):
+            if token.startswith("<"):
+                match = TAG_NAME.match(token)
+                name = match.group(1).lower() if match else ""
+                if name == "speak":
+                    continue
+                parts.append(token)
+                if token.startswith("</"):
+                    if open_tags and open_tags[-1][0] == name:
+                        open_tags.pop()
+                    if name in BLOCK_TAGS and text_len >= self.min_chars:
+                        flush()
+                elif token.endswith("/>"):
+                    if name == "break" and text_len >= self.min_chars:
+                        flush()
+                else:
+                    open_tags.append((name, token))
+                continue
+
+            sentences = self._split_sentences(token, keep_space=True)
+            for i, sentence in enumerate(sentences):
+                parts.append(sentence)
+                text_len += len(sentence.strip())
+                is_last = i == len(sentences) - 1
+                if not is_last and text_len >= self.min_chars:
+                    flush()
+
+        flush()
+        return chunks
+
+    def _split_sentences(self, text: str, keep_space: bool = False) -> List[str]:
+        """
+        ตัดประโยค แล้วตัดซ้ำที่ช่องว่างถ้าประโยคยาวเกิน max_chars
+        keep_space=True จะเก็บช่องว่างระหว่างประโยคไว้ (ใช้กับ SSML เพื่อไม่ให้คำติดกัน)
+        """
+        pieces = []
+        last = 0
+        for match in SENTENCE_END.finditer(text):
+            end = match.end() if keep_space else match.start()
+            pieces.append(text[last:end])
+            last = match.end()
+        pieces.append(text[last:])
+
+        sentences = []
+        for piece in pieces:
+            while len(piece) > self.max_chars:
+                cut = piece.rfind(" ", 0, self.max_chars)
+                if cut <= 0:
+                    cut = self.max_chars
+                sentences.append(piece[:cut])
+                piece = piece[cut:] if keep_space else piece[cut:].lstrip()
+            sentences.append(piece)
+
+        if keep_space:
+            return [s for s in sentences if s]
+        return [s.strip() for s in sentences if s.strip()]
+
+    # ---------- Synthesis ----------
+
+    def _synthesize_chunk(self, index: int, chunk: str, is_ssml: bool) -> bytes:
+        start = time.perf_counter()
+        audio = self.tts_manager.synthesize_bytes(chunk, is_ssml=is_ssml)
+        logger.debug(f"🔊 TTS chunk {index} done in {time.perf_counter() - start:.2f}s ({len(chunk)} chars)")
+        return audio
+
+    def iter_audio(self, text: str, is_ssml: bool = False) -> Iterator[bytes]:
+        """
+        คืน MP3 ของแต่ละ chunk ตามลำดับ (แบบ sync สำหรับ thread ที่ไม่มี event loop)
+        """
+        chunks = self.split(text, is_ssml)
+        pending = deque()
+        next_index = 0
+        try:
+            while next_index < len(chunks) or pending:
+                while next_index < len(chunks) and len(pending) < self.max_workers:
+                    pending.append(self.executor.submit(self._synthesize_chunk, next_index, chunks[next_index], is_ssml))
+                    next_index += 1
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def stream_audio(self, text: str, is_ssml: bool = False) -> AsyncIterator[bytes]:
+        """
+        เหมือน iter_audio แต่เป็น async generator สำหรับ StreamingResponse
+        """
+        loop = asyncio.get_running_loop()
+        chunks = self.split(text, is_ssml)
+        logger.info(f"🔊 TTS pipeline: {len(chunks)} chunk(s)")
+        start = time.perf_counter()
+        pending = deque()
+        next_index = 0
+        sent = 0
+        try:
+            while next_index < len(chunks) or pending:
+                while next_index < len(chunks) and len(pending) < self.max_workers:
+                    pending.append(loop.run_in_executor(
+                        self.executor, self._synthesize_chunk, next_index, chunks[next_index], is_ssml
+                    ))
+                    next_index += 1
+                audio = await pending.popleft()
+                sent += 1
+                if sent == 1:
+                    logger.info(f"⏱️ First TTS chunk ready in {time.perf_counter() - start:.2f}s")
+                yield audio
+        finally:
+            # client ตัดการเชื่อมต่อกลางคัน → ยกเลิก chunk ที่ยังไม่เริ่ม
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -51,3 +51,15 @@ AVATAR_STATIC = "pingping_static_v3.png"
 AVATAR_ANIMATION = "pingping_animation_v3.gif"
 PROCESSING_SOUND_FILE="./core/audio/processing_sound.mp3"
 SESSION_ID = os.getenv("SESSION_ID", "rasp-pi-001")
+
+# ✅ TTS pipeline (sentence-chunked synthesis)
+TTS_PIPELINE_MAX_WORKERS = int(os.getenv("TTS_PIPELINE_MAX_WORKERS", "4"))
+TTS_CHUNK_MIN_CHARS = int(os.getenv("TTS_CHUNK_MIN_CHARS", "40"))
+TTS_CHUNK_MAX_CHARS = int(os.getenv("TTS_CHUNK_MAX_CHARS", "400"))
+
+# ✅ TTS cache (memory + disk, content-addressed)
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "cache/tts")
+TTS_CACHE_MEMORY_MAX_BYTES = int(os.getenv("TTS_CACHE_MEMORY_MAX_BYTES", str(32 * 1024 * 1024)))
+TTS_CACHE_MEMORY_MAX_ENTRIES = int(os.getenv("TTS_CACHE_MEMORY_MAX_ENTRIES", "500"))
+TTS_CACHE_DISK_MAX_BYTES = int(os.getenv("TTS_CACHE_DISK_MAX_BYTES", str(256 * 1024 * 1024)))
@@ -28,6 +28,14 @@ class UsageTracker:
             "is_ssml": is_ssml
         })
 
+    def log_cache_hit(self, source, intent=None, semantic=False):
+        self._write_log({
+            "type": "cache_hit",
+            "source": source,
+            "intent": intent,
+            "semantic": semantic
+        })
+
     def _write_log(self, entry):
         entry["timestamp"] = datetime.now().isoformat()
         with open(self.log_file, "a") as f:
@@ -41,7 +49,7 @@ class UsageTracker:
         with open(self.log_file) as f:
             logs = [json.loads(line) for line in f]
 
-        summary = defaultdict(lambda: {"gpt_tokens": 0, "tts_chars": 0})
+        summary = defaultdict(lambda: {"gpt_tokens": 0, "tts_chars": 0, "cache_hits": 0})
         for entry in logs:
             ts = datetime.fromisoformat(entry["timestamp"])
             if by == "day":
@@ -57,5 +65,7 @@ class UsageTracker:
                 summary[key]["gpt_tokens"] += entry.get("total_tokens", 0)
             elif entry["type"] == "tts":
                 summary[key]["tts_chars"] += entry.get("char_count", 0)
+            elif entry["type"] == "cache_hit":
+                summary[key]["cache_hits"] += 1
 
         return dict(summary)
\ No newline at end of file
@@ -1,17 +1,36 @@
+import asyncio
 from fastapi import FastAPI
 from server.routes import hana_routes, vera_routes, mira_routes, shared_routes
 from contextlib import asynccontextmanager
+from server.shared.llm_gateway import llm_gateway
+from server.shared.search_manager import close_search_http_client
+from server.config.config import TTS_WARMUP_FILE
+from server.vera.services.tts_module import warm_up_tts_cache
+from core.audio.tts_cache import load_warmup_phrases
 from core.utils.logger_config import get_logger
 
 logger = get_logger(__name__)
 
+def warm_up_tts():
+    # ประโยคตายตัวของ MIRA / VERA: cache ทั้งเสียงของ /speak (TTSManager) และของ VERA
+    try:
+        phrases = load_warmup_phrases(TTS_WARMUP_FILE)
+        shared_routes.tts_manager.warm_up_cache(phrases)
+        warm_up_tts_cache(phrases)
+    except Exception as e:
+        logger.warning(f"⚠️ TTS warm-up failed: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # ✅ startup
     logger.info("🚀 API Server starting...")
+    # warm-up ใน thread แยก ไม่ให้ startup ต้องรอ Google TTS
+    asyncio.get_running_loop().run_in_executor(None, warm_up_tts)
     yield
     # ✅ shutdown
     logger.info("🛑 API Server shutting down...")
+    await llm_gateway.aclose()
+    await close_search_http_client()
 
 app = FastAPI(lifespan=lifespan)
 
@@ -0,0 +1,147 @@
+# server/benchmarks/bench_memory_store.py
+"""
+วัด latency ของการอ่าน memory (get_recent_memories + get_latest_history_summary) ขณะที่ summarizer เขียนอยู่
+
+เทียบ
+- locked: แบบเดิม 1 connection + threading.Lock ครอบทุกคำสั่ง, rollback journal, ไม่มี index
+- wal:    MemoryManager ปัจจุบัน (WAL + index + read-only connection pool)
+
+    python -m server.benchmarks.bench_memory_store
+    python -m server.benchmarks.bench_memory_store --rows 50000 --readers 8 --seconds 5
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from server.shared.memory_manager import MemoryManager
+
+
+class LockedMemoryManager:
+    """MemoryManager แบบเดิม (เฉพาะ method ที่ benchmark ใช้) ไว้เป็น baseline"""
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS memory (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    is_summarized INTEGER DEFAULT 0,
+                    is_history INTEGER DEFAULT 0,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+
+    def _execute(self, sql, params=()):
+        with self.lock:
+            with self.conn:
+                return self.conn.execute(sql, params).fetchall()
+
+    def add_message(self, role, content, is_history=False):
+        self._execute('INSERT INTO memory (role, content, is_history) VALUES (?, ?, ?)', (role, content, int(is_history)))
+
+    def get_recent_memories(self, limit=5):
+        return self._execute('SELECT role, content FROM memory ORDER BY id DESC LIMIT ?', (limit,))
+
+    def get_unsummarized(self, limit=5):
+        rows = self._execute(
+            'SELECT id, role, content FROM memory WHERE is_summarized = 0 AND is_history = 0 ORDER BY id ASC LIMIT ?', (limit,)
+        )
+        return [{"id": row[0], "role": row[1], "content": row[2]} for row in rows]
+
+    def add_summary(self, summary):
+        self._execute('INSERT INTO memory (role, content, is_summarized, is_history) VALUES (?, ?, 1, 0)', ("summary", summary))
+
+    def mark_as_summarized(self, ids):
+        placeholders = ','.join(['?'] * len(ids))
+        self._execute(f'UPDATE memory SET is_summarized = 1 WHERE id IN ({placeholders})', ids)
+
+    def get_latest_history_summary(self):
+        rows = self._execute(
+            'SELECT content FROM memory WHERE is_history = 1 AND is_summarized = 1 ORDER BY timestamp DESC LIMIT 1'
+        )
+        return rows[0][0] if rows else ""
+
+    def close(self):
+        self.conn.close()
+
+
+def seed(db_path, rows):
+    """ข้อมูลตั้งต้น: บทสนทนาเก่าที่สรุปแล้วส่วนใหญ่ + history summary บางส่วน"""
+    conn = sqlite3.connect(db_path)
+    text = "ผู้ใช้ถามเรื่องอากาศวันนี้และตารางนัดหมายตอนบ่าย " * 4
+    with conn:
+        conn.executemany(
+            "INSERT INTO memory (role, content, is_summarized, is_history) VALUES (?, ?, ?, ?)",
+            (("user" if i % 2 else "assistant", text, int(i < rows * 0.9), int(i % 50 == 0)) for i in range(rows)),
+        )
+    conn.close()
+
+
+def summarizer_load(store, stop, batch):
+    """จำลอง summarizer + บทสนทนาใหม่: ดึงแถวค้างสรุป → mark → เพิ่ม summary วนไปเรื่อย ๆ"""
+    while not stop.is_set():
+        for _ in range(batch // 10):
+            store.add_message("user", "ข้อความใหม่ระหว่างทดสอบ")
+        pending = store.get_unsummarized(limit=batch)
+        if pending:
+            store.mark_as_summarized([row["id"] for row in pending])
+            store.add_summary("สรุปบทสนทนา " * 20)
+
+
+def reader(store, stop, samples):
+    while not stop.is_set():
+        start = time.perf_counter()
+        store.get_recent_memories(limit=5)
+        store.get_latest_history_summary()
+        samples.append(time.perf_counter() - start)
+        time.sleep(random.uniform(0, 0.002))
+
+
+def run(label, store, args):
+    stop = threading.Event()
+    samples = []
+    threads = [threading.Thread(target=summarizer_load, args=(store, stop, args.batch))]
+    threads += [threading.Thread(target=reader, args=(store, stop, samples)) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    ms = sorted(s * 1000 for s in samples)
+    pick = lambda q: ms[min(len(ms) - 1, int(len(ms) * q))]
+    print(
+        f"{label:>7}: reads={len(ms):6d}  p50={statistics.median(ms):7.3f} ms  p95={pick(0.95):7.3f} ms  "
+        f"p99={pick(0.99):7.3f} ms  max={ms[-1]:7.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory store read latency under summarizer load")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=200, help="rows summarized per summarizer round")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, factory in (("locked", LockedMemoryManager), ("wal", MemoryManager)):
+            db_path = os.path.join(tmp, f"{label}.db")
+            factory(db_path).close()  # สร้าง schema (และ index ของแบบ wal)
+            seed(db_path, args.rows)
+            store = factory(db_path)
+            run(label, store, args)
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
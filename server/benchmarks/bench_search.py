@@ -0,0 +1,126 @@
+# server/benchmarks/bench_search.py
+"""
+เทียบเวลา dual-language search แบบเดิม (ทีละขั้น) กับแบบ async (ไทย / แปล+อังกฤษ พร้อมกัน)
+
+ค่า default จำลอง latency ของ Serper และ GoogleTranslator (ไม่ยิง network):
+    python -m server.benchmarks.bench_search
+    python -m server.benchmarks.bench_search --serper-ms 600 --translate-ms 300 --runs 5
+
+--live ยิง Serper จริง (ต้องตั้ง SERPER_API_KEY):
+    python -m server.benchmarks.bench_search --live --query "ราคาทองวันนี้"
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from server.shared.search_manager import SearchManager, close_search_http_client
+
+
+class SimulatedSearchManager(SearchManager):
+    """
+    แทนที่เฉพาะ I/O ด้วย sleep ตาม latency ที่กำหนด ส่วน logic การรวม leg / deadline ใช้ของจริง
+    """
+
+    def __init__(self, serper_s: float, translate_s: float, slow_leg_s: float = 0.0):
+        super().__init__(gpt_client=None)
+        self.serper_s = serper_s
+        self.translate_s = translate_s
+        self.slow_leg_s = slow_leg_s
+
+    def detect_language(self, text):
+        return "th"
+
+    def _fake_results(self, query, top_k, lang_code):
+        return [{"link": f"https://example.com/{lang_code}/{i}", "title": query} for i in range(top_k)]
+
+    def translate_for_search(self, query, target_lang="en"):
+        time.sleep(self.translate_s)
+        return f"{query} (en)"
+
+    def search_serper(self, query, top_k=5, lang_code="th"):
+        time.sleep(self.serper_s + (self.slow_leg_s if lang_code == "en" else 0.0))
+        return self._fake_results(query, top_k, lang_code)
+
+    async def search_serper_async(self, query, top_k=5, lang_code="th"):
+        await asyncio.sleep(self.serper_s + (self.slow_leg_s if lang_code == "en" else 0.0))
+        return self._fake_results(query, top_k, lang_code)
+
+
+def _timed(fn, runs):
+    samples = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def _report(label, seconds, results):
+    print(f"  {label:<28} {seconds * 1000:8.1f} ms  ({len(results)} results)")
+
+
+def run_simulated(args):
+    serper_s = args.serper_ms / 1000
+    translate_s = args.translate_ms / 1000
+    timeout = args.leg_timeout_ms / 1000
+
+    print(f"Simulated: serper={args.serper_ms}ms translate={args.translate_ms}ms runs={args.runs}")
+    manager = SimulatedSearchManager(serper_s, translate_s)
+    seq_s, seq_results = _timed(lambda: manager.search_dual_language(args.query, top_k=args.top_k), args.runs)
+    async_s, async_results = _timed(
+        lambda: asyncio.run(manager.search_dual_language_async(args.query, top_k=args.top_k, timeout=timeout)),
+        args.runs,
+    )
+    _report("sequential", seq_s, seq_results)
+    _report("async (concurrent legs)", async_s, async_results)
+    print(f"  saved {(seq_s - async_s) * 1000:.1f} ms ({(1 - async_s / seq_s) * 100:.0f}%)")
+
+    print(f"\nSlow English leg (+{args.slow_leg_ms}ms, leg deadline={args.leg_timeout_ms}ms)")
+    slow = SimulatedSearchManager(serper_s, translate_s, slow_leg_s=args.slow_leg_ms / 1000)
+    seq_s, seq_results = _timed(lambda: slow.search_dual_language(args.query, top_k=args.top_k), args.runs)
+    async_s, async_results = _timed(
+        lambda: asyncio.run(slow.search_dual_language_async(args.query, top_k=args.top_k, timeout=timeout)),
+        args.runs,
+    )
+    _report("sequential", seq_s, seq_results)
+    _report("async (slow leg dropped)", async_s, async_results)
+
+
+async def _live_async(manager, args):
+    try:
+        return await manager.search_dual_language_async(args.query, top_k=args.top_k, timeout=args.leg_timeout_ms / 1000)
+    finally:
+        await close_search_http_client()
+
+
+def run_live(args):
+    manager = SearchManager(gpt_client=None)
+    print(f"Live Serper: query={args.query!r}")
+    seq_s, seq_results = _timed(lambda: manager.search_dual_language(args.query, top_k=args.top_k), 1)
+    async_s, async_results = _timed(lambda: asyncio.run(_live_async(manager, args)), 1)
+    _report("sequential", seq_s, seq_results)
+    _report("async (concurrent legs)", async_s, async_results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sequential vs async dual-language web search")
+    parser.add_argument("--query", default="ราคาทองวันนี้")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--serper-ms", type=int, default=450)
+    parser.add_argument("--translate-ms", type=int, default=250)
+    parser.add_argument("--slow-leg-ms", type=int, default=5000)
+    parser.add_argument("--leg-timeout-ms", type=int, default=1500)
+    parser.add_argument("--live", action="store_true", help="call the real Serper API instead of simulating")
+    args = parser.parse_args()
+
+    if args.live:
+        run_live(args)
+    else:
+        run_simulated(args)
+
+
+if __name__ == "__main__":
+    main()
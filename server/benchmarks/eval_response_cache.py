@@ -0,0 +1,38 @@
+# server/benchmarks/eval_response_cache.py
+"""
+ตรวจ semantic match ของ ResponseCache: คู่คำถามที่ควร hit (ถามซ้ำคนละแบบ) และที่ต้อง miss
+(ตัวเลขต่างกัน เช่น ลำดับ / วันที่ ทั้งที่ similarity สูงกว่า threshold)
+
+    python -m server.benchmarks.eval_response_cache
+"""
+import sys
+
+from server.shared.response_cache import ResponseCache, cosine, embed, normalize_question
+
+# (คำถามที่ cache ไว้, คำถามใหม่, ควร hit ไหม)
+CASES = [
+    ("ใครเป็นนายกรัฐมนตรีคนที่ 29", "ใครเป็นนายกรัฐมนตรีคนที่ 28", False),
+    ("ราคาทองวันที่ 12 ตุลาคม", "ราคาทองวันที่ 13 ตุลาคม", False),
+    ("ราคาทองวันที่ 12 ตุลาคม", "ราคาทองวันที่ ๑๒ ตุลาคม", True),
+    ("ใครเป็นนายกรัฐมนตรีคนที่ 29", "ใครเป็นนายกรัฐมนตรีคนที่ 29 ครับ", True),
+    ("ภูเขาที่สูงที่สุดในโลกคืออะไร", "ภูเขาที่สูงที่สุดในโลกคืออะไรคะ", True),
+    ("ภูเขาที่สูงที่สุดในโลกคืออะไร", "ผิงผิง ภูเขาที่สูงที่สุดในโลกคือ", True),
+]
+
+
+def main():
+    failures = 0
+    for cached, asked, expect_hit in CASES:
+        cache = ResponseCache(ttls={"default": 60})
+        cache.store(cached, "chat", "answer")
+        hit = cache.lookup(asked, "chat") is not None
+        similarity = cosine(embed(normalize_question(cached)), embed(normalize_question(asked)))
+        ok = hit == expect_hit
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} sim={similarity:.3f} hit={hit!s:5} expect={expect_hit!s:5} {cached} → {asked}")
+    print(f"\n{len(CASES) - failures}/{len(CASES)} passed")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
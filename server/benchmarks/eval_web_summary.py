@@ -0,0 +1,93 @@
+# server/benchmarks/eval_web_summary.py
+"""
+Offline eval ของการสรุปข้อมูลจากเว็บ: extractive (BM25 ในเครื่อง) เทียบกับ LLM (แบบเดิม)
+
+วัดต่อคำถามใน data/web_summary_eval.json
+- fact recall: สัดส่วนของข้อเท็จจริงที่ต้องใช้ตอบ (facts) ที่ยังอยู่ในข้อความที่สรุปแล้ว
+- tokens: ขนาดของ context ที่จะส่งต่อให้ LLM ตอบ
+- latency
+
+    python -m server.benchmarks.eval_web_summary
+    python -m server.benchmarks.eval_web_summary --budgets 120 60 30
+    python -m server.benchmarks.eval_web_summary --llm     # เทียบกับ LLM ด้วย (ต้องตั้ง OPENAI_API_KEY)
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from types import SimpleNamespace
+
+from server.shared.search_manager import SearchManager
+from server.shared.context_builder import token_counter
+
+DATA_FILE = os.path.join(os.path.dirname(__file__), "data", "web_summary_eval.json")
+
+
+def fact_recall(summary: str, facts: list) -> float:
+    if not facts:
+        return 1.0
+    return sum(1 for fact in facts if fact in summary) / len(facts)
+
+
+async def evaluate(manager: SearchManager, cases: list, mode: str, max_tokens: int = None) -> list:
+    rows = []
+    for case in cases:
+        context = manager.build_context_from_search_results(case["results"], enable_fetch=False)
+        start = time.perf_counter()
+        if mode == "extractive":
+            summary = manager.summarize_web_context_extractive(context, case["question"], max_tokens=max_tokens)
+        else:
+            summary = await manager.summarize_web_context_llm(context, case["question"])
+        elapsed = time.perf_counter() - start
+        rows.append({
+            "question": case["question"],
+            "recall": fact_recall(summary, case["facts"]),
+            "context_tokens": token_counter.count(context),
+            "summary_tokens": token_counter.count(summary),
+            "latency_ms": elapsed * 1000,
+        })
+    return rows
+
+
+def report(mode: str, rows: list):
+    print(f"\n== {mode} ==")
+    print(f"{'recall':>7} {'ctx tok':>8} {'sum tok':>8} {'ms':>9}  question")
+    for row in rows:
+        print(f"{row['recall']:7.2f} {row['context_tokens']:8d} {row['summary_tokens']:8d} {row['latency_ms']:9.2f}  {row['question']}")
+    print(
+        f"mean recall={statistics.mean(r['recall'] for r in rows):.2f}  "
+        f"mean summary tokens={statistics.mean(r['summary_tokens'] for r in rows):.0f}  "
+        f"p50 latency={statistics.median(r['latency_ms'] for r in rows):.2f} ms"
+    )
+
+
+async def main_async(args):
+    with open(args.data, "r", encoding="utf-8") as f:
+        cases = json.load(f)
+
+    gpt_client = None
+    if args.llm:
+        from server.config.config import SYSTEM_TONE
+        from server.shared.chat_manager import ChatManager
+        gpt_client = SimpleNamespace(chat_manager=ChatManager(SYSTEM_TONE))
+    manager = SearchManager(gpt_client)
+
+    report("extractive", await evaluate(manager, cases, "extractive"))
+    for budget in args.budgets:
+        report(f"extractive (max_tokens={budget})", await evaluate(manager, cases, "extractive", max_tokens=budget))
+    if args.llm:
+        report("llm", await evaluate(manager, cases, "llm"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare extractive vs LLM web-context summarization")
+    parser.add_argument("--data", default=DATA_FILE)
+    parser.add_argument("--budgets", type=int, nargs="*", default=[80, 50], help="extra extractive token budgets to try")
+    parser.add_argument("--llm", action="store_true", help="also run the LLM summarizer (needs OPENAI_API_KEY)")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
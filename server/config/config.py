@@ -18,6 +18,119 @@ SYSTEM_TONE = os.getenv("SYSTEM_TONE", "family")
 HA_URL = os.getenv("HA_URL", "http://192.168.100.101:8123")
 HA_TOKEN = os.getenv("HA_TOKEN", "")
 
+# ✅ LLM Gateway (shared AsyncOpenAI client for HANA / MIRA / VERA)
+# MAX_CONCURRENCY: request พร้อมกันทั้งหมด, ในนั้นกัน MAX_SYNC_CONCURRENCY ไว้ให้ chat_sync (background summarizer)
+#   ส่วนที่เหลือเป็นของ async chat / stream_chat
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_MAX_SYNC_CONCURRENCY = int(os.getenv("LLM_MAX_SYNC_CONCURRENCY", "2"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "16"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+# ✅ Web search (Serper): shared httpx pool + deadline ต่อ leg ของ dual-language search
+SEARCH_MAX_CONNECTIONS = int(os.getenv("SEARCH_MAX_CONNECTIONS", "10"))
+SEARCH_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("SEARCH_MAX_KEEPALIVE_CONNECTIONS", "5"))
+SEARCH_CONNECT_TIMEOUT = float(os.getenv("SEARCH_CONNECT_TIMEOUT", "3"))
+SEARCH_REQUEST_TIMEOUT = float(os.getenv("SEARCH_REQUEST_TIMEOUT", "8"))
+SEARCH_LEG_TIMEOUT = float(os.getenv("SEARCH_LEG_TIMEOUT", "4"))  # leg ที่ช้ากว่านี้ถูกทิ้ง
+WEB_FETCH_TIMEOUT = float(os.getenv("WEB_FETCH_TIMEOUT", "5"))
+WEB_FETCH_MAX_BYTES = int(os.getenv("WEB_FETCH_MAX_BYTES", str(1024 * 1024)))  # หยุดอ่านหน้าเว็บเมื่อเกินนี้
+WEB_EXTRACT_MAX_CHARS = int(os.getenv("WEB_EXTRACT_MAX_CHARS", "3000"))  # ข้อความจาก <p> ที่เก็บต่อหน้า
+
+# ✅ สรุปข้อมูลจากเว็บก่อนส่งให้ LLM ตอบ: "extractive" = BM25 ในเครื่อง, "llm" = ให้ LLM สรุป (แบบเดิม)
+WEB_SUMMARY_MODE = os.getenv("WEB_SUMMARY_MODE", "extractive").lower()
+WEB_SUMMARY_MAX_TOKENS = int(os.getenv("WEB_SUMMARY_MAX_TOKENS", "400"))
+
+# ✅ Search cache: query → organic results, URL → extracted text (TTL ของหน้าเว็บตาม domain)
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+SEARCH_CACHE_DB = os.getenv("SEARCH_CACHE_DB", "")  # ว่าง = memory อย่างเดียว, เช่น "cache/search_cache.db"
+SEARCH_CACHE_MAX_QUERIES = int(os.getenv("SEARCH_CACHE_MAX_QUERIES", "500"))
+SEARCH_CACHE_MAX_PAGES = int(os.getenv("SEARCH_CACHE_MAX_PAGES", "1000"))
+SEARCH_CACHE_MAX_PAGE_BYTES = int(os.getenv("SEARCH_CACHE_MAX_PAGE_BYTES", str(16 * 1024 * 1024)))
+SEARCH_CACHE_QUERY_TTL = float(os.getenv("SEARCH_CACHE_QUERY_TTL", str(10 * 60)))
+SEARCH_CACHE_PAGE_TTLS = {
+    "tmd.go.th": 10 * 60,
+    "siamsport.co.th": 15 * 60,
+    "bangkokbiznews.com": 30 * 60,
+    "wikipedia.org": 24 * 60 * 60,
+    "default": 60 * 60,
+}
+
+# ✅ Context budget (นับด้วย tokenizer ของ model ถ้ามี tiktoken)
+CONTEXT_TOKEN_CACHE_SIZE = int(os.getenv("CONTEXT_TOKEN_CACHE_SIZE", "4096"))
+HANA_CONTEXT_MAX_TOKENS = int(os.getenv("HANA_CONTEXT_MAX_TOKENS", "1500"))  # web + memory + history
+MIRA_CONTEXT_MAX_TOKENS = int(os.getenv("MIRA_CONTEXT_MAX_TOKENS", "6000"))  # ทั้ง prompt ที่ส่งให้ LLM
+MIRA_HISTORY_MAX_TOKENS = int(os.getenv("MIRA_HISTORY_MAX_TOKENS", "1500"))  # เกินนี้สรุป history
+VERA_CONTEXT_MAX_TOKENS = int(os.getenv("VERA_CONTEXT_MAX_TOKENS", "6000"))
+VERA_HISTORY_MAX_TOKENS = int(os.getenv("VERA_HISTORY_MAX_TOKENS", "3000"))
+
+# ✅ HANA turn planning: true = one structured-output call for intent + context needs
+#    false = legacy multi-call path (classify_intent → analyze_question_all_in_one)
+HANA_SINGLE_CALL_PLAN = os.getenv("HANA_SINGLE_CALL_PLAN", "true").lower() == "true"
+
+# ✅ HANA response cache (opt-in): TTL วินาที ตาม intent, "web_search" = คำตอบที่ต้องค้นเว็บ
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "256"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.88"))
+RESPONSE_CACHE_TTLS = {
+    "news_summary": 15 * 60,
+    "web_search": 30 * 60,
+    "chat": 6 * 60 * 60,
+    "default": 60 * 60,
+}
+
+# ✅ MIRA local intent pre-classifier (skip Tier-1 LLM call when confident)
+MIRA_PRECLASSIFIER_ENABLED = os.getenv("MIRA_PRECLASSIFIER_ENABLED", "true").lower() == "true"
+MIRA_PRECLASSIFIER_THRESHOLD = float(os.getenv("MIRA_PRECLASSIFIER_THRESHOLD", "0.8"))
+# intent_log.jsonl (คำพูดลูกค้า + intent จาก LLM) ใหญ่ถึง N byte → ย้ายเป็น intent_log.jsonl.1 (เก็บแค่ไฟล์เดียว), 0 = ไม่จำกัด
+MIRA_INTENT_LOG_MAX_BYTES = int(os.getenv("MIRA_INTENT_LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+
+# ✅ Long-term memory (memory.db แบบ WAL): จำนวน connection สำหรับอ่าน, เวลารอ lock ของ SQLite
+MEMORY_DB_PATH = os.getenv("MEMORY_DB_PATH", "memory.db")
+MEMORY_READ_POOL_SIZE = int(os.getenv("MEMORY_READ_POOL_SIZE", "4"))
+MEMORY_BUSY_TIMEOUT_MS = int(os.getenv("MEMORY_BUSY_TIMEOUT_MS", "5000"))
+# แยกความจำตามผู้พูด / session: ไฟล์ DB ของแต่ละ partition อยู่ใน PARTITION_DIR (partition "default" ใช้ MEMORY_DB_PATH)
+MEMORY_PARTITION_DIR = os.getenv("MEMORY_PARTITION_DIR", "memory")
+MEMORY_MAX_OPEN_PARTITIONS = int(os.getenv("MEMORY_MAX_OPEN_PARTITIONS", "16"))
+# recall: ความจำที่เกี่ยวกับคำถาม (FTS5 + embedding) ไม่เกิน K แถว / MAX_TOKENS
+#   MEMORY_EMBEDDING_MODEL: "" = n-gram hash ในเครื่อง, "none" = ปิด, อื่น ๆ = model ของ sentence-transformers
+MEMORY_RECALL_K = int(os.getenv("MEMORY_RECALL_K", "5"))
+MEMORY_RECALL_MAX_TOKENS = int(os.getenv("MEMORY_RECALL_MAX_TOKENS", "600"))
+MEMORY_EMBEDDING_MODEL = os.getenv("MEMORY_EMBEDDING_MODEL", "")
+# ความเกี่ยวข้องขั้นต่ำของแถวที่ recall คืน: cosine ของ embedding (ค่าตั้งต้นเหมาะกับ n-gram hash)
+#   หรือสัดส่วน token ของคำถามที่อยู่ในแถว เมื่อไม่มี embedding
+MEMORY_RECALL_MIN_SIMILARITY = float(os.getenv("MEMORY_RECALL_MIN_SIMILARITY", "0.25"))
+MEMORY_RECALL_MIN_OVERLAP = float(os.getenv("MEMORY_RECALL_MIN_OVERLAP", "0.5"))
+
+# ✅ Memory compaction: แถวที่สรุปแล้วเก่ากว่า ARCHIVE_AFTER_DAYS ย้ายไป memory_archive (เก็บดิบล่าสุด KEEP_RAW แถวไว้เสมอ)
+#   hot table ไม่เกิน MAX_ROWS แถว, summary ไม่เกิน MAX_SUMMARIES ต่อชนิด, คืนพื้นที่ทีละ VACUUM_PAGES หน้า
+MEMORY_HOT_KEEP_RAW = int(os.getenv("MEMORY_HOT_KEEP_RAW", "200"))
+MEMORY_HOT_MAX_ROWS = int(os.getenv("MEMORY_HOT_MAX_ROWS", "5000"))
+MEMORY_HOT_MAX_SUMMARIES = int(os.getenv("MEMORY_HOT_MAX_SUMMARIES", "500"))
+MEMORY_ARCHIVE_AFTER_DAYS = float(os.getenv("MEMORY_ARCHIVE_AFTER_DAYS", "7"))
+MEMORY_COMPACT_INTERVAL_SEC = float(os.getenv("MEMORY_COMPACT_INTERVAL_SEC", "21600"))
+MEMORY_VACUUM_PAGES = int(os.getenv("MEMORY_VACUUM_PAGES", "1000"))
+# ไฟล์ partition ของ session (MEMORY_PARTITION_DIR/session-*.db) ที่ไม่ได้ใช้นานเกิน N วันถูกลบตอน compaction
+#   (partition ของ speaker เป็นความจำระยะยาวของคนในบ้าน ไม่ลบ), 0 = ไม่ลบ
+MEMORY_SESSION_PARTITION_TTL_DAYS = float(os.getenv("MEMORY_SESSION_PARTITION_TTL_DAYS", "30"))
+
+# ✅ Background summarization: สรุปเมื่อมีข้อความค้างครบ N แถว / N token หรือค้างนานเกิน MAX_DELAY วินาที
+SUMMARY_TRIGGER_WRITES = int(os.getenv("SUMMARY_TRIGGER_WRITES", "10"))
+SUMMARY_TRIGGER_TOKENS = int(os.getenv("SUMMARY_TRIGGER_TOKENS", "800"))
+SUMMARY_MAX_DELAY_SEC = float(os.getenv("SUMMARY_MAX_DELAY_SEC", "300"))
+SUMMARY_BATCH_MAX_ROWS = int(os.getenv("SUMMARY_BATCH_MAX_ROWS", "50"))
+SUMMARY_BATCH_MAX_TOKENS = int(os.getenv("SUMMARY_BATCH_MAX_TOKENS", "3000"))
+SUMMARY_RETRY_SEC = float(os.getenv("SUMMARY_RETRY_SEC", "30"))
+
+# ✅ Menu index (MIRA / VERA): เช็คว่า menu.json ถูกแก้ไม่เกินทุกกี่วินาที, คะแนนขั้นต่ำของ fuzzy match
+#    MENU_FUZZY_MARGIN: ผู้สมัครอันดับ 1 ต้องคะแนนนำอันดับ 2 อย่างน้อยเท่านี้ ไม่งั้นถือว่ากำกวม
+MENU_INDEX_RELOAD_INTERVAL = float(os.getenv("MENU_INDEX_RELOAD_INTERVAL", "2"))
+MENU_FUZZY_MIN_SCORE = float(os.getenv("MENU_FUZZY_MIN_SCORE", "0.7"))
+MENU_FUZZY_MARGIN = float(os.getenv("MENU_FUZZY_MARGIN", "0.05"))
+
 # ✅ Client Settings
 GPT_SERVER_ENDPOINT = os.getenv("GPT_SERVER_ENDPOINT", "http://192.168.100.101:8000/chat")
 TTS_SERVER_ENDPOINT = os.getenv("TTS_SERVER_ENDPOINT", "http://192.168.100.101:8000/chat")
@@ -25,7 +138,14 @@ os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = os.path.expanduser("~/Workspace/s
 
 TTS_PATH = os.getenv("TTS_PATH", ".")
 
+# ✅ Audio store for /speak/{tts_id} (MIRA / VERA)
+AUDIO_STORE_TTL_SECONDS = float(os.getenv("AUDIO_STORE_TTL_SECONDS", str(15 * 60)))
+AUDIO_STORE_MAX_BYTES = int(os.getenv("AUDIO_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+AUDIO_STORE_SPILL_DIR = os.getenv("AUDIO_STORE_SPILL_DIR", "")  # ว่าง = ไม่ spill ลง disk
+AUDIO_STORE_MAX_SPILL_BYTES = int(os.getenv("AUDIO_STORE_MAX_SPILL_BYTES", str(256 * 1024 * 1024)))
+
 TTS_PROVIDER="GoogleCloudTTS"
+TTS_WARMUP_FILE = os.getenv("TTS_WARMUP_FILE", "server/mira/data/tts_warmup.json")
 
 TUYA_ACCESS_ID = os.getenv("TUYA_ACCESS_ID", "")
 TUYA_ACCESS_KEY = os.getenv("TUYA_ACCESS_KEY", "")
@@ -1,6 +1,6 @@
 from server.mira.services.session_manager import session_manager
 from server.mira.models.order import OrderItem
-from server.mira.services.menu import lookup_price, validate_item
+from server.mira.services.menu import resolve_item, suggest_items
 from server.mira.models.response import AssistantResponse
 from core.utils.logger_config import get_logger
 
@@ -20,18 +20,22 @@ def handle_add_order(payload: dict, session_id: str) -> AssistantResponse:
         item_data = [item_data]
 
     added_items = []
+    suggestions = []
     for item in item_data:
         name = item.get("name")
         qty = item.get("qty", 1)
 
-        if not validate_item(name):
+        # จับคู่ชื่อในเครื่อง (รวมชื่อที่ ASR สะกดเพี้ยน) แทนการถาม LLM อีกรอบ
+        menu_item = resolve_item(name) if name else None
+        if menu_item is None:
             logger.warning(f"Invalid menu item: {name}")
+            if name:
+                suggestions.extend(suggest_items(name))
             continue
-
-        price = lookup_price(name)
-        if price is None:
-            logger.warning(f"Price not found for item: {name}")
-            continue
+        if menu_item["name"] != name:
+            logger.info(f"🔎 Resolved menu item: {name} → {menu_item['name']}")
+        name = menu_item["name"]
+        price = menu_item["price"]
 
         order_item = OrderItem(name=name, qty=qty, price=price)
         session_manager.add_order_item(session_id, order_item)
@@ -40,6 +44,12 @@ def handle_add_order(payload: dict, session_id: str) -> AssistantResponse:
         logger.info(f"✅ Order added: {order_item}")
 
     if not added_items:
+        if suggestions:
+            choices = " หรือ ".join(dict.fromkeys(suggestions))
+            return AssistantResponse(
+                intent="add_order",
+                response_ssml=f"<speak>หมายถึง {choices} หรือเปล่าคะ</speak>"
+            )
         return AssistantResponse(
             intent="add_order",
             response_ssml="<speak>ยังไม่มีรายการที่สามารถเพิ่มได้ค่ะ</speak>"
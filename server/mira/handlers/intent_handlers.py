@@ -1,6 +1,7 @@
 from server.mira.services.session_manager import session_manager
 from server.mira.models.order import OrderItem, OrderStatus
-from server.mira.services.menu import lookup_price, validate_item
+from server.mira.services.menu import resolve_item, suggest_items
+from server.mira.services.order_ledger import format_price
 from server.mira.models.response import AssistantResponse
 from core.utils.logger_config import get_logger
 
@@ -35,6 +36,12 @@ intent_list = """
 """.strip()
 
 #####  Order Category ######
+def _order_totals(session_id: str):
+    """ยอดสุทธิ / ส่วนลด จาก ledger + promotion_engine (ไม่ใช้ตัวเลขที่ LLM ตอบมา)"""
+    ledger = session_manager.get_order_ledger(session_id)
+    logger.debug(f"Subtotal: {ledger.subtotal}, discounts: {ledger.discounts}, total={ledger.total}")
+    return str(format_price(ledger.total)), str(format_price(ledger.discount_total))
+
 def handle_add_order(payload: dict, session_id: str) -> AssistantResponse:
     logger.info(f"[{session_id}] Handle Add Order")
     item_data = payload.get("item")
@@ -49,18 +56,22 @@ def handle_add_order(payload: dict, session_id: str) -> AssistantResponse:
         item_data = [item_data]
 
     added_items = []
+    suggestions = []
     for item in item_data:
         name = item.get("name")
         qty = item.get("qty", 1)
 
-        if not validate_item(name):
+        # จับคู่ชื่อในเครื่อง (รวมชื่อที่ ASR สะกดเพี้ยน) แทนการถาม LLM อีกรอบ
+        menu_item = resolve_item(name) if name else None
+        if menu_item is None:
             logger.warning(f"Invalid menu item: {name}")
+            if name:
+                suggestions.extend(suggest_items(name))
             continue
-
-        price = lookup_price(name)
-        if price is None:
-            logger.warning(f"Price not found for item: {name}")
-            continue
+        if menu_item["name"] != name:
+            logger.info(f"🔎 Resolved menu item: {name} → {menu_item['name']}")
+        name = menu_item["name"]
+        price = menu_item["price"]
 
         # Check for existing item in the session
         existing_orders = session_manager.get_order_list(session_id)
@@ -79,17 +90,19 @@ def handle_add_order(payload: dict, session_id: str) -> AssistantResponse:
             added_items.append(order_item)
 
     if not added_items:
+        if suggestions:
+            choices = " หรือ ".join(dict.fromkeys(suggestions))
+            return AssistantResponse(
+                intent="add_order",
+                response_ssml=f"<speak>หมายถึง {choices} หรือเปล่าคะ</speak>"
+            )
         return AssistantResponse(
             intent="add_order",
             response_ssml="<speak>ยังไม่มีรายการที่สามารถเพิ่มได้ค่ะ</speak>"
         )
 
     item_names = " และ ".join([f"{item.qty} {item.name}" for item in added_items])
-    # Extract total_price and discount from payload, validate total
-    total_price = str(payload.get("total_price", 0))
-    discount = str(payload.get("discount",0)  )
-    calculated_total = sum([item.price * item.qty for item in session_manager.get_order_list(session_id)])
-    logger.debug(f"Total price: {total_price}, discount: {discount} , calculated_total={calculated_total}")
+    total_price, discount = _order_totals(session_id)
 
     return AssistantResponse(
         intent="add_order",
@@ -117,11 +130,7 @@ async def handle_cancel_order(payload: dict, session_id: str) -> AssistantRespon
 
     session_manager.clear_orders(session_id)
     logger.info(f"Cleared all orders for session {session_id}")
-    # Extract total_price and discount from payload, validate total
-    total_price = str(payload.get("total_price", 0))
-    discount = str(payload.get("discount",0)  )
-    calculated_total = sum([item.price * item.qty for item in session_manager.get_order_list(session_id)])
-    logger.debug(f"Total price: {total_price}, discount: {discount} , calculated_total={calculated_total}")
+    total_price, discount = _order_totals(session_id)
 
     return AssistantResponse(
         intent="cancel_order",
@@ -143,11 +152,7 @@ def handle_confirm_order(payload: dict, session_id: str) -> AssistantResponse:
     for order_item in order_list:
         if order_item.status == OrderStatus.new:
             order_item.status = OrderStatus.in_progress
-    # Extract total_price and discount from payload, validate total
-    total_price = str(payload.get("total_price", 0))
-    discount = str(payload.get("discount",0)  )
-    calculated_total = sum([item.price * item.qty for item in session_manager.get_order_list(session_id)])
-    logger.debug(f"Total price: {total_price}, discount: {discount} , calculated_total={calculated_total}")
+    total_price, discount = _order_totals(session_id)
 
     return AssistantResponse(
         intent="confirm_order",
@@ -176,13 +181,16 @@ def handle_modify_order(payload: dict, session_id: str) -> AssistantResponse:
     for item in item_data:
         name = item.get("name")
         qty = item.get("qty")
-        price = item.get("price")
 
-        if not name or qty is None or price is None:
+        if not name or qty is None:
             continue
 
-        if not validate_item(name):
+        # ราคาเอาจากเมนูเสมอ LLM ไม่ต้องส่ง price มา
+        menu_item = resolve_item(name)
+        if menu_item is None:
             continue
+        name = menu_item["name"]
+        price = menu_item["price"]
 
         existing_item = next((o for o in current_orders if o.name == name), None)
 
@@ -205,11 +213,7 @@ def handle_modify_order(payload: dict, session_id: str) -> AssistantResponse:
             response_ssml="<speak><prosody rate='108%' pitch='+1st'>ขอโทษค่ะ ไม่พบรายการที่สามารถแก้ไขได้ค่ะ</prosody></speak>"
         )
     else:
-        # Extract total_price and discount from payload, validate total
-        total_price = str(payload.get("total_price", 0))
-        discount = str(payload.get("discount",0)  )
-        calculated_total = sum([item.price * item.qty for item in session_manager.get_order_list(session_id)])
-        logger.debug(f"Total price: {total_price}, discount: {discount} , calculated_total={calculated_total}")
+        total_price, discount = _order_totals(session_id)
 
         
         return AssistantResponse(
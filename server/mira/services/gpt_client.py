@@ -1,57 +1,64 @@
 import asyncio
 import json
+import time
 from typing import Optional
 from server.mira.services.session_manager import session_manager
 from server.mira.services.prompt_builder import PromptBuilder
-from openai import OpenAI
-from server.config.config import OPENAI_API_KEY, OPENAI_MODEL
+from server.mira.services.intent_preclassifier import build_default_classifier
+from server.config.config import OPENAI_API_KEY, OPENAI_MODEL, MIRA_PRECLASSIFIER_ENABLED
+from server.shared.llm_gateway import llm_gateway
+from server.shared.context_builder import token_counter
 from core.utils.logger_config import get_logger
 
 logger = get_logger(__name__)
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 prompt_builder = PromptBuilder()
+intent_preclassifier = build_default_classifier() if MIRA_PRECLASSIFIER_ENABLED else None
 
 async def detect_intent(user_message: str, session_id: Optional[str] = None) -> dict:
-    prompt = prompt_builder.build_intent_detection_prompt(user_message)
-    messages = [
-        {"role": "user", "content": [{"type": "text", "text": prompt}]}
-    ]
-    response = client.chat.completions.create(
+    # คำสั่งคงที่อยู่หน้า ข้อความผู้ใช้อยู่ท้าย → prefix เดิมทุกครั้ง (provider prompt cache)
+    messages = prompt_builder.build_intent_detection_messages(user_message)
+    start = time.perf_counter()
+    response = await llm_gateway.chat(
         model=OPENAI_MODEL,
         messages=messages
     )
     usage = response.usage
-    session_manager.log_token_usage(session_id or "intent-detection", usage, source="intent detection")
+    session_manager.log_token_usage(session_id or "intent-detection", usage, source="intent detection", elapsed=time.perf_counter() - start)
     try:
         result = response.choices[0].message.content.strip()
         intent_data = json.loads(result)
+        if intent_preclassifier:
+            intent_preclassifier.log_llm_label(user_message, intent_data)
         return intent_data
     except Exception as e:
         logger.warning(f"Failed to parse intent response: {e}")
         return {"intent": "unknown", "confidence": 0.0, "menu_scope": "n/a"}
 
-async def ask_gpt(session_id: str, user_message: str) -> str:
+async def _prepare_messages(session_id: str, user_message: str) -> list:
     # Initialize session if needed
     if session_manager.is_fresh(session_id):
         init_prompt = prompt_builder.build_init_prompt()
         session_manager.init_session(session_id, system_prompt=init_prompt)
 
-    # 1. Detect coarse intent (Tier-1)
-    intent_data = await detect_intent(user_message,session_id=session_id)
+    # 1. Detect coarse intent (Tier-1) → ลอง local classifier ก่อน ถ้าไม่มั่นใจค่อยถาม LLM
+    intent_data = intent_preclassifier.classify(user_message) if intent_preclassifier else None
+    if intent_data is None:
+        intent_data = await detect_intent(user_message,session_id=session_id)
     coarse_intent = intent_data.get("intent", "unknown")
     menu_scope = intent_data.get("menu_scope", "n/a")
     logger.debug(f"Detected intent: {intent_data}")
 
     # 2. Build user prompt by intent
-    order_list = session_manager.get_order_list(session_id)
+    order_list = session_manager.get_order_ledger(session_id)
     user_prompt = prompt_builder.build_prompt_by_intent(coarse_intent,  user_message, order_list, menu_scope=menu_scope)
 
     # 3. Store user message
     session_manager.add_user_message(session_id, user_message)
 
     # 4. Context
-    messages = await session_manager.get_full_context(session_id, max_history=5)
+    reserve_tokens = token_counter.count_message({"role": "user", "content": user_prompt})
+    messages = await session_manager.get_full_context(session_id, max_history=5, reserve_tokens=reserve_tokens)
     messages.append({
         "role": "user",
         "content": [{"type": "text", "text": user_prompt}]
@@ -64,19 +71,43 @@ async def ask_gpt(session_id: str, user_message: str) -> str:
     
     logger.debug(f"User prompt: {user_prompt}")
     logger.debug(f"Messages to be sent: {messages}")
+    return messages
+
+def _finish_reply(session_id: str, reply: str, usage, elapsed: float = None):
+    session_manager.add_assistant_reply(session_id, reply)
+    asyncio.create_task(session_manager.summarize_if_needed(session_id))
+    if usage is not None:
+        session_manager.log_token_usage(session_id, usage, source="prompt", elapsed=elapsed)
+
+async def ask_gpt(session_id: str, user_message: str) -> str:
+    messages = await _prepare_messages(session_id, user_message)
 
     # 6. Send to GPT
-    response = client.chat.completions.create(
+    start = time.perf_counter()
+    response = await llm_gateway.chat(
         model=OPENAI_MODEL,
         messages=messages
     )
     reply = response.choices[0].message.content.strip()
-    session_manager.add_assistant_reply(session_id, reply)
-    asyncio.create_task(session_manager.summarize_if_needed(session_id))
-    usage = response.usage
-    session_manager.log_token_usage(session_id, usage, source="prompt")
+    _finish_reply(session_id, reply, response.usage, elapsed=time.perf_counter() - start)
     return reply
 
+async def ask_gpt_stream(session_id: str, user_message: str):
+    """
+    เหมือน ask_gpt แต่ yield delta ของคำตอบทันทีที่ LLM ส่งมา
+    """
+    messages = await _prepare_messages(session_id, user_message)
+
+    usage_holder = []
+    parts = []
+    start = time.perf_counter()
+    async for delta in llm_gateway.stream_chat(model=OPENAI_MODEL, messages=messages, on_usage=usage_holder.append):
+        parts.append(delta)
+        yield delta
+
+    reply = "".join(parts).strip()
+    _finish_reply(session_id, reply, usage_holder[-1] if usage_holder else None, elapsed=time.perf_counter() - start)
+
 # Summarization function
 async def gpt_summarize(text: str, session_id: Optional[str] = None) -> str:
     logger.info("Sending summarization request to OpenAI")
@@ -91,7 +122,7 @@ async def gpt_summarize(text: str, session_id: Optional[str] = None) -> str:
             "content": [{"type": "text", "text": text}]
         }
     ]
-    response = client.chat.completions.create(
+    response = await llm_gateway.chat(
         model=OPENAI_MODEL,
         messages=messages
     )
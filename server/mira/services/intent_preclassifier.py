@@ -0,0 +1,340 @@
+# server/mira/services/intent_preclassifier.py
+"""
+Local (in-process) Tier-1 intent classifier for MIRA.
+
+Resolves the coarse `intent` + `menu_scope` that `detect_intent` would ask the LLM for,
+using a character n-gram Naive Bayes model trained from seed samples and logged
+LLM-labelled utterances. When the model is not confident enough, `classify()` returns
+None and the caller falls back to the LLM.
+
+Offline usage:
+    python -m server.mira.services.intent_preclassifier train
+    python -m server.mira.services.intent_preclassifier eval [--threshold 0.8]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from server.config.config import MIRA_PRECLASSIFIER_THRESHOLD, MIRA_INTENT_LOG_MAX_BYTES
+from server.mira.services.menu import menu_index
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "../data")
+SAMPLES_PATH = os.path.join(DATA_DIR, "intent_samples.json")
+LOG_PATH = os.path.join(DATA_DIR, "intent_log.jsonl")
+MODEL_PATH = os.path.join(DATA_DIR, "intent_model.json")
+
+# coarse intents ต้องตรงกับ PromptBuilder.build_intent_detection_prompt
+COARSE_INTENTS = ["greeting", "order", "menu_info", "promotion", "call_staff", "social", "unknown"]
+MENU_SCOPED_INTENTS = ["order", "menu_info", "promotion"]
+
+CATEGORY_KEYWORDS = {
+    "drink": ["เครื่องดื่ม", "น้ำอะไร", "ดื่ม", "drink"],
+    "dessert": ["ของหวาน", "ขนม", "dessert"],
+    "main": ["จานหลัก", "อาหารคาว", "กับข้าว", "main"],
+    "promotion": ["โปรชุด", "ชุดคุ้ม", "set"],
+}
+
+ITEM_TOKEN = "§"
+NUMBER_TOKEN = "#"
+NGRAM_RANGE = (1, 3)
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", (text or "").strip().lower())
+    text = re.sub(r"[\s\"'.,!?~ๆ]+", " ", text)
+    return text.strip()
+
+
+class IntentPreClassifier:
+    def __init__(self, threshold: float = MIRA_PRECLASSIFIER_THRESHOLD, menu_data=None, alpha: float = 0.5,
+                 min_known_ratio: float = 0.6, log_path: str = LOG_PATH,
+                 log_max_bytes: int = MIRA_INTENT_LOG_MAX_BYTES):
+        self.threshold = threshold
+        self.alpha = alpha
+        self.min_known_ratio = min_known_ratio
+        self.log_path = log_path
+        self.log_max_bytes = log_max_bytes
+        self._log_lock = threading.Lock()
+
+        # ไม่ส่ง menu_data = ใช้ menu_index ของ MIRA (ชื่อเมนูอัปเดตตาม hot reload ของ menu.json)
+        self._menu_index = menu_index if menu_data is None else None
+        self._menu_version = None
+        self._menu_names = self._sorted_names(menu_data) if menu_data is not None else []
+
+        self.class_counts: Counter = Counter()
+        self.feature_counts: Dict[str, Counter] = defaultdict(Counter)
+        self.feature_totals: Counter = Counter()
+        self.vocabulary = set()
+
+    @staticmethod
+    def _sorted_names(menu_data) -> List[str]:
+        # เรียงชื่อยาวก่อน เพื่อให้ "ข้าวผัดกุ้ง" ถูกแทนก่อน "ข้าวผัด"
+        return sorted({normalize_text(item["name"]) for item in menu_data}, key=len, reverse=True)
+
+    @property
+    def menu_names(self) -> List[str]:
+        if self._menu_index is not None:
+            items = self._menu_index.items  # เช็ค reload ก่อนอ่าน version
+            if self._menu_version != self._menu_index.version:
+                self._menu_names = self._sorted_names(items)
+                self._menu_version = self._menu_index.version
+        return self._menu_names
+
+    # ---------- features ----------
+    def _mask(self, text: str) -> Tuple[str, bool]:
+        norm = normalize_text(text)
+        found_item = False
+        for name in self.menu_names:
+            if name and name in norm:
+                norm = norm.replace(name, ITEM_TOKEN)
+                found_item = True
+        norm = re.sub(r"\d+", NUMBER_TOKEN, norm)
+        return norm, found_item
+
+    def _features(self, text: str) -> List[str]:
+        masked, _ = self._mask(text)
+        padded = f"^{masked.replace(' ', '')}$"
+        features = []
+        low, high = NGRAM_RANGE
+        for n in range(low, high + 1):
+            features.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return features
+
+    # ---------- training ----------
+    def fit(self, samples: List[Tuple[str, str]]):
+        self.class_counts.clear()
+        self.feature_counts.clear()
+        self.feature_totals.clear()
+        self.vocabulary.clear()
+
+        for text, intent in samples:
+            if intent not in COARSE_INTENTS or intent == "unknown":
+                continue
+            features = self._features(text)
+            self.class_counts[intent] += 1
+            self.feature_counts[intent].update(features)
+            self.feature_totals[intent] += len(features)
+            self.vocabulary.update(features)
+
+        logger.info(f"IntentPreClassifier trained: {sum(self.class_counts.values())} samples, "
+                    f"{len(self.vocabulary)} features, classes={dict(self.class_counts)}")
+        return self
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        features = self._features(text)
+        if not features or not self.class_counts:
+            return {}
+
+        total_docs = sum(self.class_counts.values())
+        vocab_size = len(self.vocabulary) + 1
+        scores = {}
+        for intent, doc_count in self.class_counts.items():
+            counts = self.feature_counts[intent]
+            denom = self.feature_totals[intent] + self.alpha * vocab_size
+            log_likelihood = sum(math.log((counts.get(f, 0) + self.alpha) / denom) for f in features)
+            # ใช้ค่าเฉลี่ยต่อ feature ไม่ให้ข้อความยาวได้ความมั่นใจเกินจริง
+            scores[intent] = math.log(doc_count / total_docs) / len(features) + log_likelihood / len(features)
+
+        # softmax บนสเกลต่อ feature → คูณ temperature ให้ความต่างชัดขึ้น
+        temperature = 8.0
+        max_score = max(scores.values())
+        exp_scores = {k: math.exp((v - max_score) * temperature) for k, v in scores.items()}
+        norm = sum(exp_scores.values())
+        return {k: v / norm for k, v in exp_scores.items()}
+
+    def known_ratio(self, text: str) -> float:
+        features = self._features(text)
+        if not features:
+            return 0.0
+        return sum(1 for f in features if f in self.vocabulary) / len(features)
+
+    # ---------- inference ----------
+    def detect_menu_scope(self, text: str, intent: str) -> str:
+        if intent not in MENU_SCOPED_INTENTS:
+            return "n/a"
+        _, found_item = self._mask(text)
+        if found_item:
+            return "specific"
+        norm = normalize_text(text)
+        if any(kw in norm for keywords in CATEGORY_KEYWORDS.values() for kw in keywords):
+            return "category"
+        return "general"
+
+    def predict(self, text: str) -> dict:
+        proba = self.predict_proba(text)
+        if not proba:
+            return {"intent": "unknown", "confidence": 0.0, "menu_scope": "n/a"}
+        intent, confidence = max(proba.items(), key=lambda kv: kv[1])
+        return {
+            "intent": intent,
+            "confidence": round(confidence, 3),
+            "menu_scope": self.detect_menu_scope(text, intent),
+        }
+
+    def classify(self, text: str) -> Optional[dict]:
+        """
+        คืนผล intent ถ้ามั่นใจพอ (>= threshold) ไม่เช่นนั้นคืน None ให้ caller ไปถาม LLM
+        """
+        if self.known_ratio(text) < self.min_known_ratio:
+            return None
+        result = self.predict(text)
+        if result["confidence"] < self.threshold:
+            logger.debug(f"IntentPreClassifier unsure ({result['intent']} {result['confidence']}) → LLM fallback")
+            return None
+        result["source"] = "local"
+        return result
+
+    # ---------- logging / persistence ----------
+    def log_llm_label(self, text: str, intent_data: dict):
+        """
+        เก็บผล intent ที่ได้จาก LLM ไว้เป็น training data สำหรับรอบ train ถัดไป
+        ไฟล์ใหญ่ถึง log_max_bytes → ย้ายไปเป็น <log>.1 (ทับของเดิม) ไฟล์ log รวมกันจึงไม่เกิน 2 เท่าของ log_max_bytes
+        """
+        intent = intent_data.get("intent")
+        if intent not in COARSE_INTENTS or intent == "unknown":
+            return
+        entry = {
+            "text": text,
+            "intent": intent,
+            "menu_scope": intent_data.get("menu_scope", "n/a"),
+            "confidence": intent_data.get("confidence", 0.0),
+        }
+        try:
+            with self._log_lock:
+                if self.log_max_bytes > 0 and os.path.exists(self.log_path) \
+                        and os.path.getsize(self.log_path) >= self.log_max_bytes:
+                    os.replace(self.log_path, self.log_path + ".1")
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning(f"⚠️ Failed to log intent label: {e}")
+
+    def to_dict(self) -> dict:
+        return {
+            "alpha": self.alpha,
+            "class_counts": dict(self.class_counts),
+            "feature_counts": {k: dict(v) for k, v in self.feature_counts.items()},
+        }
+
+    def save(self, path: str = MODEL_PATH):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        logger.info(f"💾 Intent model saved to: {path}")
+
+    def load(self, path: str = MODEL_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.alpha = data.get("alpha", self.alpha)
+        self.class_counts = Counter(data["class_counts"])
+        self.feature_counts = defaultdict(Counter, {k: Counter(v) for k, v in data["feature_counts"].items()})
+        self.feature_totals = Counter({k: sum(v.values()) for k, v in self.feature_counts.items()})
+        self.vocabulary = {f for counts in self.feature_counts.values() for f in counts}
+        logger.info(f"📦 Intent model loaded from: {path}")
+        return self
+
+
+def load_seed_samples(path: str = SAMPLES_PATH) -> List[Tuple[str, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [(text, intent) for intent, texts in data.items() for text in texts]
+
+
+def load_logged_samples(path: str = LOG_PATH, min_confidence: float = 0.0) -> List[Tuple[str, str]]:
+    """อ่าน log ทั้งไฟล์ที่ rotate ไปแล้ว (<path>.1) และไฟล์ปัจจุบัน"""
+    samples = []
+    for log_file in (path + ".1", path):
+        if not os.path.exists(log_file):
+            continue
+        with open(log_file, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if entry.get("confidence", 0.0) >= min_confidence:
+                    samples.append((entry["text"], entry["intent"]))
+    return samples
+
+
+def build_default_classifier() -> IntentPreClassifier:
+    classifier = IntentPreClassifier()
+    if os.path.exists(MODEL_PATH):
+        try:
+            return classifier.load(MODEL_PATH)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to load intent model, retraining: {e}")
+    return classifier.fit(load_seed_samples() + load_logged_samples())
+
+
+def evaluate(classifier: IntentPreClassifier, samples: List[Tuple[str, str]]) -> dict:
+    """
+    เทียบผล local กับ label ของ LLM: accuracy รวม, coverage (สัดส่วนที่ตอบเองได้) และ accuracy เฉพาะที่ตอบเอง
+    """
+    total = len(samples)
+    correct = covered = covered_correct = 0
+    confusion: Dict[str, Counter] = defaultdict(Counter)
+    for text, expected in samples:
+        predicted = classifier.predict(text)["intent"]
+        confusion[expected][predicted] += 1
+        correct += predicted == expected
+        local = classifier.classify(text)
+        if local is not None:
+            covered += 1
+            covered_correct += local["intent"] == expected
+    return {
+        "samples": total,
+        "accuracy": round(correct / total, 3) if total else 0.0,
+        "coverage": round(covered / total, 3) if total else 0.0,
+        "covered_accuracy": round(covered_correct / covered, 3) if covered else 0.0,
+        "confusion": {k: dict(v) for k, v in confusion.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train / evaluate the MIRA local intent pre-classifier")
+    parser.add_argument("command", choices=["train", "eval"])
+    parser.add_argument("--log", default=LOG_PATH, help="LLM-labelled utterance log (jsonl)")
+    parser.add_argument("--out", default=MODEL_PATH, help="where to save the trained model")
+    parser.add_argument("--threshold", type=float, default=MIRA_PRECLASSIFIER_THRESHOLD)
+    parser.add_argument("--min-confidence", type=float, default=0.7, help="ignore LLM labels below this confidence")
+    parser.add_argument("--holdout", type=float, default=0.2, help="fraction of logged samples held out for eval")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    seed_samples = load_seed_samples()
+    logged = load_logged_samples(args.log, min_confidence=args.min_confidence)
+
+    if args.command == "train":
+        classifier = IntentPreClassifier(threshold=args.threshold).fit(seed_samples + logged)
+        classifier.save(args.out)
+        return
+
+    random.Random(args.seed).shuffle(logged)
+    split = int(len(logged) * (1 - args.holdout))
+    train_set, test_set = logged[:split], logged[split:]
+    if not test_set:
+        # ยังไม่มี log จาก LLM → ทดสอบแบบ leave-one-out บน seed samples แทน
+        print("No logged LLM labels found, running leave-one-out on seed samples")
+        hits = 0
+        for i, (text, expected) in enumerate(seed_samples):
+            classifier = IntentPreClassifier(threshold=args.threshold).fit(seed_samples[:i] + seed_samples[i + 1:])
+            hits += classifier.predict(text)["intent"] == expected
+        print(json.dumps({"samples": len(seed_samples), "accuracy": round(hits / len(seed_samples), 3)}, indent=2))
+        return
+
+    classifier = IntentPreClassifier(threshold=args.threshold).fit(seed_samples + train_set)
+    print(json.dumps(evaluate(classifier, test_set), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,40 @@
-import json
-import unicodedata
 import os
-import re
 from typing import Optional, List
 
-# Load menu data
-MENU_FILE_PATH = os.path.join(os.path.dirname(__file__), "../data/menu.json")
-
-with open(MENU_FILE_PATH, "r", encoding="utf-8") as f:
-    MENU_DATA = json.load(f)
+from server.shared.menu_index import MenuIndex, normalize_text
 
+# Load menu data (index สร้างครั้งเดียว และโหลดใหม่เองเมื่อ menu.json ถูกแก้)
+MENU_FILE_PATH = os.path.join(os.path.dirname(__file__), "../data/menu.json")
 
-def normalize_text(text: str) -> str:
-    return unicodedata.normalize("NFKC", text.strip().lower())
+menu_index = MenuIndex(MENU_FILE_PATH)
 
 
 def lookup_price(item_name: str) -> Optional[float]:
-    norm_input = normalize_text(item_name)
-    for item in MENU_DATA:
-        if normalize_text(item["name"]) == norm_input or norm_input in normalize_text(item["name"]):
-            return item["price"]
-    return None
+    return menu_index.lookup_price(item_name)
 
 
 def validate_item(item_name: str) -> bool:
-    norm_input = normalize_text(item_name)
-    for item in MENU_DATA:
-        norm_menu_name = normalize_text(item["name"])
-        if norm_input == norm_menu_name:
-            return True
-        if norm_input in norm_menu_name:
-            return True
-        if re.search(rf"^{re.escape(norm_input)}", norm_menu_name):
-            return True
-    return False
+    return menu_index.validate_item(item_name)
+
+
+def resolve_item(item_name: str) -> Optional[dict]:
+    """รายการเมนูตามชื่อ รวมชื่อที่ ASR สะกดเพี้ยน (None = ไม่พบ หรือกำกวม)"""
+    return menu_index.resolve(item_name)
+
+
+def suggest_items(item_name: str, limit: int = 3) -> List[str]:
+    """ชื่อเมนูที่ใกล้เคียง ใช้ถามผู้ใช้กลับเมื่อ resolve_item ไม่แน่ใจ"""
+    return [item["name"] for item in menu_index.suggest(item_name, limit=limit)]
 
 
 def get_recommended_items() -> List[dict]:
-    return [item for item in MENU_DATA if item.get("recommended", False)]
+    return [item for item in menu_index.items if item.get("recommended", False)]
 
 
 def suggest_complementary_items(current_items: List[str]) -> List[str]:
+    current = {normalize_text(name) for name in current_items}
     suggestions = []
-    for item in MENU_DATA:
-        if "pair_with" in item:
-            for current in current_items:
-                if normalize_text(current) in [normalize_text(pair) for pair in item["pair_with"]]:
-                    suggestions.append(item["name"])
+    for item in menu_index.items:
+        if any(normalize_text(pair) in current for pair in item.get("pair_with", [])):
+            suggestions.append(item["name"])
     return list(set(suggestions))
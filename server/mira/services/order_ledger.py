@@ -0,0 +1,155 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from server.mira.models.order import OrderItem, OrderStatus
+
+
+@dataclass
+class LedgerLine:
+    name: str
+    qty: int = 0
+    unit_price: float = 0.0
+    subtotal: float = 0.0
+
+
+def format_price(value: float):
+    """75.0 → 75, 37.5 → 37.5 (ให้ข้อความใน prompt เหมือนราคาในเมนู)"""
+    return int(value) if float(value).is_integer() else round(value, 2)
+
+
+# policy รับ ledger แล้วคืน (รายการส่วนลดที่ใช้, ยอดส่วนลดรวม)
+DiscountPolicy = Callable[["OrderLedger"], Tuple[List[str], float]]
+
+
+class OrderLedger:
+    """
+    รายการสั่งของหนึ่ง session พร้อมยอดรวมที่อัปเดตทีละรายการตอน add / update / cancel
+    - items: OrderItem ทั้งหมดตามลำดับที่สั่ง (รวมที่ยกเลิกแล้ว) ใช้แทน list เดิมใน session
+    - lines: ชื่อเมนู → จำนวน / ราคา / ยอดรวม ของรายการที่ยังไม่ยกเลิก
+    - subtotal, active_qty, active_items, discount_total, total: O(1)
+    - render() / lines_json(): ข้อความรายการสั่งสำหรับ prompt ที่ cache ไว้จนกว่ารายการจะเปลี่ยน
+    """
+
+    def __init__(self, discount_policy: Optional[DiscountPolicy] = None):
+        self.discount_policy = discount_policy
+        self.items: List[OrderItem] = []
+        self.lines: Dict[str, LedgerLine] = {}
+        self.subtotal = 0.0
+        self.active_qty = 0
+        self.discounts: List[str] = []
+        self.discount_total = 0.0
+        self.version = 0
+        self._rendered = None
+        self._json = None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    # ---------- mutations ----------
+
+    def add(self, item: OrderItem):
+        self.items.append(item)
+        self._apply(item, 1)
+        self._changed()
+
+    def update(self, item: OrderItem):
+        """แก้ทุกรายการที่ชื่อตรงกัน (status / qty / price) เหมือน SessionManager.update_order_item เดิม"""
+        changed = False
+        for order in self.items:
+            if order.name == item.name:
+                self._apply(order, -1, prune=False)
+                order.status = item.status
+                order.qty = item.qty
+                order.price = item.price
+                self._apply(order, 1)
+                changed = True
+        if changed:
+            self._prune(item.name)
+            self._changed()
+
+    def cancel(self, name: str):
+        changed = False
+        for order in self.items:
+            if order.name == name and order.status != OrderStatus.canceled:
+                self._apply(order, -1)
+                order.status = OrderStatus.canceled
+                changed = True
+        if changed:
+            self._changed()
+
+    def clear(self):
+        self.items = []
+        self.lines = {}
+        self.subtotal = 0.0
+        self.active_qty = 0
+        self._changed()
+
+    def _apply(self, item: OrderItem, sign: int, prune: bool = True):
+        if item.status == OrderStatus.canceled:
+            return
+        qty = sign * item.qty
+        amount = qty * (item.price or 0)
+        line = self.lines.get(item.name)
+        if line is None:
+            line = self.lines[item.name] = LedgerLine(item.name)
+        line.qty += qty
+        line.subtotal += amount
+        line.unit_price = item.price
+        self.subtotal += amount
+        self.active_qty += qty
+        if prune:
+            self._prune(item.name)
+
+    def _prune(self, name: str):
+        line = self.lines.get(name)
+        if line is not None and line.qty <= 0:
+            del self.lines[name]
+
+    def _changed(self):
+        self.version += 1
+        self._rendered = None
+        self._json = None
+        if self.discount_policy is not None:
+            self.discounts, self.discount_total = self.discount_policy(self)
+        else:
+            self.discounts, self.discount_total = [], 0.0
+
+    # ---------- read ----------
+
+    @property
+    def active_items(self) -> int:
+        return len(self.lines)
+
+    @property
+    def total(self) -> float:
+        return round(max(self.subtotal - self.discount_total, 0.0), 2)
+
+    def summary(self) -> Dict[str, dict]:
+        return {name: {"qty": line.qty, "price": line.unit_price} for name, line in self.lines.items()}
+
+    def lines_json(self) -> List[dict]:
+        if self._json is None:
+            self._json = [
+                {"name": line.name, "qty": line.qty, "price": format_price(line.unit_price)}
+                for line in self.lines.values()
+            ]
+        return self._json
+
+    def render(self) -> str:
+        """
+        รายการสั่ง + ยอดที่ระบบคำนวณแล้ว (LLM ใช้ตอบได้เลย ไม่ต้องคิดราคาเอง)
+        """
+        if self._rendered is None:
+            if not self.lines:
+                self._rendered = ""
+            else:
+                rows = [f"- {line.name} x {line.qty}" for line in self.lines.values()]
+                totals = f"ยอดรวม {format_price(self.total)} บาท"
+                if self.discount_total:
+                    totals += f" (ส่วนลด {format_price(self.discount_total)} บาท: {', '.join(self.discounts)})"
+                rows.append(totals)
+                self._rendered = "\n".join(rows)
+        return self._rendered
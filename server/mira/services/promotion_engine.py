@@ -0,0 +1,126 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from server.mira.services.menu import menu_index
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+PROMOTIONS_FILE_PATH = os.path.join(os.path.dirname(__file__), "../data/promotions.json")
+
+
+@dataclass
+class PromotionRule:
+    """
+    โปรโมชันหนึ่งรายการจาก promotions.json
+
+    condition (ทุกข้อที่ระบุต้องเป็นจริง):
+      min_items            จำนวนเมนูที่ต่างกันอย่างน้อย
+      min_qty              จำนวนจานรวมอย่างน้อย
+      min_subtotal         ยอดก่อนลดอย่างน้อย (บาท)
+      required_categories  ต้องมีเมนูครบทุกหมวด เช่น ["main", "drink"]
+      required_items       ต้องสั่งครบทุกเมนูในชุด (combo), per_set = ลดตามจำนวนชุดที่ครบ
+      items                ส่วนลดเฉพาะเมนูเหล่านี้ (ใช้กับ percent / discount_per_item)
+    ส่วนลด:
+      discount             ลดเป็นบาท (ครั้งเดียว หรือต่อชุดถ้า per_set)
+      discount_per_item    ลดเป็นบาทต่อจานของเมนูใน items
+      percent              ลดเป็น % ของยอดเมนูใน items (ถ้าไม่ระบุ items = ของยอดทั้งหมด)
+    group: โปรที่อยู่ group เดียวกันใช้ได้แค่อันที่ลดมากสุด (เช่น ขั้นบันไดตามจำนวนรายการ)
+    """
+    id: str
+    description: str
+    group: Optional[str] = None
+    min_items: int = 0
+    min_qty: int = 0
+    min_subtotal: float = 0.0
+    required_categories: List[str] = field(default_factory=list)
+    required_items: List[str] = field(default_factory=list)
+    items: List[str] = field(default_factory=list)
+    per_set: bool = False
+    discount: float = 0.0
+    discount_per_item: float = 0.0
+    percent: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PromotionRule":
+        condition = data.get("condition", {})
+        fields = {key: condition[key] for key in cls.__dataclass_fields__ if key in condition}
+        return cls(id=data["id"], description=data.get("description", ""), group=data.get("group"), **fields)
+
+    def discount_for(self, lines: Dict[str, "object"], categories: set, qty: int, subtotal: float) -> float:
+        if len(lines) < self.min_items or qty < self.min_qty or subtotal < self.min_subtotal:
+            return 0.0
+        if any(category not in categories for category in self.required_categories):
+            return 0.0
+
+        sets = 1
+        if self.required_items:
+            sets = min((lines[name].qty if name in lines else 0) for name in self.required_items)
+            if sets <= 0:
+                return 0.0
+            if not self.per_set:
+                sets = 1
+
+        amount = self.discount * sets
+        if self.items:
+            eligible = [lines[name] for name in self.items if name in lines]
+            if not eligible:
+                return 0.0
+            amount += self.discount_per_item * sum(line.qty for line in eligible)
+            amount += sum(line.subtotal for line in eligible) * self.percent / 100
+        else:
+            amount += subtotal * self.percent / 100
+        return round(amount, 2)
+
+
+class PromotionEngine:
+    """
+    คำนวณส่วนลดจาก promotions.json ในเครื่อง (ไม่ให้ LLM คิดราคา)
+    ใช้เป็น discount_policy ของ OrderLedger: เรียกทุกครั้งที่รายการสั่งเปลี่ยน ใช้ข้อมูลที่ ledger รวมไว้แล้ว
+    """
+
+    def __init__(self, path: str = PROMOTIONS_FILE_PATH):
+        self.path = path
+        self.rules: List[PromotionRule] = []
+        self.load()
+
+    def load(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            self.rules = [PromotionRule.from_dict(promo) for promo in json.load(f)]
+        logger.info(f"🏷️ Loaded {len(self.rules)} promotion rules from {self.path}")
+
+    def evaluate(self, lines: dict, subtotal: float, qty: int) -> List[Tuple[PromotionRule, float]]:
+        """โปรที่ใช้ได้กับรายการนี้ พร้อมยอดส่วนลดของแต่ละโปร (group เดียวกันเลือกอันที่ลดมากสุด)"""
+        categories = set()
+        for name in lines:
+            item = menu_index.find(name)
+            if item is not None:
+                categories.add(item.get("category"))
+
+        best_in_group = {}
+        applied = []
+        for rule in self.rules:
+            amount = rule.discount_for(lines, categories, qty, subtotal)
+            if amount <= 0:
+                continue
+            if rule.group is None:
+                applied.append((rule, amount))
+            elif rule.group not in best_in_group or amount > best_in_group[rule.group][1]:
+                best_in_group[rule.group] = (rule, amount)
+        applied.extend(best_in_group.values())
+        applied.sort(key=lambda pair: self.rules.index(pair[0]))
+        return applied
+
+    def apply(self, ledger) -> Tuple[List[str], float]:
+        """discount_policy ของ OrderLedger: คืน (คำอธิบายโปรที่ใช้, ส่วนลดรวม ไม่เกินยอดก่อนลด)"""
+        applied = self.evaluate(ledger.lines, ledger.subtotal, ledger.active_qty)
+        total = min(round(sum(amount for _, amount in applied), 2), ledger.subtotal)
+        if applied:
+            logger.debug(f"Promotions applied: {[(rule.id, amount) for rule, amount in applied]} → -{total}")
+        return [rule.description for rule, _ in applied], total
+
+
+# Singleton instance for global use
+promotion_engine = PromotionEngine()
@@ -2,30 +2,65 @@ from pathlib import Path
 import json
 from server.mira.models.order import OrderStatus
 from server.mira.handlers.intent_handlers import intent_list
+from server.mira.services.menu import menu_index
+from server.mira.services.order_ledger import OrderLedger, format_price
 
 from core.utils.logger_config import get_logger
 logger = get_logger(__name__)
 
-# Load menu and promotions once at startup
-MENU_PATH = Path("server/mira/data/menu.json")
+# Load promotions once at startup (เมนูมาจาก menu_index ซึ่งโหลดใหม่เองเมื่อ menu.json ถูกแก้)
 PROMO_PATH = Path("server/mira/data/promotions.json")
 RECOMMENDATIONS_PATH = Path("server/mira/data/recommendations.json")
 
-with MENU_PATH.open("r", encoding="utf-8") as f:
-    MENU_DATA = json.load(f)
-
 with PROMO_PATH.open("r", encoding="utf-8") as f:
     PROMOTIONS = json.load(f)
 
 with RECOMMENDATIONS_PATH.open("r", encoding="utf-8") as f:
     RECOMMENDATIONS = json.load(f)
 
+INTENT_DETECTION_INSTRUCTIONS = """
+You are an AI assistant in a restaurant. Your task is to identify the user's intent from the list below, assign a confidence score (from 0.0 to 1.0), and determine the appropriate level of menu/promotion detail to present.
+
+🔹 Intent categories:
+- greeting: Greeting the user, e.g. "Hello"
+- order: Commad to add/modify/cancel an order, asking for order details/summary, asking for bill e.g. "One can of Coke please"
+- menu_info: Asking about the menu, e.g. "What do you have?"
+- promotion: Asking about promotions, e.g. "Any specials?"
+- call_staff: Calling a staff member, e.g. "Can you get the staff?"
+- social: General conversation, e.g. "It's really hot today"
+- unknown: Unable to identify the intent
+
+🔹 menu_scope (used only when intent is `order` or `menu_info`):
+- general: General menu inquiry, e.g. "What's recommended?", "Can I see the menu?"
+- category: Asking about a specific category, e.g. "What drinks do you have?", "Any desserts?"
+- specific: Asking about a specific item, e.g. "Do you have crab fried rice?", "One bubble milk tea please"
+- n/a: Not related to menu
+
+If unsure, choose menu_scope = "general"
+
+Please respond only in the following JSON format:  
+Do not create new intent or menu_scope names  
+Do not add any explanations or text outside of the JSON
+
+### Example:
+{
+  "intent": "menu_info",
+  "confidence": 0.86,
+  "menu_scope": "specific"
+}
+""".strip()
+
 class PromptBuilder:
     def __init__(self):
         logger.info("Initialzing PromptBuilder")
-        self.menu = MENU_DATA
         self.promotions = PROMOTIONS
         self.recommendations = RECOMMENDATIONS
+        self._init_prompt = None
+        self._init_prompt_version = None
+
+    @property
+    def menu(self):
+        return menu_index.items
 
     def get_menu_items(self, with_price=True, as_json=False, limit=None):
         items = self.menu[:limit] if limit else self.menu
@@ -37,11 +72,26 @@ class PromptBuilder:
             return [f"{item['name']}" for item in items]
     
     def get_promotion_text(self, limit=None):
+      # แค่คำอธิบายไว้ตอบคำถามเรื่องโปร เงื่อนไข/ส่วนลดจริงคำนวณโดย promotion_engine
       promos = self.promotions[:limit] if limit else self.promotions
-      return "\n".join([f"- {p}" for p in promos])
+      return "\n".join([f"- {p['description']}" for p in promos])
 
     def build_init_prompt(self):
-        logger.debug("enter build_init_prompt")
+        """
+        system prompt ส่วนคงที่ (บทบาท, intent, เมนู, โปรโมชัน, กติกาการสั่ง, รูปแบบคำตอบ)
+        สร้างครั้งเดียวและเหมือนกันทุก byte ทุก session เพื่อให้ provider cache prefix ได้
+        ข้อมูลที่เปลี่ยนตาม request (ข้อความผู้ใช้, รายการที่สั่ง, คำแนะนำ) ต้องอยู่ใน prompt ของแต่ละ intent เท่านั้น
+        """
+        # render ใหม่เฉพาะเมื่อเมนูเปลี่ยน (prefix เดิมทุก byte จนกว่า menu.json จะถูกแก้)
+        if self._init_prompt is None or self._init_prompt_version != menu_index.version:
+            self._init_prompt = self._render_init_prompt()
+            self._init_prompt_version = menu_index.version
+        return self._init_prompt
+
+    def _render_init_prompt(self):
+        logger.debug("enter _render_init_prompt")
+        menu_items = json.dumps(self.get_menu_items(with_price=True, as_json=True), ensure_ascii=False, indent=2)
+        promo_text = self.get_promotion_text()
         return f"""
 You are MIRA, an AI assistant located on a restaurant table. Your main responsibilities are:
 
@@ -63,11 +113,33 @@ If your response includes spoken output, it must use the following SSML structur
 - Do not include explanations or comments outside the JSON block  
 - Do not use ``` or ```json to wrap the JSON  
 
+### Full Menu (only select from these items):
+{menu_items}
+
+### Promotions:
+{promo_text}
+
+### Order rules:
+- Only use the fields exactly as shown in the examples. Do not invent or add any other field (e.g., do not use `removed_item`, `updated_item`, etc).
+- Use only `"item"` for all intents that modify the order.
+- For `add_order`, increase quantity if item exists. For `modify_order`, `qty` means the new final quantity (e.g., 0 = remove, 2 = set to 2).
+- Only include items listed in the menu. If an item is not available, inform the user politely in Thai.
+- Do not calculate prices, totals or discounts. The system computes them from the menu and promotions.
+- If there is an opportunity to proactively suggest additional menu items (e.g., items that pair well with the order or help fulfill a promotion), use intent = proactive_suggestion
+- Response text must be in Thai with valid SSML for Google Cloud TTS.
+
 ### Example of a correct response:
 {{
   "intent": "greeting",
   "response": "<speak><prosody rate='110%' pitch='+1st'>สวัสดีค่ะ</prosody></speak>"
 }}
+
+### Example of an order response:
+{{
+  "intent": "add_order",
+  "item": {{ "name": "ข้าวผัดกุ้ง", "qty": 1 }},
+  "response": "<speak><prosody rate='110%' pitch='+1st'>รับข้าวผัดกุ้ง 1 ที่นะคะ <break time='300ms'/> เพิ่มอะไรอีกไหมคะ?</prosody></speak>"
+}}
 """.strip()
 
     def _get_recommendations_from_order(self, order_list):
@@ -86,18 +158,12 @@ If your response includes spoken output, it must use the following SSML structur
         return ""
 
     def aggregate_order(self, order_list):
-        from collections import defaultdict
-        counter = defaultdict(int)
-        for item in order_list:
-            logger.debug(f"aggregate_order : order=[{getattr(item, 'name', None)},  {getattr(item, 'qty', 1)}, {getattr(item, 'status', None)}] ")
-            if getattr(item, "status", None) == OrderStatus.canceled:
-                continue
-            name = getattr(item, "name", None)
-            qty = getattr(item, "qty", 1)
-            counter[name] += qty
-        return [f"- {name} x {qty} ({self._get_price_by_name(name)} บาท)" for name, qty in counter.items()]
+        return [f"- {item['name']} x {item['qty']} ({item['price']} บาท)" for item in self.aggregate_order_json(order_list)]
 
     def aggregate_order_json(self, order_list):
+        # OrderLedger รวมยอดไว้แล้วตอนเพิ่ม/แก้/ยกเลิกรายการ (cache จนกว่ารายการจะเปลี่ยน)
+        if isinstance(order_list, OrderLedger):
+            return order_list.lines_json()
         from collections import defaultdict
         counter = defaultdict(int)
         for item in order_list:
@@ -117,21 +183,21 @@ If your response includes spoken output, it must use the following SSML structur
             })
         return result
 
+    def render_order_text(self, order_list):
+        if isinstance(order_list, OrderLedger):
+            return order_list.render()
+        return "\n".join(self.aggregate_order(order_list))
+
     def _get_price_by_name(self, name):
-        for item in self.menu:
-            if item["name"] == name:
-                return item["price"]
-        return "N/A"
+        item = menu_index.find(name)
+        return format_price(item["price"]) if item else "N/A"
 
     def build_user_prompt(self, user_input, order_list=None):
         logger.debug("enter build_user_prompt")
 
         order_text = ""
         if order_list:
-            aggregated = self.aggregate_order_json(order_list)
-            logger.debug(f"build_user_prompt aggregate_order_json: aggregated = {aggregated}")
-            formatted_orders = [f"- {item['name']} x {item['qty']} ({item['price']} บาท)" for item in aggregated]
-            order_text = "\n\nรายการที่ลูกค้าสั่งแล้ว:\n" + "\n".join(formatted_orders)
+            order_text = "\n\nรายการที่ลูกค้าสั่งแล้ว:\n" + self.render_order_text(order_list)
         recommendation_text = self._get_recommendations_from_order(order_list)
 
         return f"""
@@ -145,27 +211,7 @@ recommendations on menu:
 {recommendation_text}
 
 ### Instructions:
-Please respond with the appropriate intent in JSON format only.  
-- Do not create new intent names  
-- Do not include any explanation or extra text outside the JSON  
-- Do not use ``` or ```json to wrap the JSON  
-- If there is an opportunity to proactively suggest additional menu items (e.g., items that pair well with the order or help fulfill a promotion), use intent = proactive_suggestion
-- You should calculate total price and apply relevant discounts from the promotion list if applicable.
-
-### Speech format:
-- If the response is spoken text, use SSML: <speak><prosody rate="110%" pitch="+1st">...</prosody></speak> and include <break time="300ms"/> for pause
-
-### Example:
-{{
-  "intent": "add_order",
-  "item": {{ "name": "ข้าวผัดกุ้ง", "qty": 1, "price": 60 }},
-  "response": "<speak><prosody rate='110%' pitch='+1st'>รับข้าวผัดกุ้ง 1 ที่นะคะ <break time='300ms'/> เพิ่มอะไรอีกไหมคะ?</prosody></speak>",
-  "total_price": 170,
-  "discount": 10
-}}
-### Notes:
-- "total_price" is the sum after applying any discounts.
-- "discount" is the value of the discount applied, if any (0 if no discount).
+Please respond with the appropriate intent in JSON format only, following the order rules and examples in the system prompt.
 """.strip()
     
     def build_intent_detection_prompt(self, user_input: str) -> str:
@@ -173,40 +219,21 @@ Please respond with the appropriate intent in JSON format only.
       Build a prompt to detect high-level intent and how broad the menu info scope should be.
       """
       return f"""
-You are an AI assistant in a restaurant. Your task is to identify the user's intent from the list below, assign a confidence score (from 0.0 to 1.0), and determine the appropriate level of menu/promotion detail to present.
-
-🔹 Intent categories:
-- greeting: Greeting the user, e.g. "Hello"
-- order: Commad to add/modify/cancel an order, asking for order details/summary, asking for bill e.g. "One can of Coke please"
-- menu_info: Asking about the menu, e.g. "What do you have?"
-- promotion: Asking about promotions, e.g. "Any specials?"
-- call_staff: Calling a staff member, e.g. "Can you get the staff?"
-- social: General conversation, e.g. "It's really hot today"
-- unknown: Unable to identify the intent
-
-🔹 menu_scope (used only when intent is `order` or `menu_info`):
-- general: General menu inquiry, e.g. "What's recommended?", "Can I see the menu?"
-- category: Asking about a specific category, e.g. "What drinks do you have?", "Any desserts?"
-- specific: Asking about a specific item, e.g. "Do you have crab fried rice?", "One bubble milk tea please"
-- n/a: Not related to menu
-
-If unsure, choose menu_scope = "general"
-
-Please respond only in the following JSON format:  
-Do not create new intent or menu_scope names  
-Do not add any explanations or text outside of the JSON
-
-### Example:
-{{
-  "intent": "menu_info",
-  "confidence": 0.86,
-  "menu_scope": "specific"
-}}
+{INTENT_DETECTION_INSTRUCTIONS}
 
 User message:
 "{user_input}"
 """.strip()
 
+    def build_intent_detection_messages(self, user_input: str) -> list:
+      """
+      เหมือน build_intent_detection_prompt แต่แยกคำสั่ง (คงที่) เป็น system message และข้อความผู้ใช้ไว้ท้ายสุด
+      """
+      return [
+          {"role": "system", "content": [{"type": "text", "text": INTENT_DETECTION_INSTRUCTIONS}]},
+          {"role": "user", "content": [{"type": "text", "text": f'User message:\n"{user_input}"'}]},
+      ]
+
     
     def build_prompt_by_intent(self, coarse_intent: str, user_input: str, order_list=None, menu_scope: str = "general") -> str:
         # Coarse intent categories:
@@ -248,46 +275,18 @@ Please respond with the appropriate intent in JSON format only.
         logger.debug("Enter build_order_prompt")
         order_text = ""
         if order_list:
-            aggregated = self.aggregate_order_json(order_list)
-            logger.debug(f"build_order_prompt aggregated: {aggregated}")
-            if aggregated:
-                order_text = "\n\nรายการที่ลูกค้าสั่งแล้ว:\n" + "\n".join(
-                    [f"- {item['name']} x {item['qty']} ({item['price']} บาท)" for item in aggregated]
-                )
-        menu_items = json.dumps(self.get_menu_items(with_price=True, as_json=True), ensure_ascii=False, indent=2)
-        promo_text = self.get_promotion_text()
-
+            rendered = self.render_order_text(order_list)
+            if rendered:
+                order_text = "\n\nรายการที่ลูกค้าสั่งแล้ว:\n" + rendered
         return f"""
 User said: {user_input}
 
 {order_text}
 
-### Full Menu (only select from these items):
-{menu_items}
-
-### Promotions:
-{promo_text}
-
 ### Instructions:
-- You are an AI assistant in a restaurant. Your task is to help customers order food and drinks from the provided menu.
-- Your response must follow the JSON format shown below and be suitable for both display and spoken output.
-- You should calculate total price and apply relevant discounts from the promotion list if applicable.
-- Only use the fields exactly as shown in the example. Do not invent or add any other field (e.g., do not use `removed_item`, `updated_item`, etc).
-- Use only `"item"` for all intents that modify the order.
-- For `add_order`, increase quantity if item exists. For `modify_order`, `qty` means the new final quantity (e.g., 0 = remove, 2 = set to 2).
-- Response text must be in Thai with valid SSML for Google Cloud TTS.
-- Only include items listed in the menu.
-- If an item is not available, inform the user politely in Thai.
+- Help the customer order food and drinks from the menu in the system prompt.
+- Your response must follow the order rules and the JSON format of the order example, suitable for both display and spoken output.
 - Do not create new intent names or include any explanation outside the JSON.
-
-### Response format (example):
-{{
-  "intent": "add_order",
-  "item": {{ "name": "ข้าวผัดกุ้ง", "qty": 1, "price": 60 }},
-  "response": "<speak><prosody rate='110%' pitch='+1st'>รับข้าวผัดกุ้ง 1 ที่นะคะ <break time='300ms'/> เพิ่มอะไรอีกไหมคะ?</prosody></speak>",
-  "total_price": 170,
-  "discount": 10
-}}
 """.strip()
 
 
@@ -309,34 +308,20 @@ Please respond with the appropriate intent in JSON format only.
     def build_info_prompt(self, user_input: str, full_menu: bool = False) -> str:
 
         logger.debug("Enter build_info_prompt")
+        # เมนู / โปรโมชันอยู่ใน system prompt แล้ว ที่นี่บอกแค่ว่าให้ตอบกว้างแค่ไหน
         if full_menu:
-            menu_items = json.dumps(self.get_menu_items(with_price=True, as_json=True), ensure_ascii=False, indent=2)
+            scope_text = "Answer from the full menu and promotions in the system prompt."
         else:
-            menu_items = json.dumps(self.get_menu_items(with_price=True, as_json=True, limit=5), ensure_ascii=False, indent=2)
-
-        # Insert instruction notes as requested
-        instruction_notes = """
-- Only use the fields exactly as shown in the example. Do not invent or add any other field (e.g., do not use `removed_item`, `updated_item`, etc).
-- Use only `"item"` for all intents that modify the order.
-- For `add_order`, increase quantity if item exists. For `modify_order`, `qty` means the new final quantity (e.g., 0 = remove, 2 = set to 2).
-""".strip()
-
-        promo_text = self.get_promotion_text()  # หรือ self.get_promotion_text(limit=3)
+            scope_text = "Give a short overview: mention at most 5 items from the menu in the system prompt."
 
         return f"""
 User: {user_input}
 
-### Menu List:
-{menu_items}
-
-### Promotions:
-{promo_text}
+{scope_text}
 
 If the user inquires about the menu or promotions, and you find there might be additional recommended items or a promotion condition is nearly fulfilled,  
 please proactively suggest menu items using intent = proactive_suggestion and respond with a spoken message in SSML format.
 
-{instruction_notes}
-
 Please respond with the appropriate intent in JSON format only.  
 - The intent must be related to providing information (e.g., menu or promotions)  
 - Do not create new intent names  
@@ -1,21 +1,28 @@
 import asyncio
 from collections import defaultdict
 from core.utils.logger_config import get_logger
-from server.mira.models.order import OrderStatus
+from server.mira.services.order_ledger import OrderLedger
+from server.mira.services.promotion_engine import promotion_engine
+from server.config.config import MIRA_CONTEXT_MAX_TOKENS, MIRA_HISTORY_MAX_TOKENS
+from server.shared.context_builder import context_builder, token_counter
 
 
 logger = get_logger(__name__)
 
+
 class SessionManager:
     MAX_HISTORY_COUNT = 5
-    MAX_HISTORY_CHARACTERS = 3000
+    MAX_HISTORY_TOKENS = MIRA_HISTORY_MAX_TOKENS
+    MAX_CONTEXT_TOKENS = MIRA_CONTEXT_MAX_TOKENS
     def __init__(self):
         self.sessions = {}
         self.session_locks = defaultdict(asyncio.Lock)
 
     def init_session(self, session_id, system_prompt=""):
+        ledger = OrderLedger(discount_policy=promotion_engine.apply)
         self.sessions[session_id] = {
-            "orders": [],
+            "ledger": ledger,
+            "orders": ledger.items,
             "history": [],
             "system_prompt": system_prompt,
             "status": "active",
@@ -55,44 +62,47 @@ class SessionManager:
         self.add_user_message(session_id, user_message)
         self.add_assistant_reply(session_id, assistant_message)
 
+    def get_order_ledger(self, session_id) -> OrderLedger:
+        session = self.sessions[session_id]
+        if "ledger" not in session:
+            ledger = OrderLedger(discount_policy=promotion_engine.apply)
+            for item in session.get("orders", []):
+                ledger.add(item)
+            session["ledger"] = ledger
+            session["orders"] = ledger.items
+        return session["ledger"]
+
     def add_order_item(self, session_id, item):
-        self.sessions[session_id]["orders"].append(item)
+        self.get_order_ledger(session_id).add(item)
         self.sessions[session_id]["fresh"] = False
 
     def get_order_list(self, session_id, status_filter=None):
-        orders = self.sessions[session_id]["orders"]
+        orders = self.get_order_ledger(session_id).items
         if status_filter:
             return [o for o in orders if getattr(o, "status", None) == status_filter]
         return orders
 
     def clear_orders(self, session_id):
-        self.sessions[session_id]["orders"] = []
+        ledger = self.get_order_ledger(session_id)
+        ledger.clear()
+        self.sessions[session_id]["orders"] = ledger.items
         self.sessions[session_id]["fresh"] = False
 
     def remove_order_item(self, session_id, item_name):
         if session_id in self.sessions:
-            for order in self.sessions[session_id]["orders"]:
-                if getattr(order, "name", None) == item_name:
-                    order.status = OrderStatus.canceled
+            self.get_order_ledger(session_id).cancel(item_name)
             self.sessions[session_id]["fresh"] = False
 
     def update_order_item(self, session_id, item):
-        for order in self.sessions[session_id]["orders"]:
-            if  getattr(order, "name", None) == getattr(item, "name", None):
-                order.status = item.status
-                order.qty = item.qty
-                order.price = item.price           
-                self.sessions[session_id]["fresh"] = False
+        ledger = self.get_order_ledger(session_id)
+        version = ledger.version
+        ledger.update(item)
+        if ledger.version != version:
+            self.sessions[session_id]["fresh"] = False
 
     def get_order_summary(self, session_id):
-        summary = {}
-        for o in self.sessions[session_id]["orders"]:
-            key = getattr(o, "name", None)
-            if key in summary:
-                summary[key]["qty"] += getattr(o, "qty", 0)
-            else:
-                summary[key] = {"qty": getattr(o, "qty", 0), "price": getattr(o, "price", 0)}
-        return summary
+        """ชื่อ → จำนวน / ราคา ของรายการที่ยังไม่ยกเลิก"""
+        return self.get_order_ledger(session_id).summary()
 
     def set_language(self, session_id, lang_code):
         self.sessions[session_id]["language"] = lang_code
@@ -121,8 +131,8 @@ class SessionManager:
     async def summarize_if_needed(self, session_id):
         async with self.session_locks[session_id]:
             history = self.sessions.get(session_id, {}).get("history", [])
-            total_characters = sum(len(msg["content"]) for msg in history if msg["role"] != "system")
-            if len(history) > self.MAX_HISTORY_COUNT or total_characters > self.MAX_HISTORY_CHARACTERS:
+            total_tokens = sum(token_counter.count_message(msg) for msg in history if msg["role"] != "system")
+            if len(history) > self.MAX_HISTORY_COUNT or total_tokens > self.MAX_HISTORY_TOKENS:
                 summary_text = await self._summarize_history(session_id, history)
                 self.sessions[session_id]["summary_text"] = summary_text
                 self.sessions[session_id]["history"] = []
@@ -154,37 +164,40 @@ class SessionManager:
     def get_summary_text(self, session_id):
         return self.sessions.get(session_id, {}).get("summary_text", "")
     
-    async def get_full_context(self, session_id, max_history: int = None, include_system_prompt: bool = True):
+    async def get_full_context(self, session_id, max_history: int = None, include_system_prompt: bool = True, reserve_tokens: int = 0):
+        """
+        system prompt + summary (เก็บเสมอ) แล้วเติม history ล่าสุดให้พอดี MAX_CONTEXT_TOKENS
+        reserve_tokens = token ของ user prompt ที่ผู้เรียกจะต่อท้าย
+        """
         async with self.session_locks[session_id]:
-            context = []
+            required = []
             if include_system_prompt and self.sessions[session_id].get("system_prompt"):
-                context.append({"role": "system", "content": self.sessions[session_id]["system_prompt"]})
+                required.append({"role": "system", "content": self.sessions[session_id]["system_prompt"]})
             if self.sessions[session_id].get("summary_text"):
-                context.append({"role": "system", "content": self.sessions[session_id]["summary_text"]})
+                required.append({"role": "system", "content": self.sessions[session_id]["summary_text"]})
             history = self.sessions[session_id].get("history", []).copy()
-            if max_history is not None:
-                history = history[-max_history:]
-            context += history
-            return context
+            packed = context_builder.pack_messages(
+                required,
+                history,
+                budget=self.MAX_CONTEXT_TOKENS,
+                reserve_tokens=reserve_tokens,
+                max_history=max_history,
+                label=f"[{session_id}] MIRA context",
+            )
+            return packed.messages
+
+    def get_subtotal(self, session_id: str) -> float:
+        return self.get_order_ledger(session_id).subtotal
 
     def get_total_price(self, session_id: str) -> float:
-        orders = self.sessions[session_id]["orders"]
-        return sum((getattr(item, "discount_price", item.price) or 0) * item.qty for item in orders)
+        return self.get_order_ledger(session_id).total
 
     def apply_discounts(self, session_id: str) -> list:
-        orders = self.sessions[session_id]["orders"]
-        discounts = []
-
-        subtotal = sum((item.price or 0) * item.qty for item in orders)
-        if subtotal > 300:
-            for item in orders:
-                if item.price:
-                    item.discount_price = round(item.price * 0.9, 2)
-            discounts.append("ลด 10% สำหรับยอดสั่งซื้อเกิน 300 บาท")
-
-        self.sessions[session_id]["discounts"] = discounts
-        self.sessions[session_id]["total_price"] = self.get_total_price(session_id)
-        return discounts
+        # ledger คำนวณส่วนลดใหม่ทุกครั้งที่รายการเปลี่ยนอยู่แล้ว ที่นี่แค่บันทึกผลลง session
+        ledger = self.get_order_ledger(session_id)
+        self.sessions[session_id]["discounts"] = ledger.discounts
+        self.sessions[session_id]["total_price"] = ledger.total
+        return ledger.discounts
 
     def get_discounts(self, session_id: str) -> list:
         return self.sessions.get(session_id, {}).get("discounts", [])
@@ -192,28 +205,36 @@ class SessionManager:
     def get_final_price(self, session_id: str) -> float:
         return self.sessions.get(session_id, {}).get("total_price", 0.0)
     
-    def log_token_usage(self, session_id: str, usage, source: str):
+    def log_token_usage(self, session_id: str, usage, source: str, elapsed: float = None):
         prompt_tokens = usage.prompt_tokens
         completion_tokens = usage.completion_tokens
         total_tokens = usage.total_tokens
+        # token ของ prompt prefix ที่ provider cache ไว้ (คิดราคาถูกกว่าและตอบเร็วกว่า)
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) or 0
 
         token_data = self.sessions[session_id].setdefault("token_usage", {
             "prompt_tokens": 0,
             "completion_tokens": 0,
-            "total_tokens": 0
+            "total_tokens": 0,
+            "cached_tokens": 0
         })
 
         token_data["prompt_tokens"] += prompt_tokens
         token_data["completion_tokens"] += completion_tokens
         token_data["total_tokens"] += total_tokens
+        token_data["cached_tokens"] += cached_tokens
 
-        logger.info(f"[{session_id}] 🔢 Token usage [for {source}]: input={prompt_tokens} / {token_data['prompt_tokens']}, output={completion_tokens} / {token_data['completion_tokens']}, total={total_tokens} / {token_data['total_tokens']}")
+        hit_rate = token_data["cached_tokens"] / token_data["prompt_tokens"] if token_data["prompt_tokens"] else 0.0
+        latency = f", latency={elapsed:.2f}s" if elapsed is not None else ""
+        logger.info(f"[{session_id}] 🔢 Token usage [for {source}]: input={prompt_tokens} / {token_data['prompt_tokens']}, cached={cached_tokens} / {token_data['cached_tokens']} ({hit_rate:.0%}), output={completion_tokens} / {token_data['completion_tokens']}, total={total_tokens} / {token_data['total_tokens']}{latency}")
 
     def get_token_usage(self, session_id: str):
         return self.sessions.get(session_id, {}).get("token_usage", {
             "prompt_tokens": 0,
             "completion_tokens": 0,
-            "total_tokens": 0
+            "total_tokens": 0,
+            "cached_tokens": 0
         })
 
     # Create a singleton instance for import
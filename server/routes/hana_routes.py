@@ -1,16 +1,23 @@
-from fastapi import APIRouter, Request, UploadFile, File, Form, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import APIRouter, Request, UploadFile, File, Form
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from typing import Union, Dict, Any
+from typing import Union, Dict, Any, Optional
+import asyncio
 import tempfile, shutil, os
 
 from server.shared.gpt_integration import GPTClient
 from server.shared.voice_profile_manager import VoiceProfileManager
 from core.audio.tts_manager import TTSManager
+from core.audio.tts_pipeline import TTSPipeline
 from core.utils.usage_tracker_instance import usage_tracker
 from server.shared.flow_handlers.intent_router import IntentRouter
 from server.shared.intent_classifier.classifier import IntentClassifier
 from server.shared.session_manager import session_manager
+from server.shared.json_stream import ndjson_line
+from server.shared.response_cache import response_cache
+from server.shared.search_cache import search_cache
+from server.shared.memory_compactor import memory_compactor
+from server.shared.memory_partitions import memory_partitions
 from core.utils.logger_config import get_logger
 
 router = APIRouter()
@@ -22,10 +29,12 @@ intent_router_instance = IntentRouter(gpt_client=gpt_client, intent_classifier=i
 
 vpm = VoiceProfileManager()
 tts_manager = TTSManager()
+tts_pipeline = TTSPipeline(tts_manager)
 
 class ChatRequest(BaseModel):
     session_id: str
     user_voice: str
+    speaker: Optional[str] = None  # จาก /upload-audio ถ้ามี → ใช้ความจำของผู้พูดคนนั้น
 
 class ChatResponse(BaseModel):
     response: Union[str, Dict[str, Any]]
@@ -34,49 +43,106 @@ class SpeakRequest(BaseModel):
     text: str
     is_ssml: bool = False
 
-def cleanup_file(path: str):
-    if os.path.exists(path):
-        try:
-            os.remove(path)
-            logger.info(f"🧹 Deleted: {path}")
-        except Exception as e:
-            logger.warning(f"⚠️ Failed to delete file: {e}")
-
 @router.post("/chat", response_model=ChatResponse)
 async def chat(chat_input: ChatRequest):
     session_id = chat_input.session_id
     session = session_manager.get_session(session_id)
+    if chat_input.speaker:
+        session.speaker = chat_input.speaker
     state_info = session_manager.get_state_info(session_id)
 
     if state_info and state_info.get("state") and state_info.get("state") != "complete":
-        result = intent_router_instance.route_by_state(state_info["state"], chat_input.user_voice, session)
+        result = await intent_router_instance.route_by_state(state_info["state"], chat_input.user_voice, session)
     else:
-        result = intent_router_instance.route(chat_input.user_voice, session)
+        result = await intent_router_instance.route(chat_input.user_voice, session)
 
     session_manager.update_session(session_id, intent=session.intent, state=session.state, context_update=session.context)
     logger.info(f"🗣️ {chat_input.user_voice}")
     logger.info(f"🤖 {result}")
     return ChatResponse(response=result)
 
-@router.post("/speak")
-async def speak(request: SpeakRequest, background_tasks: BackgroundTasks):
-    text = request.text
-    is_ssml = request.is_ssml
+@router.post("/chat/stream")
+async def chat_stream(chat_input: ChatRequest):
+    """
+    Streaming /chat (NDJSON): {"type": "intent"} → {"type": "delta", "text"}* → {"type": "final", "response"}
+    """
+    session_id = chat_input.session_id
+    session = session_manager.get_session(session_id)
+    if chat_input.speaker:
+        session.speaker = chat_input.speaker
+    state_info = session_manager.get_state_info(session_id)
 
+    async def event_stream():
+        if state_info and state_info.get("state") and state_info.get("state") != "complete":
+            # อยู่ระหว่าง flow หลายขั้น (เช่น reminder) ไม่มีข้อความให้ stream
+            result = await intent_router_instance.route_by_state(state_info["state"], chat_input.user_voice, session)
+            yield ndjson_line({"type": "final", "response": result})
+        else:
+            async for event, value in intent_router_instance.route_stream(chat_input.user_voice, session):
+                if event == "intent":
+                    yield ndjson_line({"type": "intent", "intent": value})
+                elif event == "delta":
+                    yield ndjson_line({"type": "delta", "text": value})
+                else:
+                    result = value
+                    yield ndjson_line({"type": "final", "response": result})
+
+        session_manager.update_session(session_id, intent=session.intent, state=session.state, context_update=session.context)
+        logger.info(f"🗣️ {chat_input.user_voice}")
+        logger.info(f"🤖 {result}")
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
+@router.post("/speak")
+async def speak(request: SpeakRequest):
     try:
-        mp3_path = tts_manager.synthesize(text=request.text, is_ssml=request.is_ssml)
-        background_tasks.add_task(cleanup_file, mp3_path)
-        return FileResponse(mp3_path, media_type="audio/mpeg")
+        audio = await asyncio.to_thread(tts_manager.synthesize_bytes, request.text, request.is_ssml)
+        return Response(content=audio, media_type="audio/mpeg")
     except Exception as e:
         return {"error": f"TTS failed: {str(e)}"}
 
+@router.post("/speak/stream")
+async def speak_stream(request: SpeakRequest):
+    """
+    สังเคราะห์เสียงทีละประโยคแล้ว stream MP3 ต่อกันตามลำดับ
+    client เริ่มเล่นประโยคแรกได้ทันทีโดยไม่ต้องรอทั้งคำตอบ
+    """
+    async def audio_stream():
+        try:
+            async for audio in tts_pipeline.stream_audio(request.text, is_ssml=request.is_ssml):
+                yield audio
+        except Exception as e:
+            logger.error(f"❌ TTS stream failed: {e}")
+
+    return StreamingResponse(audio_stream(), media_type="audio/mpeg")
+
 @router.get("/usage")
 async def usage_summary():
     summary = usage_tracker.summarize(by="day")
     return JSONResponse(content=summary)
 
+@router.get("/response-cache/stats")
+async def response_cache_stats():
+    if response_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **response_cache.stats()}
+
+@router.get("/search-cache/stats")
+async def search_cache_stats():
+    if search_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **search_cache.stats()}
+
+@router.get("/memory/summarizer/stats")
+async def summarizer_stats():
+    return memory_partitions.stats()
+
+@router.get("/memory/compactor/stats")
+async def compactor_stats():
+    return memory_compactor.stats()
+
 @router.post("/upload-audio")
-async def upload_audio(audio: UploadFile = File(...)):
+async def upload_audio(audio: UploadFile = File(...), session_id: Optional[str] = Form(None)):
     if not audio.filename:
         return {"error": "Empty filename"}
 
@@ -86,6 +152,8 @@ async def upload_audio(audio: UploadFile = File(...)):
 
     try:
         speaker = vpm.identify_speaker(temp_path)
+        if session_id:
+            session_manager.get_session(session_id).speaker = speaker
         return {"speaker": speaker}
     finally:
         os.remove(temp_path)
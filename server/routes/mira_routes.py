@@ -1,12 +1,14 @@
 # File: server/routes/mira_routes.py
 import json
 from fastapi import APIRouter
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from server.mira.models.user_input import AskRequest, ResetSessionRequest
 from server.mira.models.response import AssistantResponse
 from server.mira.services.session_manager import session_manager
 from server.mira.services.prompt_builder import PromptBuilder
-from server.mira.services.gpt_client import ask_gpt  # now async
+from server.mira.services.gpt_client import ask_gpt, ask_gpt_stream  # now async
+from server.shared.json_stream import IncrementalReplyParser, ndjson_line
+from server.shared.audio_store import audio_store
 from core.audio.tts_manager import TTSManager
 from server.vera.services.tts_module import generate_tts
 from server.mira.handlers.intent_routes import route_intent
@@ -21,26 +23,15 @@ logger = get_logger(__name__)
 router = APIRouter()
 tts_manager = TTSManager()
 
-# Store session replies temporarily
-TEMP_TTS_STORE = {}
-
 def safe_parse_json(text: str) -> Optional[dict]:
     try:
         return json.loads(text)
     except Exception:
         return None    
 
-@router.post("/ask", response_model=AssistantResponse)
-async def ask_user(req: AskRequest):
-    logger.debug(f"Received user input[{req.session_id}]: {req.user_input} ")
-    session_id = req.session_id
-    user_input = req.user_input.strip()
-
-    gpt_reply_text = await ask_gpt(session_id, user_input)
-    logger.debug(f"ask_gpt Reply: {gpt_reply_text}")
-
+async def _build_assistant_response(gpt_reply_text: str, session_id: str, gpt_result: Optional[dict] = None) -> AssistantResponse:
     try:
-        gpt_result = safe_parse_json(gpt_reply_text)
+        gpt_result = gpt_result if gpt_result is not None else safe_parse_json(gpt_reply_text)
         handler_result = None
         intent = gpt_result.get("intent", "unknown") if gpt_result else "unknown"
         gpt_reply_ssml = gpt_result.get("response", gpt_reply_text) if gpt_result else gpt_reply_text
@@ -70,13 +61,54 @@ async def ask_user(req: AskRequest):
         discount=getattr(handler_result, "discount", None)
     )
 
+@router.post("/ask", response_model=AssistantResponse)
+async def ask_user(req: AskRequest):
+    logger.debug(f"Received user input[{req.session_id}]: {req.user_input} ")
+    session_id = req.session_id
+    user_input = req.user_input.strip()
+
+    gpt_reply_text = await ask_gpt(session_id, user_input)
+    logger.debug(f"ask_gpt Reply: {gpt_reply_text}")
+
+    return await _build_assistant_response(gpt_reply_text, session_id)
+
+@router.post("/ask/stream")
+async def ask_user_stream(req: AskRequest):
+    """
+    Streaming /ask (NDJSON): ส่ง event ทีละบรรทัด
+    - {"type": "intent", "intent": ...}   ทันทีที่ LLM ระบุ intent
+    - {"type": "delta", "text": ...}      SSML ของ response ที่ทยอยมา
+    - {"type": "final", ...}              AssistantResponse หลัง handler ทำงานเสร็จ
+    """
+    logger.debug(f"Received user input (stream)[{req.session_id}]: {req.user_input} ")
+    session_id = req.session_id
+    user_input = req.user_input.strip()
+
+    async def event_stream():
+        parser = IncrementalReplyParser()
+        parts = []
+        async for delta in ask_gpt_stream(session_id, user_input):
+            parts.append(delta)
+            for field, value in parser.feed(delta):
+                if field == "intent":
+                    yield ndjson_line({"type": "intent", "intent": value})
+                else:
+                    yield ndjson_line({"type": "delta", "text": value})
+
+        gpt_reply_text = "".join(parts).strip()
+        logger.debug(f"ask_gpt_stream Reply: {gpt_reply_text}")
+        final = await _build_assistant_response(gpt_reply_text, session_id, gpt_result=parser.result())
+        yield ndjson_line({"type": "final", **final.model_dump()})
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
+
 @router.get("/speak/{tts_id}")
 async def speak(tts_id: str):
     logger.info(f"/speak requested: {tts_id}")
-    path = TEMP_TTS_STORE.get(tts_id)
-    if path and os.path.exists(path):
-        logger.info(f"Serving TTS file: {path}")
-        return FileResponse(path, media_type="audio/mpeg")
+    audio = audio_store.get(tts_id)
+    if audio is not None:
+        logger.info(f"Serving TTS audio: {tts_id}")
+        return Response(content=audio, media_type="audio/mpeg")
     logger.warning(f"TTS file not found for ID: {tts_id}")
     return JSONResponse({"error": "TTS not found"}, status_code=404)
 
@@ -1,37 +1,57 @@
 # server/routers/shared_routes.py
-from fastapi import APIRouter, BackgroundTasks
-from fastapi.responses import FileResponse
+import asyncio
+from fastapi import APIRouter
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
 from core.audio.tts_manager import TTSManager
-import os
+from core.audio.tts_pipeline import TTSPipeline
+from core.audio.tts_cache import tts_cache
+from server.shared.audio_store import audio_store
 from core.utils.logger_config import get_logger
 
 logger = get_logger(__name__)
 
 router = APIRouter()
 tts_manager = TTSManager()
-
-def cleanup_file(path: str):
-    if os.path.exists(path):
-        try:
-            os.remove(path)
-            logger.info(f"🧹 Deleted: {path}")
-        except Exception as e:
-            logger.warning(f"⚠️ Failed to delete file: {e}")
+tts_pipeline = TTSPipeline(tts_manager)
 
 class SpeakRequest(BaseModel):
     text: str
     is_ssml: bool = False
 
 @router.post("/speak")
-async def speak(request: SpeakRequest, background_tasks: BackgroundTasks):
+async def speak(request: SpeakRequest):
     try:
-        mp3_path = tts_manager.synthesize(text=request.text, is_ssml=request.is_ssml)
-        background_tasks.add_task(cleanup_file, mp3_path)
-        return FileResponse(mp3_path, media_type="audio/mpeg")
+        audio = await asyncio.to_thread(tts_manager.synthesize_bytes, request.text, request.is_ssml)
+        return Response(content=audio, media_type="audio/mpeg")
     except Exception as e:
         return {"error": f"TTS failed: {str(e)}"}
 
+@router.post("/speak/stream")
+async def speak_stream(request: SpeakRequest):
+    """
+    สังเคราะห์เสียงทีละประโยคแล้ว stream MP3 ต่อกันตามลำดับ
+    client เริ่มเล่นประโยคแรกได้ทันทีโดยไม่ต้องรอทั้งคำตอบ
+    """
+    async def audio_stream():
+        try:
+            async for audio in tts_pipeline.stream_audio(request.text, is_ssml=request.is_ssml):
+                yield audio
+        except Exception as e:
+            logger.error(f"❌ TTS stream failed: {e}")
+
+    return StreamingResponse(audio_stream(), media_type="audio/mpeg")
+
+@router.get("/tts-cache/stats")
+async def tts_cache_stats():
+    if tts_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **tts_cache.stats()}
+
+@router.get("/audio-store/stats")
+async def audio_store_stats():
+    return audio_store.stats()
+
 @router.get("/")
 async def root():
     return {"message": "Shared API is running."}
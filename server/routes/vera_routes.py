@@ -1,21 +1,23 @@
 from fastapi import APIRouter
-from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.requests import Request
 from pydantic import BaseModel
 from typing import Optional, List
+import asyncio
 import io
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 import os
 import json
-import re
-import unicodedata
 
-from server.config.config import OPENAI_API_KEY, OPENAI_MODEL, TTS_PATH
-from server.vera.services.tts_module import generate_tts
+from server.config.config import OPENAI_API_KEY, OPENAI_MODEL, VERA_CONTEXT_MAX_TOKENS
+from server.vera.services.tts_module import generate_tts_bytes
 from core.audio.tts_manager import TTSManager
 from server.vera.services.prompt_builder import PromptBuilder
-from server.vera.services.gpt_client import ask_gpt
-from server.vera.services.cleaner import cleanup_old_tts_files
+from server.vera.services.gpt_client import ask_gpt, ask_gpt_stream
+from server.shared.json_stream import IncrementalReplyParser, ndjson_line
+from server.shared.audio_store import audio_store
+from server.shared.menu_index import MenuIndex
 from server.vera.services.session_manager import SessionManager
 from server.vera.services.order import OrderItem
 from core.utils.logger_config import get_logger
@@ -26,18 +28,15 @@ logger = get_logger(__name__)
 session_manager = SessionManager()
 tts_manager = TTSManager()
 
-# Start background TTS cleaner
-cleanup_old_tts_files(ttl_minutes=15, interval_seconds=300)
-
-# Load mock data
-with open("server/vera/data/menu.json", "r", encoding="utf-8") as f:
-    MENU_DATA = json.load(f)
+# Load mock data (เมนูใช้ index ที่โหลดใหม่เองเมื่อ menu.json ถูกแก้)
+vera_menu_index = MenuIndex("server/vera/data/menu.json")
 
 with open("server/vera/data/promotions.json", "r", encoding="utf-8") as f:
     PROMOTIONS = json.load(f)
     
-# Store session replies temporarily
-TEMP_TTS_STORE = {}
+# เสียงของแต่ละคำตอบเก็บใน audio_store (tts_id → MP3) /ask ตอบกลับทันทีโดยไม่รอเสียง
+TTS_WAIT_TIMEOUT = 30
+tts_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vera-tts")
 
 
 class AskRequest(BaseModel):
@@ -53,27 +52,17 @@ class SpeakResponse(BaseModel):
 
 
 
-def normalize_text(text: str) -> str:
-    return unicodedata.normalize("NFKC", text.strip().lower())
-
 def lookup_price(item_name: str) -> Optional[float]:
-    norm_input = normalize_text(item_name)
-    for item in MENU_DATA:
-        if normalize_text(item["name"]) == norm_input or norm_input in normalize_text(item["name"]):
-            return item["price"]
-    return None
+    return vera_menu_index.lookup_price(item_name)
 
 def validate_item(item_name: str) -> bool:
-    norm_input = normalize_text(item_name)
-    for item in MENU_DATA:
-        norm_menu_name = normalize_text(item["name"])
-        if norm_input == norm_menu_name:
-            return True
-        if norm_input in norm_menu_name:
-            return True
-        if re.search(rf"^{re.escape(norm_input)}", norm_menu_name):
-            return True
-    return False
+    return vera_menu_index.validate_item(item_name)
+
+def _schedule_tts(reply_ssml: str) -> str:
+    tts_id = str(uuid.uuid4())
+    future = tts_executor.submit(generate_tts_bytes, reply_ssml)
+    audio_store.put_pending(tts_id, future)
+    return tts_id
 
 def safe_parse_json(text: str) -> Optional[dict]:
     try:
@@ -84,36 +73,34 @@ def safe_parse_json(text: str) -> Optional[dict]:
 # Dummy in-memory session store for demonstration
 session_history = {}
 
-@router.post("/ask")
-async def ask_user(req: AskRequest):
-    logger.info(f"/ask received from {req.session_id}: {req.user_input}")
-    prompt_builder = PromptBuilder(MENU_DATA, PROMOTIONS)
+async def _prepare_messages(session_id: str, user_input: str) -> list:
+    prompt_builder = PromptBuilder(vera_menu_index.items, PROMOTIONS)
 
-    if not session_manager.has_session(req.session_id):
+    if not session_manager.has_session(session_id):
         init_prompt = prompt_builder.build_init_prompt()
-        session_manager.init_session(req.session_id, system_prompt=init_prompt)
+        session_manager.init_session(session_id, system_prompt=init_prompt)
 
-    text = req.user_input.strip()
-    order_list = session_manager.get_order_list(req.session_id)
+    text = user_input.strip()
+    order_list = session_manager.get_order_list(session_id)
 
     if text in ["แค่นี้", "ยืนยัน", "สรุป"]:
         prompt = prompt_builder.build_order_summary_prompt(order_list)
     elif text in ["ยกเลิก", "ยกเลิกรายการ"]:
-        session_manager.clear_order(req.session_id)
+        session_manager.clear_order(session_id)
         prompt = prompt_builder.build_cancel_prompt()
     elif text in ["สวัสดี", "เริ่มใหม่"]:
         prompt = prompt_builder.build_greeting_prompt()
     else:
         prompt = prompt_builder.build_user_prompt(text)
 
-    session_manager.add_user_message(req.session_id, prompt)
-    messages = session_manager.get_history(req.session_id)
+    session_manager.add_user_message(session_id, prompt)
+    return await session_manager.get_history(session_id, max_tokens=VERA_CONTEXT_MAX_TOKENS)
 
-    reply_text = ask_gpt(messages)
-    session_manager.add_assistant_reply(req.session_id, reply_text)
+def _process_reply(session_id: str, reply_text: str, gpt_result: Optional[dict] = None) -> dict:
+    session_manager.add_assistant_reply(session_id, reply_text)
     logger.debug(f"GPT reply: {reply_text}")
 
-    gpt_result = safe_parse_json(reply_text)
+    gpt_result = gpt_result if gpt_result is not None else safe_parse_json(reply_text)
     if gpt_result:
         intent = gpt_result.get("intent")
 
@@ -136,7 +123,7 @@ async def ask_user(req: AskRequest):
                     raise ValueError("Price not found")
 
                 order_item = OrderItem(name=name, qty=qty, price=price)
-                session_manager.add_order_item(req.session_id, order_item)
+                session_manager.add_order_item(session_id, order_item)
                 logger.info(f"✅ Order added: {order_item}")
                 
             if not validate_item(name):
@@ -147,7 +134,7 @@ async def ask_user(req: AskRequest):
                 raise ValueError("Price not found")
 
             order_item = OrderItem(name=name, qty=qty, price=price)
-            session_manager.add_order_item(req.session_id, order_item)
+            session_manager.add_order_item(session_id, order_item)
             logger.info(f"✅ Order added: {order_item}")
 
         reply_ssml = gpt_result.get("response", reply_text)
@@ -158,17 +145,46 @@ async def ask_user(req: AskRequest):
         reply_ssml = reply_text
         intent = "unknown"
 
-    tts_id = str(uuid.uuid4())
-    tts_path = os.path.join(TTS_PATH, f"{tts_id}.mp3")
-    generate_tts(reply_ssml, tts_path)
-    TEMP_TTS_STORE[tts_id] = tts_path
-    logger.info(f"Generated TTS file: {tts_path}")
+    tts_id = _schedule_tts(reply_ssml)
 
-    return JSONResponse({
+    return {
         "reply_text": reply_ssml,
         "tts_url": f"/speak/{tts_id}",
         "intent": intent
-    })
+    }
+
+@router.post("/ask")
+async def ask_user(req: AskRequest):
+    logger.info(f"/ask received from {req.session_id}: {req.user_input}")
+    messages = await _prepare_messages(req.session_id, req.user_input)
+
+    reply_text = await ask_gpt(messages)
+    return JSONResponse(_process_reply(req.session_id, reply_text))
+
+@router.post("/ask/stream")
+async def ask_user_stream(req: AskRequest):
+    """
+    Streaming /ask (NDJSON): intent → delta (SSML ที่ทยอยมา) → final (reply_text, tts_url, intent)
+    """
+    logger.info(f"/ask/stream received from {req.session_id}: {req.user_input}")
+    messages = await _prepare_messages(req.session_id, req.user_input)
+
+    async def event_stream():
+        parser = IncrementalReplyParser()
+        parts = []
+        async for delta in ask_gpt_stream(messages):
+            parts.append(delta)
+            for field, value in parser.feed(delta):
+                if field == "intent":
+                    yield ndjson_line({"type": "intent", "intent": value})
+                else:
+                    yield ndjson_line({"type": "delta", "text": value})
+
+        reply_text = "".join(parts).strip()
+        result = _process_reply(req.session_id, reply_text, parser.result())
+        yield ndjson_line({"type": "final", **result})
+
+    return StreamingResponse(event_stream(), media_type="application/x-ndjson")
 
 @router.post("/reset-session")
 async def reset_session(req: ResetSessionRequest):
@@ -179,10 +195,18 @@ async def reset_session(req: ResetSessionRequest):
 @router.get("/speak/{tts_id}")
 async def speak(tts_id: str):
     logger.info(f"/speak requested: {tts_id}")
-    path = TEMP_TTS_STORE.get(tts_id)
-    if path and os.path.exists(path):
-        logger.info(f"Serving TTS file: {path}")
-        return FileResponse(path, media_type="audio/mpeg")
+    try:
+        audio = await audio_store.wait(tts_id, timeout=TTS_WAIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"⏳ TTS still not ready for {tts_id}")
+        return JSONResponse({"error": "TTS not ready"}, status_code=504)
+    except Exception as e:
+        logger.error(f"❌ TTS generation failed for {tts_id}: {e}")
+        return JSONResponse({"error": "TTS generation failed"}, status_code=500)
+
+    if audio is not None:
+        logger.info(f"Serving TTS audio: {tts_id}")
+        return Response(content=audio, media_type="audio/mpeg")
     logger.warning(f"TTS file not found for ID: {tts_id}")
     return JSONResponse({"error": "TTS not found"}, status_code=404)
 
@@ -190,6 +214,6 @@ async def speak(tts_id: str):
 async def debug_session_history(session_id: str):
     if not session_manager.has_session(session_id):
         return JSONResponse({"error": "Session not found"}, status_code=404)
-    return JSONResponse(session_manager.get_history(session_id))
+    return JSONResponse(await session_manager.get_history(session_id))
 
 # export router
\ No newline at end of file
@@ -0,0 +1,218 @@
+# server/shared/audio_store.py
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Optional
+
+from server.config.config import (
+    AUDIO_STORE_TTL_SECONDS,
+    AUDIO_STORE_MAX_BYTES,
+    AUDIO_STORE_SPILL_DIR,
+    AUDIO_STORE_MAX_SPILL_BYTES,
+)
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class AudioEntry:
+    expires_at: float
+    size: int
+    data: Optional[bytes] = None   # None = ถูก spill ลง disk แล้ว
+    media_type: str = "audio/mpeg"
+
+
+class AudioStore:
+    """
+    ที่เก็บไฟล์เสียงชั่วคราว (tts_id → MP3) สำหรับ /speak/{tts_id} ของ MIRA / VERA
+    - หมดอายุตาม TTL: ใช้ min-heap ของเวลาหมดอายุ ลบเฉพาะที่หมดอายุแล้วทุกครั้งที่มีการเรียกใช้
+      (ไม่ต้องสแกนทั้ง directory แบบ cleaner เดิม)
+    - จำกัดขนาดใน memory: เกิน max_bytes จะย้ายอันเก่าสุดลง disk (ถ้าตั้ง spill_dir) หรือทิ้งไป
+    - รองรับเสียงที่ยังสังเคราะห์ไม่เสร็จ: put_pending() แล้ว wait() รอได้
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = AUDIO_STORE_TTL_SECONDS,
+        max_bytes: int = AUDIO_STORE_MAX_BYTES,
+        spill_dir: Optional[str] = AUDIO_STORE_SPILL_DIR,
+        max_spill_bytes: int = AUDIO_STORE_MAX_SPILL_BYTES,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir or None
+        self.max_spill_bytes = max_spill_bytes
+
+        self._entries = OrderedDict()  # audio_id → AudioEntry (เก่าสุดอยู่หน้า)
+        self._pending = {}             # audio_id → concurrent.futures.Future
+        self._expiry_heap = []         # (expires_at, seq, audio_id)
+        self._seq = itertools.count()
+        self._memory_bytes = 0
+        self._spill_bytes = 0
+        self._lock = threading.Lock()
+
+        self.puts = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.spilled = 0
+
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+
+    # ---------- Write ----------
+
+    def put(self, audio_id: str, audio: bytes, ttl: Optional[float] = None, media_type: str = "audio/mpeg"):
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.ttl_seconds)
+        with self._lock:
+            self._remove(audio_id)
+            self._entries[audio_id] = AudioEntry(expires_at=expires_at, size=len(audio), data=audio, media_type=media_type)
+            self._memory_bytes += len(audio)
+            heapq.heappush(self._expiry_heap, (expires_at, next(self._seq), audio_id))
+            self.puts += 1
+            self._purge_expired(now)
+            self._enforce_memory_limit()
+
+    def put_pending(self, audio_id: str, future: Future, ttl: Optional[float] = None):
+        """
+        ลงทะเบียนเสียงที่กำลังสังเคราะห์ (future คืน bytes) เมื่อเสร็จจะถูก put() อัตโนมัติ
+        """
+        with self._lock:
+            self._pending[audio_id] = future
+
+        def on_done(done: Future):
+            if not done.cancelled() and done.exception() is None:
+                self.put(audio_id, done.result(), ttl=ttl)
+            else:
+                logger.error(f"❌ Audio generation failed for {audio_id}: {done.exception() if not done.cancelled() else 'cancelled'}")
+            with self._lock:
+                self._pending.pop(audio_id, None)
+
+        future.add_done_callback(on_done)
+
+    # ---------- Read ----------
+
+    def get(self, audio_id: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            self._purge_expired(now)
+            entry = self._entries.get(audio_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if entry.data is not None:
+                return entry.data
+        return self._read_spilled(audio_id)
+
+    def is_pending(self, audio_id: str) -> bool:
+        with self._lock:
+            return audio_id in self._pending
+
+    async def wait(self, audio_id: str, timeout: float) -> Optional[bytes]:
+        """
+        คืนเสียงของ audio_id ถ้ายังสังเคราะห์อยู่จะรอไม่เกิน timeout (asyncio.TimeoutError ถ้าเกิน)
+        """
+        with self._lock:
+            future = self._pending.get(audio_id)
+        if future is not None:
+            # shield: timeout ของ client ไม่ควรยกเลิกงานสังเคราะห์
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout=timeout)
+        return self.get(audio_id)
+
+    # ---------- Internals (ต้องถือ lock) ----------
+
+    def _purge_expired(self, now: float):
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, _, audio_id = heapq.heappop(self._expiry_heap)
+            entry = self._entries.get(audio_id)
+            # heap อาจมี record เก่าของ id ที่ถูก put ซ้ำ → ลบเฉพาะที่เวลาตรงกัน
+            if entry is not None and entry.expires_at == expires_at:
+                self._remove(audio_id)
+                self.expired += 1
+
+    def _enforce_memory_limit(self):
+        if self._memory_bytes <= self.max_bytes:
+            return
+        for audio_id in list(self._entries):
+            if self._memory_bytes <= self.max_bytes:
+                break
+            entry = self._entries[audio_id]
+            if entry.data is None:
+                continue
+            if self.spill_dir and self._spill_bytes + entry.size <= self.max_spill_bytes and self._spill(audio_id, entry):
+                continue
+            self._remove(audio_id)
+            self.evicted += 1
+
+    def _spill(self, audio_id: str, entry: AudioEntry) -> bool:
+        try:
+            with open(self._spill_path(audio_id), "wb") as f:
+                f.write(entry.data)
+        except OSError as e:
+            logger.warning(f"⚠️ Failed to spill audio {audio_id}: {e}")
+            return False
+        entry.data = None
+        self._memory_bytes -= entry.size
+        self._spill_bytes += entry.size
+        self.spilled += 1
+        return True
+
+    def _remove(self, audio_id: str):
+        entry = self._entries.pop(audio_id, None)
+        if entry is None:
+            return
+        if entry.data is not None:
+            self._memory_bytes -= entry.size
+        else:
+            self._spill_bytes -= entry.size
+            try:
+                os.remove(self._spill_path(audio_id))
+            except OSError:
+                pass
+
+    def _spill_path(self, audio_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{audio_id}.mp3")
+
+    def _read_spilled(self, audio_id: str) -> Optional[bytes]:
+        try:
+            with open(self._spill_path(audio_id), "rb") as f:
+                return f.read()
+        except OSError:
+            with self._lock:
+                self._remove(audio_id)
+            return None
+
+    # ---------- Metrics ----------
+
+    def purge(self):
+        with self._lock:
+            self._purge_expired(time.time())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "pending": len(self._pending),
+                "memory_bytes": self._memory_bytes,
+                "spill_bytes": self._spill_bytes,
+                "puts": self.puts,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "spilled": self.spilled,
+            }
+
+
+# Singleton instance for global use (shared by MIRA / VERA routes)
+audio_store = AudioStore()
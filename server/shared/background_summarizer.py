@@ -1,144 +1,306 @@
 import threading
 import time
+from abc import ABC, abstractmethod
 
-from openai import OpenAI
-from server.config.config import OPENAI_MODEL, OPENAI_API_KEY
+from server.config.config import (
+    OPENAI_MODEL,
+    OPENAI_API_KEY,
+    SUMMARY_TRIGGER_WRITES,
+    SUMMARY_TRIGGER_TOKENS,
+    SUMMARY_MAX_DELAY_SEC,
+    SUMMARY_BATCH_MAX_ROWS,
+    SUMMARY_BATCH_MAX_TOKENS,
+    SUMMARY_RETRY_SEC,
+)
+from server.shared.context_builder import token_counter
+from server.shared.llm_gateway import llm_gateway
 from core.utils.logger_config import get_logger
 
 logger = get_logger(__name__)
 
-class MemoryBackgroundSummarizer:
-    def __init__(self, memory_manager, api_key=OPENAI_API_KEY, model=OPENAI_MODEL, interval_sec=30):
-        logger.info("MemoryBackgroundSummarizer Initialized")
+
+class _ConversationSummarizer(ABC):
+    """
+    สรุปข้อความที่ยังไม่ได้สรุปเป็นชุดใน LLM call เดียว (ไม่เกิน batch_max_rows แถว / batch_max_tokens token)
+    ไม่มี thread ของตัวเอง: SummaryScheduler เป็นคนเรียก run_once
+    """
+    name = ""
+    is_history = False
+    system_prompt = ""
+    intro = ""
+    instruction = ""
+
+    def __init__(self, memory_manager, api_key=OPENAI_API_KEY, model=OPENAI_MODEL,
+                 batch_max_rows=SUMMARY_BATCH_MAX_ROWS, batch_max_tokens=SUMMARY_BATCH_MAX_TOKENS):
+        logger.info(f"{type(self).__name__} Initialized")
         self.memory_manager = memory_manager
-        self.client = OpenAI(api_key=api_key)
         self.model = model
-        self.interval_sec = interval_sec
-        self._stop_event = threading.Event()
-        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self.batch_max_rows = batch_max_rows
+        self.batch_max_tokens = batch_max_tokens
 
-    def test_check(self):
-        logger.info("Enter test_check->start")
-    def start(self):
-        logger.info("Enter MemoryBackgroundSummarizer->start")
-        if not self._thread.is_alive():
-            logger.info("🚀 Memory summarizer started.")
-            self._thread.start()
+    @abstractmethod
+    def _fetch(self, limit):
+        """แถวที่ยังไม่ได้สรุป เรียงเก่า → ใหม่ ไม่เกิน limit แถว"""
 
-    def stop(self):
-        self._stop_event.set()
-        self._thread.join()
-        logger.info("🛑 Memory summarizer stopped.")
+    @abstractmethod
+    def _store(self, summary):
+        """บันทึก summary ของชุดที่สรุปแล้ว"""
+
+    def _take_batch(self, rows):
+        """แถวเก่าสุดต่อกันที่รวมแล้วไม่เกิน batch_max_tokens (อย่างน้อย 1 แถว)"""
+        batch, used = [], 0
+        for row in rows:
+            cost = token_counter.count(row["content"])
+            if batch and used + cost > self.batch_max_tokens:
+                break
+            batch.append(row)
+            used += cost
+        return batch
 
-    def run_once(self):
-        logger.debug("Enter MemoryBackgroundSummarizer->run_once")
-        unprocessed = self.memory_manager.get_unsummarized(limit=5)
+    def run_once(self) -> int:
+        """สรุป 1 ชุด คืนจำนวนแถวที่สรุป (0 = ไม่มีค้าง), LLM error ส่งต่อให้ scheduler จัดการ retry"""
+        logger.debug(f"Enter {type(self).__name__}->run_once")
+        unprocessed = self._fetch(self.batch_max_rows)
         if not unprocessed:
-            return
+            return 0
 
-        logger.debug(f"unprocessed = {unprocessed}")
-        # ✅ ใช้ dict access แทน index
-        text = "\n".join(f"{row['role']}: {row['content']}" for row in reversed(unprocessed))
+        batch = self._take_batch(unprocessed)
+        # ✅ แถวเรียงเก่า → ใหม่ตามลำดับบทสนทนา
+        text = "\n".join(f"{row['role']}: {row['content']}" for row in batch)
+        prompt = f"{self.intro}\nต่อไปนี้คือบทสนทนา:\n{text}\n\n{self.instruction}"
 
-        prompt = (
-            "คุณคือ AI ที่ช่วยสรุปบทสนทนาก่อนหน้าให้กระชับแต่คงสาระสำคัญไว้\n"
-            "ต่อไปนี้คือบทสนทนา:\n"
-            f"{text}\n"
-            "\nสรุปประเด็นสำคัญในบทสนทนาให้กระชับไม่เกิน 5 บรรทัด"
+        response = llm_gateway.chat_sync(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.4,
         )
+        summary = response.choices[0].message.content.strip()
+        self._store(summary)
+        # ✅ Mark the processed ones as summarized
+        self.memory_manager.mark_as_summarized([row["id"] for row in batch])
+        logger.debug(f"📝 {self.name} summarized {len(batch)} rows: {summary}")
+        return len(batch)
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "คุณคือ AI ช่วยสรุปข้อมูล"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.4,
-            )
-            summary = response.choices[0].message.content.strip()
-            self.memory_manager.add_summary(summary)
-            # ✅ Mark the processed ones as summarized
-            ids = [row["id"] for row in unprocessed]
-            self.memory_manager.mark_as_summarized(ids)
-            logger.debug(f"summary={summary}")
-            logger.debug("📝 Memory summarized.")
-        except Exception as e:
-            logger.error(f"❌ Failed to summarize memory: {e}")
-    
-    def _run_loop(self):
-        logger.debug("🔁 Loop started.")
-        while not self._stop_event.is_set():
-            logger.debug("💤 Waiting for next round...")
-            try:
-                self.run_once()
-            except Exception as e:
-                logger.error(f"❌ Error: {e}")
-            self._stop_event.wait(self.interval_sec)
-        logger.debug("✅ Loop exited cleanly.")
-    
-class HistoryBackgroundSummarizer:
-    def __init__(self, memory_manager, api_key=OPENAI_API_KEY, model=OPENAI_MODEL, interval_sec=60):
-        logger.info("MemoryBackgroundSummarizer Initialized")
+
+class MemoryBackgroundSummarizer(_ConversationSummarizer):
+    name = "memory"
+    is_history = False
+    system_prompt = "คุณคือ AI ช่วยสรุปข้อมูล"
+    intro = "คุณคือ AI ที่ช่วยสรุปบทสนทนาก่อนหน้าให้กระชับแต่คงสาระสำคัญไว้"
+    instruction = "สรุปประเด็นสำคัญในบทสนทนาให้กระชับไม่เกิน 5 บรรทัด"
+
+    def _fetch(self, limit):
+        return self.memory_manager.get_unsummarized(limit=limit)
+
+    def _store(self, summary):
+        self.memory_manager.add_summary(summary)
+
+
+class HistoryBackgroundSummarizer(_ConversationSummarizer):
+    name = "history"
+    is_history = True
+    system_prompt = "คุณคือผู้ช่วย AI"
+    intro = "คุณคือ AI ที่ช่วยสรุปบทสนทนาให้กระชับเข้าใจง่าย โดยคงประเด็นสำคัญไว้"
+    instruction = "ช่วยสรุปบทสนทนานี้ให้สั้นไม่เกิน 5 บรรทัด"
+
+    def _fetch(self, limit):
+        return self.memory_manager.get_unsummarized_history(limit=limit)
+
+    def _store(self, summary):
+        self.memory_manager.add_history_summary(summary)
+
+
+class _Pending:
+    __slots__ = ("writes", "tokens", "since")
+
+    def __init__(self):
+        self.writes = 0
+        self.tokens = 0
+        self.since = None  # time.monotonic() ของข้อความค้างที่เก่าสุด
+
+
+class SummaryScheduler:
+    """
+    worker thread เดียวสำหรับ summarizer ทุกตัว ทำงานตาม event แทนการ poll SQLite ทุก 30 / 60 วินาที
+    - MemoryManager.add_message เรียก notify(): นับแถว / token ที่ค้างของแต่ละ summarizer ในหน่วยความจำ (ไม่แตะ DB)
+    - ค้างครบ trigger_writes หรือ trigger_tokens → ปลุก worker ให้สรุปค้างทั้งหมดเป็นชุด ๆ จนหมด
+    - ค้างไม่ถึงเกณฑ์ → สรุปเมื่อค้างนานเกิน max_delay_sec, ไม่มีอะไรค้าง → worker หลับจนกว่าจะมี notify
+    - LLM ล้มเหลว → งานค้างยังอยู่ ลองใหม่หลัง retry_sec
+    stats(): ตัวเลข backpressure (ค้างกี่แถว / token, ค้างนานแค่ไหน, batch ใช้เวลาเท่าไร, ล้มเหลวกี่ครั้ง)
+    """
+
+    def __init__(self, memory_manager, summarizers, trigger_writes=SUMMARY_TRIGGER_WRITES,
+                 trigger_tokens=SUMMARY_TRIGGER_TOKENS, max_delay_sec=SUMMARY_MAX_DELAY_SEC,
+                 retry_sec=SUMMARY_RETRY_SEC):
         self.memory_manager = memory_manager
-        self.client = OpenAI(api_key=api_key)
-        self.model = model
-        self.interval_sec = interval_sec
+        self.summarizers = {summarizer.is_history: summarizer for summarizer in summarizers}
+        self.trigger_writes = trigger_writes
+        self.trigger_tokens = trigger_tokens
+        self.max_delay_sec = max_delay_sec
+        self.retry_sec = retry_sec
+
+        self._pending = {is_history: _Pending() for is_history in self.summarizers}
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._wake = threading.Event()
         self._stop_event = threading.Event()
         self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._retry_at = 0.0
+
+        self.busy = False
+        self.triggers = {"writes": 0, "tokens": 0, "delay": 0, "flush": 0}
+        self.batches = 0
+        self.rows_summarized = 0
+        self.failures = 0
+        self.last_batch_sec = 0.0
+        self.max_batch_sec = 0.0
+
+        memory_manager.add_listener(self.notify)
 
     def start(self):
-        if not self._thread.is_alive():
-            logger.info("🚀 History summarizer started.")
-            self._thread.start()
+        if self._thread.is_alive():
+            return
+        # งานที่ค้างจากรอบก่อน (เช่น restart): นับเป็นข้อความค้าง ให้ trigger / max_delay จัดการตามปกติ
+        now = time.monotonic()
+        with self._lock:
+            for is_history, pending in self._pending.items():
+                backlog = self.memory_manager.count_unsummarized(is_history)
+                if backlog:
+                    pending.writes += backlog
+                    pending.since = pending.since or now
+        logger.info("🚀 Summary scheduler started.")
+        self._thread.start()
+        self._wake.set()
 
     def stop(self):
         self._stop_event.set()
-        self._thread.join()
-        logger.info("🛑 History summarizer stopped.")
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        logger.info("🛑 Summary scheduler stopped.")
+
+    def notify(self, content, is_history=False):
+        pending = self._pending.get(bool(is_history))
+        if pending is None:
+            return
+        tokens = token_counter.count(content)
+        with self._lock:
+            pending.writes += 1
+            pending.tokens += tokens
+            if pending.since is None:
+                pending.since = time.monotonic()
+            due = self._due_reason(pending, time.monotonic()) is not None
+        if due:
+            self._wake.set()
+
+    def flush(self):
+        """สรุปทุกอย่างที่ค้างตอนนี้เลย (ไม่รอเกณฑ์) ใน thread ที่เรียก"""
+        self.run_pending(force=True)
+
+    def _due_reason(self, pending, now):
+        if not pending.writes:
+            return None
+        if pending.writes >= self.trigger_writes:
+            return "writes"
+        if pending.tokens >= self.trigger_tokens:
+            return "tokens"
+        if now - pending.since >= self.max_delay_sec:
+            return "delay"
+        return None
+
+    def _next_timeout(self):
+        """เวลาที่ต้องตื่นเองครั้งถัดไป (None = ไม่มีงานค้าง รอ notify อย่างเดียว)"""
+        now = time.monotonic()
+        if now < self._retry_at:
+            return self._retry_at - now
+        with self._lock:
+            oldest = [pending.since for pending in self._pending.values() if pending.writes]
+        if not oldest:
+            return None
+        return max(0.0, min(oldest) + self.max_delay_sec - now)
 
     def _run_loop(self):
         logger.debug("🔁 Loop started.")
         while not self._stop_event.is_set():
-            logger.debug("💤 Waiting for next round...")
+            self._wake.wait(self._next_timeout())
+            self._wake.clear()
+            if self._stop_event.is_set() or time.monotonic() < self._retry_at:
+                continue
             try:
-                self.run_once()
+                self.run_pending()
             except Exception as e:
                 logger.error(f"❌ Error: {e}")
-            self._stop_event.wait(self.interval_sec)
         logger.debug("✅ Loop exited cleanly.")
 
-    def run_once(self):
-        logger.debug("Enter HistoryBackgroundSummarizer->run_once")
-        unprocessed = self.memory_manager.get_unsummarized_history(limit=5)
-        if not unprocessed:
-            return
+    def run_pending(self, force=False):
+        with self._run_lock:
+            for is_history, summarizer in self.summarizers.items():
+                with self._lock:
+                    pending = self._pending[is_history]
+                    reason = "flush" if force and pending.writes else self._due_reason(pending, time.monotonic())
+                    if reason is None:
+                        continue
+                    taken = (pending.writes, pending.tokens, pending.since)
+                    self._pending[is_history] = _Pending()
+                    self.triggers[reason] += 1
 
-        logger.debug(f"(HistoryBackgroundSummarizer) unprocessed = {unprocessed}")
-        text = "\n".join(f"{role}: {content}" for role, content in reversed(unprocessed))
-
-        prompt = (
-            "คุณคือ AI ที่ช่วยสรุปบทสนทนาให้กระชับเข้าใจง่าย โดยคงประเด็นสำคัญไว้\n"
-            "ต่อไปนี้คือบทสนทนา:\n"
-            f"{text}\n"
-            "\nช่วยสรุปบทสนทนานี้ให้สั้นไม่เกิน 5 บรรทัด"
-        )
+                logger.debug(f"📝 Summarizing {summarizer.name} backlog (trigger={reason}, writes={taken[0]}, tokens={taken[1]})")
+                try:
+                    self._drain(summarizer)
+                except Exception as e:
+                    self.failures += 1
+                    self._retry_at = time.monotonic() + self.retry_sec
+                    with self._lock:
+                        pending = self._pending[is_history]
+                        pending.writes += taken[0]
+                        pending.tokens += taken[1]
+                        pending.since = min(pending.since or taken[2], taken[2])
+                    logger.error(f"❌ Failed to summarize {summarizer.name}, retry in {self.retry_sec}s: {e}")
+                    return
 
+    def _drain(self, summarizer):
+        self.busy = True
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "คุณคือผู้ช่วย AI"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.4,
-            )
-            summary = response.choices[0].message.content.strip()
-            self.memory_manager.add_history_summary(summary)
-            # ✅ Mark the processed ones as summarized
-            ids = [row["id"] for row in unprocessed]
-            self.memory_manager.mark_as_summarized(ids)
-            
-            logger.debug(f"📝 History summarized. : {summary}")
-        except Exception as e:
-            logger.error(f"❌ Failed to summarize history: {e}")
+            while not self._stop_event.is_set():
+                start = time.perf_counter()
+                rows = summarizer.run_once()
+                if not rows:
+                    return
+                elapsed = time.perf_counter() - start
+                self.batches += 1
+                self.rows_summarized += rows
+                self.last_batch_sec = round(elapsed, 3)
+                self.max_batch_sec = max(self.max_batch_sec, self.last_batch_sec)
+        finally:
+            self.busy = False
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            pending = {
+                summarizer.name: {
+                    "writes": self._pending[is_history].writes,
+                    "tokens": self._pending[is_history].tokens,
+                    "oldest_sec": round(now - self._pending[is_history].since, 1) if self._pending[is_history].since else 0.0,
+                }
+                for is_history, summarizer in self.summarizers.items()
+            }
+        return {
+            "running": self._thread.is_alive(),
+            "busy": self.busy,
+            "pending": pending,
+            "backlog_rows": {
+                summarizer.name: self.memory_manager.count_unsummarized(is_history)
+                for is_history, summarizer in self.summarizers.items()
+            },
+            "triggers": dict(self.triggers),
+            "batches": self.batches,
+            "rows_summarized": self.rows_summarized,
+            "failures": self.failures,
+            "retry_in_sec": round(max(0.0, self._retry_at - now), 1),
+            "last_batch_sec": self.last_batch_sec,
+            "max_batch_sec": self.max_batch_sec,
+        }
@@ -1,12 +1,13 @@
 import re
 import json
 from datetime import datetime, timedelta
-from openai import OpenAI
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
 from server.config.config import OPENAI_API_KEY, OPENAI_MODEL
 from core.utils.usage_tracker_instance import usage_tracker
+from server.shared.llm_gateway import llm_gateway
+from server.shared.context_builder import token_counter
  
 from core.utils.logger_config import get_logger
 
@@ -15,40 +16,47 @@ logger = get_logger(__name__)
 ESCALATION_KEYWORDS = ["ขอข้อมูลเพิ่ม", "ขอรายละเอียดเพิ่ม", "ขอแบบละเอียด", "อธิบายให้ลึกกว่านี้"]
 SESSION_EXPIRY_SECONDS = 120
 
+def new_chat_session():
+    """คำถาม / คำตอบล่าสุดของผู้ใช้หนึ่งคน ใช้ทำ escalation prompt (เก็บไว้ใน MemoryPartition ไม่ใช่ใน ChatManager)"""
+    return {
+        "last_question": None,
+        "last_response": None,
+        "last_model": None,
+        "timestamp": None
+    }
+
+
 class ChatManager:
     def __init__(self, tone="default"):
         logger.info("ChatManager initialized")
-        self.client = OpenAI(api_key=OPENAI_API_KEY)
         self.tone = tone
         self.function_schema_sent = False
-        self.session = {
-            "last_question": None,
-            "last_response": None,
-            "last_model": None,
-            "timestamp": None
-        }
 
  
     def user_requests_expert(self, text):
         return any(kw in text.lower() for kw in ESCALATION_KEYWORDS)
 
     def is_session_valid(self, session):
-        return (datetime.now() - session.get("timestamp", datetime.min)) < timedelta(seconds=SESSION_EXPIRY_SECONDS)
-
-    def update_session(self, user_text, model_used, response):
-        self.session.update({
+        if not session:
+            return False
+        return (datetime.now() - (session.get("timestamp") or datetime.min)) < timedelta(seconds=SESSION_EXPIRY_SECONDS)
+
+    def update_session(self, session, user_text, model_used, response):
+        if session is None:
+            return
+        session.update({
             "last_question": user_text,
             "last_response": response,
             "last_model": model_used,
             "timestamp": datetime.now()
         })
 
-    def build_escalation_prompt(self, user_text):
-        if not self.is_session_valid(self.session):
+    def build_escalation_prompt(self, user_text, session):
+        if not self.is_session_valid(session):
             return "ขออภัยครับ คำถามก่อนหน้านี้หมดอายุแล้ว กรุณาถามใหม่อีกครั้งได้ไหมครับ"
         return (
-            f"ผู้ใช้ถามว่า: {self.session['last_question']}\n"
-            f"ระบบตอบว่า: {self.session['last_response']}\n"
+            f"ผู้ใช้ถามว่า: {session['last_question']}\n"
+            f"ระบบตอบว่า: {session['last_response']}\n"
             f"ตอนนี้ผู้ใช้พูดว่า: {user_text}\n"
             f"กรุณาอธิบายเพิ่มเติมอย่างละเอียด พร้อมเหตุผลและคำแนะนำ"
         )
@@ -91,7 +99,12 @@ class ChatManager:
             )
 
 
-    def ask_gpt_with_context(self, question, context=""):
+    def build_context_messages(self, question, context="", session=None):
+        """
+        คืน (messages, model, temperature) สำหรับตอบคำถามพร้อม context
+        ใช้ร่วมกันทั้งแบบปกติและแบบ stream
+        session: คำถาม / คำตอบก่อนหน้าของผู้ใช้คนนี้ (new_chat_session) สำหรับ escalation prompt
+        """
         system_prompt = self.get_system_prompt(self.tone)
         temperature = 0.5 if self.tone == "family" else 0.2
 
@@ -114,17 +127,13 @@ class ChatManager:
 
         if self.user_requests_expert(question):
             gpt_model = "gpt-4o"
-            messages.append({"role": "user", "content": self.build_escalation_prompt(question)})
+            messages.append({"role": "user", "content": self.build_escalation_prompt(question, session)})
         
         messages.append({"role": "user", "content": formatted_question})     
+        logger.info(f"📦 HANA prompt: {token_counter.count_messages(messages)} tokens")
+        return messages, gpt_model, temperature
 
-        response = self.client.chat.completions.create(
-            model=gpt_model,
-            messages=messages,
-            temperature=temperature
-        )
-
-        usage = response.usage
+    def log_usage(self, gpt_model, usage):
         logger.info(f"MODEL={gpt_model}")
         logger.info(f"Input tokens:{usage.prompt_tokens}")
         logger.info(f"Output tokens:{usage.completion_tokens}")
@@ -135,13 +144,42 @@ class ChatManager:
             completion_tokens=usage.completion_tokens
         )
 
+    async def ask_gpt_with_context(self, question, context="", session=None):
+        messages, gpt_model, temperature = self.build_context_messages(question, context, session)
+
+        response = await llm_gateway.chat(
+            model=gpt_model,
+            messages=messages,
+            temperature=temperature
+        )
+
+        self.log_usage(gpt_model, response.usage)
+
         reply = response.choices[0].message.content.strip()
-        self.update_session(question, gpt_model, reply)
+        self.update_session(session, question, gpt_model, reply)
         return reply
 
-    def ask_simple(self, prompt: str) -> str:
+    async def ask_gpt_with_context_stream(self, question, context="", session=None):
+        """
+        เหมือน ask_gpt_with_context แต่ yield SSML ทีละส่วนตามที่ LLM stream กลับมา
+        """
+        messages, gpt_model, temperature = self.build_context_messages(question, context, session)
+
+        parts = []
+        async for delta in llm_gateway.stream_chat(
+            model=gpt_model,
+            messages=messages,
+            temperature=temperature,
+            on_usage=lambda usage: self.log_usage(gpt_model, usage)
+        ):
+            parts.append(delta)
+            yield delta
+
+        self.update_session(session, question, gpt_model, "".join(parts).strip())
+
+    async def ask_simple(self, prompt: str) -> str:
         try:
-            response = self.client.chat.completions.create(
+            response = await llm_gateway.chat(
                 model=OPENAI_MODEL,
                 messages=[{"role": "user", "content": prompt}]
             )
@@ -159,7 +197,7 @@ class ChatManager:
             logger.error(f"❌ Error in ask_simple: {e}")
             return ""
 
-    def analyze_question_all_in_one(self, current_question, previous_question=None):
+    async def analyze_question_all_in_one(self, current_question, previous_question=None):
         
         if previous_question:
             prompt = (
@@ -179,7 +217,7 @@ class ChatManager:
 
 
 
-        response = self.client.chat.completions.create(
+        response = await llm_gateway.chat(
             model=OPENAI_MODEL,
             messages=[{"role": "user", "content": prompt}],
             temperature=0,
@@ -198,8 +236,8 @@ class ChatManager:
         content = response.choices[0].message.content.strip()
         cleaned_content = re.sub(r"```(?:json)?\n([\s\S]*?)\n```", r"\1", content.strip())
         return json.loads(cleaned_content)
-    def ask_json_only(self, prompt: str) -> dict:
-        response = self.client.chat.completions.create(
+    async def ask_json_only(self, prompt: str) -> dict:
+        response = await llm_gateway.chat(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": "คุณคือ AI ที่จะตอบกลับเฉพาะในรูปแบบ JSON เท่านั้น ห้ามใส่คำบรรยาย คำพูด หรือข้อความอื่นใด"},
@@ -224,8 +262,8 @@ class ChatManager:
             raise ValueError(f"GPT response is not valid JSON:\n{content}")
         return json.loads(json_match.group())
 
-    def ask_plain_response(self, prompt: str) -> str:
-        response = self.client.chat.completions.create(
+    async def ask_plain_response(self, prompt: str) -> str:
+        response = await llm_gateway.chat(
             model=OPENAI_MODEL,
             messages=[
                 {"role": "system", "content": "คุณคือ AI ที่ให้คำตอบตรงไปตรงมา"},
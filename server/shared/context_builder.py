@@ -0,0 +1,219 @@
+# server/shared/context_builder.py
+import math
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from server.config.config import OPENAI_MODEL, CONTEXT_TOKEN_CACHE_SIZE
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# optional: นับ token ด้วย tokenizer ของ model จริง ถ้าไม่มีใช้การประมาณจากจำนวนตัวอักษร
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+THAI = re.compile(r"[฀-๿]")
+MESSAGE_OVERHEAD_TOKENS = 3  # role + ตัวคั่นต่อ message (ตามสูตรของ OpenAI)
+REPLY_PRIMING_TOKENS = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    ประมาณจำนวน token เมื่อไม่มี tiktoken: ภาษาอังกฤษ ~4 ตัวอักษร/token, ภาษาไทย ~2 ตัวอักษร/token
+    """
+    thai_chars = len(THAI.findall(text))
+    return math.ceil(thai_chars / 2 + (len(text) - thai_chars) / 4)
+
+
+def message_text(message: dict) -> str:
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+class TokenCounter:
+    """
+    นับ token ด้วย tokenizer ของ model (tiktoken) พร้อม LRU cache ต่อข้อความ
+    system prompt / เมนู / history เดิมถูกนับซ้ำทุก request จึงแทบไม่ต้อง encode ใหม่
+    """
+
+    def __init__(self, model: str = OPENAI_MODEL, cache_size: int = CONTEXT_TOKEN_CACHE_SIZE):
+        self.model = model
+        self.cache_size = cache_size
+        self._encoding = self._load_encoding(model)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_encoding(model: str):
+        if tiktoken is None:
+            logger.info("tiktoken not installed, token counts are estimated")
+            return None
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        with self._lock:
+            cached = self._cache.get(text)
+            if cached is not None:
+                self._cache.move_to_end(text)
+                return cached
+
+        tokens = len(self._encoding.encode(text)) if self._encoding is not None else estimate_tokens(text)
+
+        with self._lock:
+            self._cache[text] = tokens
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count_message(self, message: dict) -> int:
+        return MESSAGE_OVERHEAD_TOKENS + self.count(message_text(message))
+
+    def count_messages(self, messages: List[dict]) -> int:
+        return sum(self.count_message(m) for m in messages) + REPLY_PRIMING_TOKENS
+
+    def truncate(self, text: str, max_tokens: int, keep: str = "head") -> str:
+        """
+        ตัดข้อความให้ไม่เกิน max_tokens ที่ขอบบรรทัด (keep="head" เก็บต้นข้อความ, "tail" เก็บท้ายข้อความ)
+        """
+        if self.count(text) <= max_tokens:
+            return text
+        lines = text.split("\n")
+        if keep == "tail":
+            lines.reverse()
+        kept, used = [], 0
+        for line in lines:
+            cost = self.count(line) + 1
+            if used + cost > max_tokens:
+                break
+            kept.append(line)
+            used += cost
+        if not kept and max_tokens > 0:
+            # บรรทัดแรกยาวเกิน budget เอง → ตัดระดับตัวอักษร
+            line = lines[0]
+            low, high = 0, len(line)
+            while low < high:
+                mid = (low + high + 1) // 2
+                piece = line[:mid] if keep == "head" else line[-mid:]
+                if self.count(piece) <= max_tokens:
+                    low = mid
+                else:
+                    high = mid - 1
+            return (line[:low] if keep == "head" else line[-low:]) if low else ""
+        if keep == "tail":
+            kept.reverse()
+        return "\n".join(kept)
+
+
+@dataclass
+class ContextSection:
+    name: str
+    text: str
+    priority: int             # เลขน้อย = สำคัญกว่า ได้ที่ก่อน
+    truncate: Optional[str] = "head"  # None = ใส่ได้ทั้งก้อนหรือไม่ใส่เลย, "head" / "tail" = ตัดให้พอดีได้
+
+
+@dataclass
+class PackedContext:
+    text: str = ""
+    messages: List[dict] = field(default_factory=list)
+    tokens: int = 0
+    budget: int = 0
+    dropped: List[str] = field(default_factory=list)
+    truncated: List[str] = field(default_factory=list)
+
+
+class ContextBuilder:
+    """
+    จัด context ให้อยู่ใน token budget ตามลำดับความสำคัญ
+    - pack_sections: ส่วนของ context แบบข้อความ (web / memory / history ของ HANA)
+    - pack_messages: message ของ chat (system prompt + summary เก็บเสมอ, history ใหม่สุดก่อน)
+    ทุกครั้งจะ log จำนวน token ที่จัดได้เทียบกับ budget
+    """
+
+    def __init__(self, counter: TokenCounter = None):
+        self.counter = counter or token_counter
+
+    def pack_sections(self, sections: List[ContextSection], budget: int, label: str = "context") -> PackedContext:
+        result = PackedContext(budget=budget)
+        kept = {}
+        remaining = budget
+        for index, section in sorted(enumerate(sections), key=lambda pair: pair[1].priority):
+            if not section.text:
+                continue
+            cost = self.counter.count(section.text)
+            text = section.text
+            if cost > remaining:
+                text = self.counter.truncate(section.text, remaining, keep=section.truncate) if section.truncate else ""
+                if not text:
+                    result.dropped.append(section.name)
+                    continue
+                result.truncated.append(section.name)
+                cost = self.counter.count(text)
+            kept[index] = text
+            remaining -= cost
+
+        # เรียงกลับตามลำดับเดิมของ sections
+        result.text = "\n\n".join(kept[i] for i in sorted(kept)).strip()
+        result.tokens = budget - remaining
+        self._log(label, result)
+        return result
+
+    def pack_messages(
+        self,
+        required: List[dict],
+        history: List[dict],
+        budget: int,
+        reserve_tokens: int = 0,
+        max_history: int = None,
+        label: str = "messages",
+    ) -> PackedContext:
+        """
+        required (system prompt / summary) เก็บเสมอ แล้วเติม history จากใหม่สุดย้อนไปจนเต็ม budget
+        reserve_tokens = token ของ message ที่จะต่อท้ายภายหลัง (เช่น user prompt ของรอบนี้)
+        """
+        result = PackedContext(budget=budget)
+        used = self.counter.count_messages(required) + reserve_tokens
+        if max_history is not None:
+            history = history[-max_history:] if max_history > 0 else []
+
+        kept = []
+        for message in reversed(history):
+            cost = self.counter.count_message(message)
+            if used + cost > budget:
+                break
+            kept.append(message)
+            used += cost
+        kept.reverse()
+
+        skipped = len(history) - len(kept)
+        if skipped:
+            result.dropped.append(f"{skipped} history message(s)")
+        result.messages = list(required) + kept
+        result.tokens = used
+        self._log(label, result)
+        return result
+
+    def _log(self, label: str, result: PackedContext):
+        details = ""
+        if result.truncated:
+            details += f", truncated={result.truncated}"
+        if result.dropped:
+            details += f", dropped={result.dropped}"
+        logger.info(f"📦 {label}: {result.tokens}/{result.budget} tokens{details}")
+
+
+# Singleton instances for global use
+token_counter = TokenCounter()
+context_builder = ContextBuilder(token_counter)
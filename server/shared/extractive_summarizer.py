@@ -0,0 +1,153 @@
+# server/shared/extractive_summarizer.py
+import math
+import re
+from collections import Counter
+from typing import List
+
+from server.config.config import WEB_SUMMARY_MAX_TOKENS
+from server.shared.context_builder import token_counter
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# optional: ตัดคำภาษาไทยด้วย dictionary ถ้าติดตั้ง pythainlp ไว้ ไม่งั้นใช้ character bigram
+try:
+    from pythainlp.tokenize import word_tokenize
+except ImportError:
+    word_tokenize = None
+
+WORD = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*|[฀-๿]+")
+THAI = re.compile(r"[฀-๿]")
+SENTENCE_SPLIT = re.compile(r"\n+|(?<=[.!?])\s+")
+THAI_SPACE = re.compile(r"(?<=[฀-๿])\s+(?=[฀-๿])")
+# ป้ายกำกับจาก build_context_from_search_results ที่ไม่ใช่เนื้อหา
+NOISE = re.compile(r"Extracted Content:\s*(N/A)?|^\s*\d+\.\s*", re.MULTILINE)
+MIN_SENTENCE_CHARS = 25
+MAX_SENTENCE_CHARS = 200
+DUPLICATE_OVERLAP = 0.8
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    ภาษาอังกฤษ / ตัวเลข: ตัดตามคำ, ภาษาไทย: ตัดคำด้วย pythainlp หรือ character bigram
+    """
+    tokens = []
+    for match in WORD.finditer(text.lower()):
+        word = match.group()
+        if not THAI.match(word):
+            tokens.append(word)
+        elif word_tokenize is not None:
+            tokens.extend(t for t in word_tokenize(word, keep_whitespace=False) if t.strip())
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return tokens
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    ตัดประโยคที่ขึ้นบรรทัดใหม่ / วรรคตอน (ชื่อผลค้นหาที่ลงท้ายด้วย ":" หรือท่อนสั้น ๆ จะรวมกับท่อนถัดไป)
+    ภาษาไทยไม่มีจุดจบประโยค ท่อนที่ยาวเกิน MAX_SENTENCE_CHARS จึงตัดซ้ำที่ช่องว่างระหว่างคำไทย
+    """
+    sentences = []
+    pending = ""
+    for piece in SENTENCE_SPLIT.split(NOISE.sub("", text)):
+        piece = " ".join(piece.split())
+        if not piece:
+            continue
+        piece = f"{pending} {piece}" if pending else piece
+        if piece.endswith(":") or len(piece) < MIN_SENTENCE_CHARS:
+            pending = piece
+            continue
+        pending = ""
+        sentences.extend(_split_long(piece))
+    if pending:
+        sentences.append(pending)
+    return sentences
+
+
+def _split_long(sentence: str) -> List[str]:
+    if len(sentence) <= MAX_SENTENCE_CHARS:
+        return [sentence]
+    parts = []
+    current = ""
+    for phrase in THAI_SPACE.split(sentence):
+        if current and len(current) + len(phrase) + 1 > MAX_SENTENCE_CHARS:
+            parts.append(current)
+            current = phrase
+        else:
+            current = f"{current} {phrase}" if current else phrase
+    if current:
+        parts.append(current)
+    return parts
+
+
+class ExtractiveSummarizer:
+    """
+    สรุปข้อมูลจากเว็บแบบ extractive ในเครื่อง (ไม่เรียก LLM)
+    ให้คะแนนแต่ละประโยคด้วย BM25 เทียบกับคำถาม + น้ำหนักเล็กน้อยตามลำดับผลค้นหา
+    แล้วเลือกประโยคคะแนนสูงสุด (ข้ามประโยคที่ซ้ำกัน) จนเต็ม max_tokens เรียงกลับตามลำดับเดิม
+    """
+
+    def __init__(self, max_tokens: int = WEB_SUMMARY_MAX_TOKENS, k1: float = 1.5, b: float = 0.75):
+        self.max_tokens = max_tokens
+        self.k1 = k1
+        self.b = b
+
+    def score(self, sentences: List[List[str]], query: List[str]) -> List[float]:
+        n = len(sentences)
+        if n == 0:
+            return []
+        avg_len = sum(len(s) for s in sentences) / n or 1.0
+        df = Counter()
+        for tokens in sentences:
+            df.update(set(tokens))
+        query_terms = set(query)
+
+        scores = []
+        for i, tokens in enumerate(sentences):
+            tf = Counter(tokens)
+            score = 0.0
+            for term in query_terms:
+                if term not in tf:
+                    continue
+                idf = math.log(1 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                freq = tf[term]
+                score += idf * freq * (self.k1 + 1) / (freq + self.k1 * (1 - self.b + self.b * len(tokens) / avg_len))
+            # ผลค้นหาอันดับต้นมักเกี่ยวข้องกว่า: ใช้ตัดสินเมื่อคะแนนใกล้กัน / ไม่มีคำตรงกับคำถามเลย (เช่นผลภาษาอังกฤษ)
+            scores.append(score + 0.1 / (1 + i))
+        return scores
+
+    def summarize(self, context: str, question: str, max_tokens: int = None) -> str:
+        max_tokens = max_tokens or self.max_tokens
+        sentences = split_sentences(context)
+        if not sentences:
+            return ""
+        tokenized = [tokenize(s) for s in sentences]
+        scores = self.score(tokenized, tokenize(question))
+
+        selected = []
+        used_tokens = 0
+        for i in sorted(range(len(sentences)), key=lambda i: scores[i], reverse=True):
+            cost = token_counter.count(sentences[i])
+            if used_tokens + cost > max_tokens:
+                continue
+            if any(self._is_duplicate(tokenized[i], tokenized[j]) for j in selected):
+                continue
+            selected.append(i)
+            used_tokens += cost
+
+        logger.debug(f"Extractive summary: {len(selected)}/{len(sentences)} sentences, ~{used_tokens} tokens")
+        return "\n".join(sentences[i] for i in sorted(selected))
+
+    @staticmethod
+    def _is_duplicate(a: List[str], b: List[str]) -> bool:
+        set_a, set_b = set(a), set(b)
+        if not set_a or not set_b:
+            return False
+        return len(set_a & set_b) / min(len(set_a), len(set_b)) >= DUPLICATE_OVERLAP
+
+
+# Singleton instance for global use
+extractive_summarizer = ExtractiveSummarizer()
@@ -1,13 +1,15 @@
 # server/flow_handlers/chat_handler.py
 
 class ChatHandler:
-    def __init__(self, gpt_client=None, context=None):
+    def __init__(self, gpt_client=None, context=None, plan=None, session=None):
         self.gpt_client = gpt_client
         self.context = context
+        self.plan = plan
+        self.session = session
 
-    def handle(self, user_input: str, context: dict = None):
+    async def handle(self, user_input: str, context: dict = None):
         context_to_use = context or self.context
-        reply = self.gpt_client.ask(user_voice=user_input)
+        reply = await self.gpt_client.ask(user_voice=user_input, plan=self.plan, session=self.session)
         return {
             "status": "complete",
             "reply": reply
@@ -1,3 +1,5 @@
+import asyncio
+
 from core.utils.logger_config import get_logger
 from .news_handler import NewsHandler
 from .weather_handler import WeatherHandler
@@ -9,13 +11,16 @@ class DailyBriefingHandler:
     def __init__(self, session):
         self.session = session
 
-    def handle(self, user_input: str):
+    async def handle(self, user_input: str):
         logger.info(f"[DailyBriefingHandler] 📋 Handling user input: {user_input}")
 
         # Use actual handlers to fetch data
-        news_result = NewsHandler(self.session).handle("ข่าวเด่นวันนี้")
-        weather_result = WeatherHandler(self.session).handle("สภาพอากาศกรุงเทพ")
-        stock_result = StockAnalysisHandler(self.session).handle("หุ้นที่น่าจับตา")
+        # ✅ weather / stock เป็น sync (HTTP / yfinance) → รันใน thread แล้วดึงทั้งสามพร้อมกัน
+        news_result, weather_result, stock_result = await asyncio.gather(
+            NewsHandler(self.session).handle("ข่าวเด่นวันนี้"),
+            asyncio.to_thread(WeatherHandler(self.session).handle, "สภาพอากาศกรุงเทพ"),
+            asyncio.to_thread(StockAnalysisHandler(self.session).handle, "หุ้นที่น่าจับตา"),
+        )
 
         news_summary = f"📌 ข่าวเด่น: {news_result.get('message', '')}"
         weather_summary = f"🌤 สภาพอากาศ: {weather_result.get('message', '')}"
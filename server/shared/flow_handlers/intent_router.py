@@ -1,3 +1,4 @@
+import asyncio
 from .command_handler import CommandHandler
 from .reminder_handler import ReminderHandler
 from .chat_handler import ChatHandler
@@ -8,17 +9,66 @@ from .weather_handler import WeatherHandler
 from ..intent_classifier.classifier import IntentClassifier
 from ..gpt_integration import GPTClient
 from ..session_manager import Session
+from ..response_cache import response_cache
+from server.config.config import HANA_SINGLE_CALL_PLAN
+from core.utils.usage_tracker_instance import usage_tracker
 from core.utils.logger_config import get_logger
 
 logger = get_logger(__name__)
 
+# intent ที่มี handler เฉพาะ นอกนั้นตกไปที่ ChatHandler
+CUSTOM_HANDLER_INTENTS = {"home_command", "reminder", "stock_analysis", "news_summary", "daily_briefing", "weather"}
+# handler ที่ตอบจากข้อมูลภายนอกล้วน ๆ (ไม่มี state) เก็บผลไว้ใน response_cache ได้
+# (WeatherHandler ไม่ใส่ เพราะตอบ error เป็น status complete เหมือนกัน แยกไม่ออก)
+CACHEABLE_HANDLER_INTENTS = {"news_summary"}
+
 class IntentRouter:
     def __init__(self, gpt_client: GPTClient, intent_classifier: IntentClassifier):
         self.gpt_client = gpt_client
         self.intent_classifier = intent_classifier
 
-    def route(self, user_input: str, session: Session):
-        result = self.intent_classifier.classify_intent(user_input)
+    async def route(self, user_input: str, session: Session):
+        intent, plan = await self._resolve_intent(user_input, session)
+        return await self._handle_intent(intent, user_input, session, plan=plan)
+
+    async def route_stream(self, user_input: str, session: Session):
+        """
+        เหมือน route() แต่ yield event สำหรับ streaming endpoint
+        - ("intent", intent)  ทันทีที่รู้ intent
+        - ("delta", text)     SSML ที่ทยอยมา (เฉพาะ intent chat)
+        - ("final", result)   ผลลัพธ์สุดท้ายรูปแบบเดียวกับ route()
+        intent อื่นนอกจาก chat ไม่มีข้อความให้ stream จึงส่งเป็น final ครั้งเดียว
+        """
+        intent, plan = await self._resolve_intent(user_input, session)
+        yield "intent", intent
+
+        if not self._is_chat_intent(intent):
+            yield "final", await self._handle_intent(intent, user_input, session, plan=plan)
+            return
+
+        logger.info(f"Intent: {intent} (stream)")
+        parts = []
+        async for delta in self.gpt_client.ask_stream(user_voice=user_input, plan=plan, session=session):
+            parts.append(delta)
+            yield "delta", delta
+
+        result = {
+            "status": "complete",
+            "reply": "".join(parts).strip()
+        }
+        session.update(state=result.get("next_state"), context_update={})
+        yield "final", result
+
+    async def _resolve_intent(self, user_input: str, session: Session):
+        plan = None
+        if HANA_SINGLE_CALL_PLAN:
+            partition = await self.gpt_client.partition_for(session)
+            plan = await self.intent_classifier.plan_turn(
+                user_input,
+                previous_question=partition.previous_question
+            )
+        # plan ล้มเหลว หรือปิด single-call mode → ใช้ classify_intent แบบเดิม
+        result = plan if plan is not None else await self.intent_classifier.classify_intent(user_input)
         intent = result.get("intent", "chat")
         confidence = result.get("confidence", 0.0)
 
@@ -26,18 +76,22 @@ class IntentRouter:
             intent = "chat"
 
         session.update(intent=intent)
-        return self._handle_intent(intent, user_input, session)
+        return intent, plan
+
+    @staticmethod
+    def _is_chat_intent(intent: str) -> bool:
+        return intent not in CUSTOM_HANDLER_INTENTS
 
-    def route_by_state(self, state: str, user_input: str, session: Session):
+    async def route_by_state(self, state: str, user_input: str, session: Session):
         if state == "complete":
             # Reset to chat intent for new general input
             session.update(intent="chat", state=None, context_update={})
-            return self._handle_intent("chat", user_input, session)
+            return await self._handle_intent("chat", user_input, session)
 
         intent = session.intent or "chat"
-        return self._handle_intent(intent, user_input, session)
+        return await self._handle_intent(intent, user_input, session)
 
-    def _handle_intent(self, intent: str, user_input: str, session: Session):
+    async def _handle_intent(self, intent: str, user_input: str, session: Session, plan: dict = None):
         logger.info(f"Intent: {intent}")
         if intent == "home_command":
             handler = CommandHandler(session=session)
@@ -52,9 +106,21 @@ class IntentRouter:
         elif intent == "weather":
             handler = WeatherHandler(session=session)
         else:
-            handler = ChatHandler(self.gpt_client)
+            handler = ChatHandler(self.gpt_client, plan=plan, session=session)
+
+        cacheable = response_cache is not None and intent in CACHEABLE_HANDLER_INTENTS
+        hit = response_cache.lookup(user_input, intent) if cacheable else None
+        if hit is not None:
+            result, similarity = hit
+            usage_tracker.log_cache_hit("hana_handler", intent=intent, semantic=similarity < 1.0)
+        elif asyncio.iscoroutinefunction(handler.handle):
+            result = await handler.handle(user_input)
+        else:
+            # sync handler (HA / yfinance / weather) ทำ blocking I/O → ย้ายไปรันใน thread
+            result = await asyncio.to_thread(handler.handle, user_input)
 
-        result = handler.handle(user_input)
+        if cacheable and hit is None and result.get("status") == "complete":
+            response_cache.store(user_input, intent, result)
         context_update = {}
         action_data = result.get("action")
         if isinstance(action_data, dict):
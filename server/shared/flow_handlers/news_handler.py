@@ -10,7 +10,7 @@ class NewsHandler:
         self.session = session
         self.gpt_client = GPTClient()
 
-    def handle(self, user_input: str):
+    async def handle(self, user_input: str):
         logger.info(f"[NewsHandler] 📰 Handling user input: {user_input}")
 
         query = quote(user_input)
@@ -43,7 +43,7 @@ class NewsHandler:
         )
 
         try:
-            summary_text = self.gpt_client.ask_raw(prompt)
+            summary_text = await self.gpt_client.ask_raw(prompt)
             logger.info(f"[NewsHandler] summary_text: {summary_text}")
             result = {
                 "status": "complete",
@@ -53,7 +53,7 @@ class ReminderHandler(BaseIntentHandler):
         except Exception as e:
             logger.error(f"❌ General error: {e}")
 
-    def handle(self, user_input: str):
+    async def handle(self, user_input: str):
         try:
             current_state = self.session.state
             if current_state == "awaiting_confirmation":
@@ -92,7 +92,7 @@ class ReminderHandler(BaseIntentHandler):
                         "next_state": "awaiing_confirmation"
                     }
             prompt = get_prompt_for_intent(IntentType.REMINDER, context=user_input)
-            response_text = self.gpt_client.ask_json(prompt)  # ✅ ให้ return raw text ก่อน parse
+            response_text = await self.gpt_client.ask_json(prompt)  # ✅ ให้ return raw text ก่อน parse
             if isinstance(response_text, dict):
                 parsed = response_text
             else:
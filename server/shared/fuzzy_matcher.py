@@ -0,0 +1,153 @@
+# server/shared/fuzzy_matcher.py
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Tuple
+
+# พยัญชนะที่ออกเสียงเหมือน / ใกล้กัน → ตัวแทนเดียวกัน (ASR มักสะกดสลับกันในกลุ่มเดียวกัน)
+_CONSONANT_GROUPS = {
+    "ค": "ขฃคฅฆ",
+    "ช": "ฉชฌ",
+    "ส": "ซศษส",
+    "ย": "ญย",
+    "ด": "ฎด",
+    "ต": "ฏต",
+    "ท": "ฐฑฒถทธ",
+    "น": "ณน",
+    "พ": "ผพภ",
+    "ฟ": "ฝฟ",
+    "ล": "รลฬ",   # ร/ล สลับกันบ่อยทั้งในการพูดและ ASR
+    "ห": "หฮ",
+}
+# สระเสียงสั้น/ยาวที่ ASR แยกไม่ค่อยออก
+_VOWELS = {"ี": "ิ", "ื": "ึ", "ู": "ุ", "ๅ": "า"}
+# วรรณยุกต์, ไม้ไต่คู้, การันต์, ไม้ยมก, ไปยาล, สระอะ ไม่ช่วยแยกชื่อเมนู
+_DROP = "่้๊๋็์ๆฯะ"
+
+_PHONETIC = str.maketrans(
+    {**{c: rep for rep, group in _CONSONANT_GROUPS.items() for c in group}, **_VOWELS, **{c: None for c in _DROP}}
+)
+PARTIAL_MATCH_WEIGHT = 0.9  # ชื่อที่พูดมาแค่บางส่วนของชื่อเมนู ได้คะแนนน้อยกว่าชื่อเต็มเล็กน้อย
+MIN_PARTIAL_CHARS = 4
+
+
+def phonetic_key(text: str) -> str:
+    """
+    key ตามเสียงอ่านของข้อความไทย: ตัดช่องว่าง / วรรณยุกต์ / การันต์, รวมพยัญชนะเสียงเดียวกัน, สระสั้น-ยาว
+    เช่น "ข้าวผัดกุ้ง" กับ "คาวผัดกุ่ง" ได้ key เดียวกัน
+    """
+    # NFKC แยก "ำ" เป็นนิคหิต + สระอา ต้องรวมกลับก่อน ไม่งั้น "น้ำ" กับ "นำ" จะไม่ตรงกับรูปที่ไม่ถูกแยก
+    text = unicodedata.normalize("NFKC", text.lower()).replace("ํา", "ำ")
+    return "".join(text.split()).translate(_PHONETIC)
+
+
+def _bigrams(key: str) -> List[str]:
+    return [key[i:i + 2] for i in range(len(key) - 1)] or [key]
+
+
+def levenshtein(a: str, b: str, max_distance: int = None, infix: bool = False) -> int:
+    """
+    edit distance แบบ 2 แถว หยุดเร็วเมื่อเกิน max_distance (คืน max_distance + 1)
+    infix=True: ระยะของ a เทียบกับช่วงใดช่วงหนึ่งใน b ที่ใกล้ที่สุด (ไม่คิดส่วนที่เกินมาหัว/ท้ายของ b)
+    """
+    if a == b:
+        return 0
+    if not infix and max_distance is not None and abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = [0] * (len(b) + 1) if infix else list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        left = i
+        for j, cb in enumerate(b):
+            cost = previous[j] if ca == cb else previous[j] + 1
+            up = previous[j + 1] + 1
+            left = left + 1 if left < up else up
+            if cost < left:
+                left = cost
+            current.append(left)
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous) if infix else previous[-1]
+
+
+@dataclass
+class MatchCandidate:
+    name: str       # ชื่อ (หรือ alias) ที่ตรงกัน
+    value: Any      # ข้อมูลที่ผูกกับชื่อนั้น เช่น รายการเมนู
+    score: float    # 0..1 (1 = key เสียงอ่านเหมือนกันทั้งชื่อ)
+    distance: int   # edit distance ของ key เสียงอ่าน
+    partial: bool = False  # ตรงกับบางส่วนของชื่อ
+
+
+class FuzzyMatcher:
+    """
+    จับคู่ข้อความจาก ASR ที่สะกดเพี้ยนกับรายชื่อที่รู้จัก (ชื่อเมนู / alias) แล้วคืนผู้สมัครเรียงตามคะแนน
+    - เทียบด้วย key เสียงอ่าน (phonetic_key)
+    - inverted index ของ bigram + q-gram filter: คำนวณ edit distance เฉพาะ key ที่มี bigram ร่วมกันมากพอ
+    - score = 1 - distance / ความยาวของ key ที่ยาวกว่า หรือถ้าพูดมาแค่บางส่วนของชื่อ
+      (1 - distance / ความยาวของคำค้น) * PARTIAL_MATCH_WEIGHT
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, Any]], max_error_ratio: float = 0.3):
+        self.max_error_ratio = max_error_ratio
+        self._entries: Dict[str, List[Tuple[str, Any]]] = {}
+        self._grams: Dict[str, set] = defaultdict(set)
+        for name, value in entries:
+            key = phonetic_key(name)
+            if not key:
+                continue
+            self._entries.setdefault(key, []).append((name, value))
+            for gram in _bigrams(key):
+                self._grams[gram].add(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def match(self, text: str, limit: int = 3, min_score: float = 0.0) -> List[MatchCandidate]:
+        key = phonetic_key(text)
+        if not key:
+            return []
+        max_distance = max(1, int(len(key) * self.max_error_ratio))
+        query_grams = _bigrams(key)
+
+        shared = defaultdict(int)
+        for gram in set(query_grams):
+            for candidate_key in self._grams.get(gram, ()):
+                shared[candidate_key] += 1
+        # q-gram lemma: ห่างกันไม่เกิน d edit → มี bigram ร่วมกันอย่างน้อย len(query) - 1 - 2d
+        needed = len(query_grams) - 2 * max_distance
+
+        best: Dict[int, Tuple[float, int, MatchCandidate]] = {}
+        for candidate_key, common in shared.items():
+            if common < needed:
+                continue
+            scored = self._score(key, candidate_key, max_distance)
+            if scored is None or scored[0] < min_score:
+                continue
+            score, distance, partial = scored
+            for name, value in self._entries[candidate_key]:
+                # คะแนนเท่ากัน: เลือกชื่อที่ยาวใกล้กับที่พูดมาที่สุด (เช่น "ข้าวผัด" → เมนูข้าวผัดก่อนชุดโปรที่มีข้าวผัด)
+                spelling = -abs(len(name) - len(text))
+                # value เดียวกันอาจมาจากหลายชื่อ (ชื่อจริง + alias) เก็บอันที่ดีที่สุด
+                ident = id(value)
+                if ident not in best or (score, spelling) > best[ident][:2]:
+                    best[ident] = (score, spelling, MatchCandidate(name, value, round(score, 3), distance, partial))
+
+        ranked = sorted(best.values(), key=lambda entry: (entry[0], entry[1]), reverse=True)
+        return [candidate for _, _, candidate in ranked[:limit]]
+
+    @staticmethod
+    def _score(key: str, candidate_key: str, max_distance: int):
+        distance = levenshtein(key, candidate_key, max_distance)
+        full = 1 - distance / max(len(key), len(candidate_key)) if distance <= max_distance else None
+        partial = None
+        if len(key) >= MIN_PARTIAL_CHARS and len(key) < len(candidate_key):
+            infix_distance = levenshtein(key, candidate_key, max_distance, infix=True)
+            if infix_distance <= max_distance:
+                partial = (1 - infix_distance / len(key)) * PARTIAL_MATCH_WEIGHT
+                if full is None or partial > full:
+                    return partial, infix_distance, True
+        if full is None:
+            return None
+        return full, distance, False
@@ -1,8 +1,9 @@
 # gpt_integration.py (refactored with structured context support)
 
-import openai
 import time
+import asyncio
 import re
+import contextvars
 import json
 import os
 import sys
@@ -11,14 +12,16 @@ from server.shared.flow_handlers.entity_map_ha import ENTITY_MAP
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
-from server.config.config import OPENAI_API_KEY, OPENAI_MODEL, SYSTEM_TONE, HA_URL, HA_TOKEN
+from server.config.config import OPENAI_API_KEY, OPENAI_MODEL, SYSTEM_TONE, HA_URL, HA_TOKEN, HANA_CONTEXT_MAX_TOKENS
 from .chat_manager import ChatManager
-from .memory_manager import MemoryManager
+from .memory_partitions import memory_partitions
 from .search_manager import SearchManager
-from .background_summarizer import MemoryBackgroundSummarizer, HistoryBackgroundSummarizer
+from .response_cache import response_cache
+from .context_builder import context_builder, ContextSection
 
 from core.utils.logger_config import get_logger
 from core.utils.latency_logger import LatencyLogger
+from core.utils.usage_tracker_instance import usage_tracker
 
 logger = get_logger(__name__)
 
@@ -35,27 +38,36 @@ CMD_ACTION_MAP = {
     "set": "ตั้งค่า"
 }
 
+# LatencyLogger ของ turn ปัจจุบัน แยกตาม asyncio task (หลายผู้ใช้ถามพร้อมกันได้)
+_turn_tracker = contextvars.ContextVar("hana_turn_tracker", default=None)
+
+
 class GPTClient:
     def __init__(self, api_key: str = None, model: str = OPENAI_MODEL):
         logger.info("GPTClient initialized")
         self.api_key = OPENAI_API_KEY
         self.model = model
-        openai.api_key = self.api_key
-        self.client = openai
 
         self.conversation_active = False
-        self.previous_question = None
-        self.last_interaction_time = time.time()
 
         self.chat_manager = ChatManager(SYSTEM_TONE)
-        self.memory_manager = MemoryManager()
+        # ✅ ความจำ / previous_question แยกตามผู้พูดหรือ session (ดู memory_partitions)
+        self.memory_partitions = memory_partitions
         self.search_manager = SearchManager(self)        
-        self.memory_summarizer = MemoryBackgroundSummarizer(memory_manager=self.memory_manager  )
-        self.history_summarizer = HistoryBackgroundSummarizer(memory_manager=self.memory_manager)
  
     def stop(self):
-        self.memory_summarizer.stop()
-        self.history_summarizer.stop()
+        self.memory_partitions.close_all()
+
+    @property
+    def tracker(self):
+        return _turn_tracker.get()
+
+    @tracker.setter
+    def tracker(self, value):
+        _turn_tracker.set(value)
+
+    async def partition_for(self, session=None):
+        return await self.memory_partitions.for_session(session)
 
     def call_ha_service_from_function_call(self, cmd):
         entity_id = ENTITY_MAP.get(cmd["device_name"])
@@ -76,8 +88,9 @@ class GPTClient:
         else:
             print("❌ HA Error:", response.status_code, response.text)
 
-    def get_conversation_history(self, limit=5):
-        memories = self.memory_manager.get_recent_memories(limit=limit)
+    def get_conversation_history(self, limit=5, partition=None):
+        partition = partition or self.memory_partitions.get()
+        memories = partition.memory_manager.get_recent_memories(limit=limit)
         if not memories:
             return ""
 
@@ -86,98 +99,230 @@ class GPTClient:
             context += f"{role.capitalize()}: {summary}\n"
         return context.strip()
     # เพิ่มใน gpt_integration.py
-    def ask_json(self, prompt: str):
+    async def ask_json(self, prompt: str):
         try:
-            result = self.chat_manager.ask_json_only(prompt)
+            result = await self.chat_manager.ask_json_only(prompt)
             return result
         except Exception as e:
             logger.error(f"❌ ask_json failed: {e}")
             raise
 
-    def ask(self, user_voice: str) -> str:
+    async def ask(self, user_voice: str, plan: dict = None, session=None) -> str:
+        async with self.memory_partitions.lease(session) as partition, partition.turn_lock:
+            return await self._ask(partition, user_voice, plan)
+
+    async def _ask(self, partition, user_voice: str, plan: dict = None) -> str:
         try:
             self.tracker = LatencyLogger()
-            logger.info(f"User question:{user_voice}")
-            self.tracker.mark("analyze_question_all_in_one - start")
-            analysis = self.chat_manager.analyze_question_all_in_one(
-                current_question=user_voice,
-                previous_question=self.previous_question
-            )
-
-            need_web = analysis.get("need_web_search", "No") == "Yes"
-            need_memory = analysis.get("need_memory", "No") == "Yes"
-            need_history = analysis.get("need_conversation_history", "No") == "Yes"
-
-            logger.info(f"📊 Analysis: need_web={need_web}, need_memory={need_memory}, need_history={need_history}")
-            self.tracker.mark("analyze_question_all_in_one - done")
+            logger.info(f"User question ({partition.namespace}):{user_voice}")
+            analysis = await self._analyze(partition, user_voice, plan)
+            local_sections = await self._local_context(partition, user_voice, analysis)
+            cache_scope = self._cache_scope(analysis, local_sections)
+            cached = self._lookup_cache(user_voice, cache_scope)
+            if cached is not None:
+                await self._finish_turn(partition, user_voice, cached)
+                return cached
 
-            context_parts = []
-
-            if need_web:
-                self.tracker.mark("searching web - start")
-                logger.info("🌐 Searching web...")
-                search_results = self.search_manager.search_dual_language(user_voice, top_k=10)
-                self.tracker.mark("searching_dual_lang")
-                logger.debug(f"search_result={search_results}")
-                search_context = self.search_manager.build_context_from_search_results(search_results,enable_fetch=False)
-                self.tracker.mark("build_context_from_search_results")
-                summarized_context = self.search_manager.summarize_web_context(search_context, user_voice)
-                self.tracker.mark("summarize_web_context")
-                context_parts.append(summarized_context)
-                logger.info(f"Searching web...done : {summarized_context}")
-                self.tracker.mark("searching web - done")
-
-            if need_memory:
-                logger.info("🧠 Loading memory...")
-                recent_memories = self.memory_manager.get_recent_memories(limit=5)
-                memory_text = "\n".join([f"{role.capitalize()}: {summary}" for role, summary in reversed(recent_memories)])
-                context_parts.append(memory_text)    
-                # logger.info("🧠 Summarizing memory...")
-                # recent_memories = self.memory_manager.get_recent_memories(limit=10)
-                # summary = self.chat_manager.summarize_memories(recent_memories)
-                # context_parts.append(f"💭 ความทรงจำล่าสุด:\n{summary}")
-                
-            if need_history:
-                # logger.info("🗣️ Loading conversation history...")
-                # history_text = self.get_conversation_history(limit=5)
-                # context_parts.append(history_text)
-
-                logger.info("🗣️ Loading conversation history...")
-                history_summary = self.memory_manager.get_latest_history_summary()
-                if history_summary:
-                    context_parts.append(f"📘 ประวัติย่อ: {history_summary}")
-                else:
-                    full_history = self.get_conversation_history(limit=5)
-                    context_parts.append(full_history)
-                    
-
-            full_context = "\n\n".join(context_parts).strip()
-
-            if not full_context:
-                logger.info("🚀 No extra context needed.")
+            full_context = await self._build_context(user_voice, analysis, local_sections)
 
             self.tracker.mark("asking chatGPT - start")
             logger.info("Asking ChatGPT...")
-            answer = self.chat_manager.ask_gpt_with_context(user_voice, context=full_context)
+            answer = await self.chat_manager.ask_gpt_with_context(user_voice, context=full_context, session=partition.chat_session)
             logger.info("ChatGPT: %s", answer)
             self.tracker.mark("asking chatGPT - done")
-            self.last_interaction_time = time.time()
 
-            self.memory_manager.add_message("user", user_voice)
-            self.memory_manager.add_message("assistant", answer)
-
-   
-            self.tracker.report()
-            self.previous_question = user_voice
+            self._store_cache(user_voice, cache_scope, answer)
+            await self._finish_turn(partition, user_voice, answer)
             return answer
 
         except Exception as e:
             print(f"❌ GPT Error: {e}")
             return "ขอโทษค่ะ เกิดข้อผิดพลาดในการประมวลผลคำถาม"
 
-    def ask_raw(self, prompt: str):
+    async def ask_stream(self, user_voice: str, plan: dict = None, session=None):
+        """
+        เหมือน ask() แต่ yield SSML ทีละส่วนทันทีที่ LLM ส่งมา
+        (context จากเว็บ / memory ยังต้องรวบรวมให้เสร็จก่อนเริ่ม stream)
+        """
+        async with self.memory_partitions.lease(session) as partition, partition.turn_lock:
+            async for delta in self._ask_stream(partition, user_voice, plan):
+                yield delta
+
+    async def _ask_stream(self, partition, user_voice: str, plan: dict = None):
+        parts = []
+        try:
+            self.tracker = LatencyLogger()
+            logger.info(f"User question (stream, {partition.namespace}):{user_voice}")
+            analysis = await self._analyze(partition, user_voice, plan)
+            local_sections = await self._local_context(partition, user_voice, analysis)
+            cache_scope = self._cache_scope(analysis, local_sections)
+            cached = self._lookup_cache(user_voice, cache_scope)
+            if cached is not None:
+                parts.append(cached)
+                yield cached
+                await self._finish_turn(partition, user_voice, cached)
+                return
+
+            full_context = await self._build_context(user_voice, analysis, local_sections)
+
+            self.tracker.mark("asking chatGPT (stream) - start")
+            logger.info("Asking ChatGPT (stream)...")
+            async for delta in self.chat_manager.ask_gpt_with_context_stream(user_voice, context=full_context, session=partition.chat_session):
+                if not parts:
+                    self.tracker.mark("first token")
+                parts.append(delta)
+                yield delta
+            answer = "".join(parts).strip()
+            logger.info("ChatGPT: %s", answer)
+            self.tracker.mark("asking chatGPT (stream) - done")
+
+            self._store_cache(user_voice, cache_scope, answer)
+            await self._finish_turn(partition, user_voice, answer)
+
+        except Exception as e:
+            print(f"❌ GPT Error: {e}")
+            if not parts:
+                yield "ขอโทษค่ะ เกิดข้อผิดพลาดในการประมวลผลคำถาม"
+
+    async def _analyze(self, partition, user_voice: str, plan: dict = None) -> dict:
+        if plan is not None:
+            # ✅ single-call plan จาก IntentRouter มีข้อมูล need_* มาแล้ว ไม่ต้องวิเคราะห์ซ้ำ
+            analysis = plan
+            self.tracker.mark("plan from router")
+        else:
+            self.tracker.mark("analyze_question_all_in_one - start")
+            analysis = await self.chat_manager.analyze_question_all_in_one(
+                current_question=user_voice,
+                previous_question=partition.previous_question
+            )
+            self.tracker.mark("analyze_question_all_in_one - done")
+
+        flags = {
+            "need_web": self._is_yes(analysis.get("need_web_search")),
+            "need_memory": self._is_yes(analysis.get("need_memory")),
+            "need_history": self._is_yes(analysis.get("need_conversation_history")),
+        }
+        logger.info(f"📊 Analysis: need_web={flags['need_web']}, need_memory={flags['need_memory']}, need_history={flags['need_history']}")
+        return flags
+
+    async def _local_context(self, partition, user_voice: str, analysis: dict) -> list:
+        """
+        context จาก memory / history ในเครื่อง (เร็ว) แยกจาก web search เพื่อใช้ทำ cache fingerprint ได้
+        คืน list ของ ContextSection (priority: เลขน้อยได้ที่ใน token budget ก่อน)
+        """
+        sections = []
+        memory_manager = partition.memory_manager
+
+        if analysis["need_memory"]:
+            logger.info("🧠 Loading memory...")
+            # ✅ ความจำที่เกี่ยวกับคำถาม (FTS5 + embedding) แทน 5 แถวล่าสุด (ไม่เจอใน partition → memory.db เดิม)
+            # ถ้าไม่เจอเลยใช้ล่าสุดเหมือนเดิม
+            recalled = await self.memory_partitions.recall(partition, user_voice)
+            if recalled:
+                recent_memories = [(row["role"], row["content"]) for row in sorted(recalled, key=lambda row: row["id"], reverse=True)]
+            else:
+                recent_memories = await asyncio.to_thread(memory_manager.get_recent_memories, limit=5)
+            memory_text = "\n".join([f"{role.capitalize()}: {summary}" for role, summary in reversed(recent_memories)])
+            # ความจำเรียงเก่า → ใหม่ ถ้าต้องตัดให้เก็บท้าย (ล่าสุด)
+            sections.append(ContextSection("memory", memory_text, priority=3, truncate="tail"))
+            # logger.info("🧠 Summarizing memory...")
+            # recent_memories = self.memory_manager.get_recent_memories(limit=10)
+            # summary = self.chat_manager.summarize_memories(recent_memories)
+            # context_parts.append(f"💭 ความทรงจำล่าสุด:\n{summary}")
+            
+        if analysis["need_history"]:
+            # logger.info("🗣️ Loading conversation history...")
+            # history_text = self.get_conversation_history(limit=5)
+            # context_parts.append(history_text)
+
+            logger.info("🗣️ Loading conversation history...")
+            history_summary = await asyncio.to_thread(memory_manager.get_latest_history_summary)
+            if history_summary:
+                sections.append(ContextSection("history_summary", f"📘 ประวัติย่อ: {history_summary}", priority=2))
+            else:
+                full_history = await asyncio.to_thread(self.get_conversation_history, limit=5, partition=partition)
+                sections.append(ContextSection("history", full_history, priority=4, truncate="tail"))
+
+        return sections
+
+    async def _build_context(self, user_voice: str, analysis: dict, local_sections: list) -> str:
+        sections = []
+
+        if analysis["need_web"]:
+            self.tracker.mark("searching web - start")
+            logger.info("🌐 Searching web...")
+            search_results = await self.search_manager.search_dual_language_async(user_voice, top_k=10)
+            self.tracker.mark("searching_dual_lang")
+            logger.debug(f"search_result={search_results}")
+            search_context = self.search_manager.build_context_from_search_results(search_results,enable_fetch=False)
+            self.tracker.mark("build_context_from_search_results")
+            summarized_context = await self.search_manager.summarize_web_context(search_context, user_voice)
+            self.tracker.mark("summarize_web_context")
+            sections.append(ContextSection("web", summarized_context, priority=1))
+            logger.info(f"Searching web...done : {summarized_context}")
+            self.tracker.mark("searching web - done")
+
+        sections.extend(local_sections)
+        packed = context_builder.pack_sections(sections, budget=HANA_CONTEXT_MAX_TOKENS, label="HANA context")
+        full_context = packed.text
+
+        if not full_context:
+            logger.info("🚀 No extra context needed.")
+        return full_context
+
+    def _cache_scope(self, analysis: dict, local_sections: list):
+        """
+        (intent, fingerprint) สำหรับ response_cache หรือ None ถ้าปิด cache
+        คำถามที่ต้องค้นเว็บใช้ TTL ของ "web_search" ส่วน fingerprint มาจาก memory / history ที่ใช้ตอบ
+        คำตอบจาก ask() เป็นแชตทั่วไปเสมอ (plan ตอบ "general_chat" / "unknown", classify_intent ตอบ "chat") → ใช้ TTL ของ "chat"
+        """
+        if response_cache is None:
+            return None
+        intent = "web_search" if analysis["need_web"] else "chat"
+        return intent, response_cache.fingerprint([section.text for section in local_sections])
+
+    def _lookup_cache(self, user_voice: str, cache_scope):
+        if cache_scope is None:
+            return None
+        intent, fingerprint = cache_scope
+        hit = response_cache.lookup(user_voice, intent, fingerprint)
+        if hit is None:
+            return None
+        answer, similarity = hit
+        self.tracker.mark("response cache hit")
+        usage_tracker.log_cache_hit("hana_chat", intent=intent, semantic=similarity < 1.0)
+        return answer
+
+    def _store_cache(self, user_voice: str, cache_scope, answer: str):
+        if cache_scope is None or answer == "":
+            return
+        intent, fingerprint = cache_scope
+        response_cache.store(user_voice, intent, answer, fingerprint)
+
+    async def _finish_turn(self, partition, user_voice: str, answer: str):
+        partition.last_interaction_time = time.time()
+
+        # เขียน SQLite + FTS ใช้ writer lock ร่วมกับ compactor (archive / vacuum) → ไม่รอบน event loop
+        await asyncio.to_thread(self._remember_turn, partition.memory_manager, user_voice, answer)
+
+        self.tracker.report()
+        partition.previous_question = user_voice
+
+    @staticmethod
+    def _remember_turn(memory_manager, user_voice: str, answer: str):
+        memory_manager.add_message("user", user_voice)
+        memory_manager.add_message("assistant", answer)
+
+    @staticmethod
+    def _is_yes(value) -> bool:
+        # analyze_question_all_in_one ตอบ "Yes"/"No" ส่วน plan_turn ตอบ boolean
+        if isinstance(value, bool):
+            return value
+        return str(value).strip().lower() == "yes"
+
+    async def ask_raw(self, prompt: str):
         try:
-            result = self.chat_manager.ask_plain_response(prompt)
+            result = await self.chat_manager.ask_plain_response(prompt)
             return result
         except Exception as e:
             logger.error(f"❌ ask_raw failed: {e}")
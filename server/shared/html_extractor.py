@@ -0,0 +1,110 @@
+# server/shared/html_extractor.py
+import codecs
+from html.parser import HTMLParser
+from typing import Iterable, List, Union
+
+from server.config.config import WEB_EXTRACT_MAX_CHARS, WEB_FETCH_MAX_BYTES
+
+# เนื้อหาใน tag เหล่านี้ไม่ใช่เนื้อหาหลักของหน้า
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "nav", "header", "footer", "aside", "form"}
+# tag ระดับ block ที่เปิดแล้วทำให้ <p> ก่อนหน้าจบ (HTML ไม่บังคับให้ปิด </p>)
+CLOSES_PARAGRAPH = {
+    "p", "div", "ul", "ol", "table", "section", "article", "blockquote", "pre",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr",
+}
+MIN_PARAGRAPH_CHARS = 15
+
+
+class ParagraphExtractor(HTMLParser):
+    """
+    ดึงข้อความใน <p> แบบ incremental (feed ทีละ chunk ได้)
+    - ข้าม script / style / nav / header / footer / aside / form
+    - done = True เมื่อได้ข้อความครบ max_chars แล้ว ผู้เรียกหยุดอ่าน response ได้ทันที
+    """
+
+    def __init__(self, max_chars: int = WEB_EXTRACT_MAX_CHARS, min_paragraph_chars: int = MIN_PARAGRAPH_CHARS):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.min_paragraph_chars = min_paragraph_chars
+        self.paragraphs: List[str] = []
+        self.total_chars = 0
+        self.done = False
+        self._skip_depth = 0
+        self._current = None  # list ของข้อความใน <p> ที่กำลังอ่าน
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in CLOSES_PARAGRAPH:
+            self._end_paragraph()
+        if tag == "p" and self._skip_depth == 0:
+            self._current = []
+        elif tag == "br" and self._current is not None:
+            self._current.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == "p" or tag in CLOSES_PARAGRAPH:
+            self._end_paragraph()
+
+    def handle_data(self, data):
+        if self._current is not None and self._skip_depth == 0:
+            self._current.append(data)
+
+    def _end_paragraph(self):
+        if self._current is None:
+            return
+        text = " ".join("".join(self._current).split())
+        self._current = None
+        if len(text) < self.min_paragraph_chars or self.done:
+            return
+        remaining = self.max_chars - self.total_chars
+        text = text[:remaining]
+        self.paragraphs.append(text)
+        self.total_chars += len(text)
+        if self.total_chars >= self.max_chars:
+            self.done = True
+
+    def close(self):
+        super().close()
+        self._end_paragraph()
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.paragraphs)
+
+
+def extract_paragraphs(
+    chunks: Iterable[Union[bytes, str]],
+    encoding: str = "utf-8",
+    max_chars: int = WEB_EXTRACT_MAX_CHARS,
+    max_bytes: int = WEB_FETCH_MAX_BYTES,
+) -> str:
+    """
+    รับ body ของหน้าเว็บทีละ chunk (เช่น response.iter_content()) คืนข้อความใน <p> คั่นด้วยบรรทัดใหม่
+    หยุดอ่านเมื่อได้ข้อความครบ max_chars หรืออ่านเกิน max_bytes แล้ว
+    """
+    extractor = ParagraphExtractor(max_chars=max_chars)
+    try:
+        decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    read_bytes = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        if isinstance(chunk, bytes):
+            read_bytes += len(chunk)
+            chunk = decoder.decode(chunk)
+        else:
+            read_bytes += len(chunk)
+        extractor.feed(chunk)
+        if extractor.done or read_bytes >= max_bytes:
+            break
+    else:
+        extractor.feed(decoder.decode(b"", final=True))
+
+    extractor.close()
+    return extractor.text
@@ -1,45 +1,13 @@
-from typing import Dict
-from openai import OpenAI
+from typing import Dict, Optional
 from .intent_definitions import INTENT_DEFINITIONS
 from server.config.config import OPENAI_API_KEY, OPENAI_MODEL
+from server.shared.llm_gateway import llm_gateway
+from core.utils.usage_tracker_instance import usage_tracker
 from core.utils.logger_config import get_logger
 
 logger = get_logger(__name__)
 
-class IntentClassifier:
-    def __init__(self, model=OPENAI_MODEL, api_key=OPENAI_API_KEY):
-        self.client = OpenAI(api_key=api_key)
-        self.model = model
-        self.intent_definitions = INTENT_DEFINITIONS
-
-    def classify(self, text: str):
-        return self.classify_intent(text)
-
-    def classify_intent(self, user_input: str) -> Dict:
-        prompt = self._build_prompt(user_input)
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "คุณคือ AI ที่ช่วยระบุ intent ของข้อความผู้ใช้"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.2,
-            )
-            result = response.choices[0].message.content.strip()
-            logger.info(f"[classify_intent] 🧠 Result: {result}")
-            logger.info(f"[classify_intent] 🔢 Token usage: {response.usage}")
-            return self._parse_result(result)
-        except Exception as e:
-            logger.error(f"[classify_intent] ❌ Error: {e}")
-            return {"intent": "unknown", "confidence": 0.0}
-
-    def _build_prompt(self, user_input: str) -> str:
-        return f"""
-            คุณคือ AI ที่ทำหน้าที่วิเคราะห์ข้อความของผู้ใช้ แล้วระบุ "intent" ที่ตรงที่สุดเพียงหนึ่งรายการจากรายการด้านล่าง พร้อมระบุระดับความมั่นใจ (0-1) และคำอธิบายประกอบ
-
-            รายการ intent ที่รองรับมีดังนี้:
-
+INTENT_LIST_PROMPT = """
             - general_chat:
             ความหมาย: การพูดคุยทั่วไป ไม่ได้ขอข้อมูลหรือสั่งงาน
             ตัวอย่าง:
@@ -95,6 +63,113 @@ class IntentClassifier:
 
             - unknown:
             ความหมาย: ข้อความไม่สามารถระบุเจตนาได้แน่ชัด
+""".strip("\n")
+
+PLAN_INTENTS = ["general_chat", "home_command", "reminder", "news_summary", "stock_analysis", "weather", "daily_briefing", "unknown"]
+
+# structured output: ได้ intent + ความต้องการ context ใน completion เดียว
+TURN_PLAN_SCHEMA = {
+    "name": "turn_plan",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "intent": {"type": "string", "enum": PLAN_INTENTS},
+            "confidence": {"type": "number"},
+            "need_web_search": {"type": "boolean"},
+            "need_memory": {"type": "boolean"},
+            "need_conversation_history": {"type": "boolean"}
+        },
+        "required": ["intent", "confidence", "need_web_search", "need_memory", "need_conversation_history"],
+        "additionalProperties": False
+    }
+}
+
+class IntentClassifier:
+    def __init__(self, model=OPENAI_MODEL, api_key=OPENAI_API_KEY):
+        self.model = model
+        self.intent_definitions = INTENT_DEFINITIONS
+
+    async def classify(self, text: str):
+        return await self.classify_intent(text)
+
+    async def classify_intent(self, user_input: str) -> Dict:
+        prompt = self._build_prompt(user_input)
+        try:
+            response = await llm_gateway.chat(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "คุณคือ AI ที่ช่วยระบุ intent ของข้อความผู้ใช้"},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.2,
+            )
+            result = response.choices[0].message.content.strip()
+            logger.info(f"[classify_intent] 🧠 Result: {result}")
+            logger.info(f"[classify_intent] 🔢 Token usage: {response.usage}")
+            return self._parse_result(result)
+        except Exception as e:
+            logger.error(f"[classify_intent] ❌ Error: {e}")
+            return {"intent": "unknown", "confidence": 0.0}
+
+    async def plan_turn(self, user_input: str, previous_question: str = None) -> Optional[Dict]:
+        """
+        Single-call plan: ระบุ intent พร้อม need_web_search / need_memory / need_conversation_history
+        แทนการเรียก classify_intent + analyze_question_all_in_one แยกกัน
+        คืน None ถ้าเรียกไม่สำเร็จ เพื่อให้ caller fallback ไป multi-call path
+        """
+        prompt = self._build_plan_prompt(user_input, previous_question)
+        try:
+            response = await llm_gateway.chat(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": "คุณคือ AI ที่ช่วยระบุ intent และวางแผนข้อมูลที่ต้องใช้ตอบผู้ใช้"},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0,
+                response_format={"type": "json_schema", "json_schema": TURN_PLAN_SCHEMA},
+            )
+            usage = response.usage
+            usage_tracker.log_gpt_usage(
+                prompt_tokens=usage.prompt_tokens,
+                completion_tokens=usage.completion_tokens
+            )
+            result = response.choices[0].message.content.strip()
+            logger.info(f"[plan_turn] 🧭 Plan: {result}")
+            logger.info(f"[plan_turn] 🔢 Token usage: {usage}")
+            plan = self._parse_result(result)
+            if "need_web_search" not in plan:
+                return None
+            return plan
+        except Exception as e:
+            logger.error(f"[plan_turn] ❌ Error: {e}")
+            return None
+
+    def _build_plan_prompt(self, user_input: str, previous_question: str = None) -> str:
+        previous = f"ข้อความก่อนหน้าของผู้ใช้: \"{previous_question}\"\n" if previous_question else ""
+        return f"""
+            คุณคือ AI ที่ทำหน้าที่วิเคราะห์ข้อความของผู้ใช้ แล้วระบุ "intent" ที่ตรงที่สุดเพียงหนึ่งรายการจากรายการด้านล่าง พร้อมระบุระดับความมั่นใจ (0-1)
+
+            รายการ intent ที่รองรับมีดังนี้:
+
+{INTENT_LIST_PROMPT}
+
+            นอกจากนี้ให้ระบุว่าการตอบข้อความนี้ต้องใช้ข้อมูลใดเพิ่มเติม:
+            - need_web_search: ต้องค้นข้อมูลล่าสุดจากเว็บหรือไม่
+            - need_memory: ต้องใช้ความทรงจำระยะยาวเกี่ยวกับผู้ใช้หรือไม่
+            - need_conversation_history: ต้องอ่านบทสนทนาก่อนหน้าจึงจะเข้าใจข้อความนี้หรือไม่
+
+            {previous}ข้อความปัจจุบัน:
+            \"{user_input}\"
+            """
+
+    def _build_prompt(self, user_input: str) -> str:
+        return f"""
+            คุณคือ AI ที่ทำหน้าที่วิเคราะห์ข้อความของผู้ใช้ แล้วระบุ "intent" ที่ตรงที่สุดเพียงหนึ่งรายการจากรายการด้านล่าง พร้อมระบุระดับความมั่นใจ (0-1) และคำอธิบายประกอบ
+
+            รายการ intent ที่รองรับมีดังนี้:
+
+{INTENT_LIST_PROMPT}
 
             โปรดวิเคราะห์ข้อความผู้ใช้ต่อไปนี้:
             \"{user_input}\"
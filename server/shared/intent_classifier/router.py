@@ -17,7 +17,7 @@ class IntentResponse(BaseModel):
 
 @router.post("/intent")
 async def detect_intent(req: IntentRequest):
-    result = classifier.classify(req.text)
+    result = await classifier.classify(req.text)
     return IntentResponse(
         intent=result.get("intent", "unknown"),
         confidence=result.get("confidence", 0.0),
@@ -0,0 +1,139 @@
+# server/shared/json_stream.py
+import json
+import re
+from typing import List, Optional, Tuple
+
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class IncrementalReplyParser:
+    """
+    Parser แบบ incremental สำหรับ reply ของ MIRA / VERA ที่อยู่ในรูป
+    {"intent": "...", ..., "response": "<speak>...</speak>"}
+
+    feed() รับ delta จาก LLM stream แล้วคืน event:
+    - ("intent", value)    เมื่ออ่านค่า field ที่ watch (เช่น intent) ครบแล้ว
+    - ("response", text)   ข้อความส่วนใหม่ของ field ที่ stream (decode escape แล้ว)
+    """
+
+    def __init__(self, stream_field: str = "response", watch_fields=("intent",)):
+        self.stream_field = stream_field
+        self.watch_fields = set(watch_fields)
+        self.buffer = ""
+        self.fields = {}
+        self._pos = 0
+        self._depth = 0
+        self._expect_key = True
+        self._current_key = None
+        self._in_string = False
+        self._string_role = None
+        self._chars: List[str] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        self.buffer += chunk
+        events = []
+        streamed = []
+        buf = self.buffer
+
+        while self._pos < len(buf):
+            ch = buf[self._pos]
+
+            if self._in_string:
+                if ch == "\\":
+                    decoded, consumed = self._decode_escape(buf, self._pos)
+                    if consumed == 0:
+                        break  # escape ยังมาไม่ครบ รอ chunk ถัดไป
+                    self._pos += consumed
+                    self._chars.append(decoded)
+                    if self._is_streaming():
+                        streamed.append(decoded)
+                    continue
+                if ch == '"':
+                    self._close_string(events, streamed)
+                    self._pos += 1
+                    continue
+                self._chars.append(ch)
+                if self._is_streaming():
+                    streamed.append(ch)
+                self._pos += 1
+                continue
+
+            if ch in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._expect_key = True
+            elif ch in "}]":
+                self._depth -= 1
+            elif ch == '"':
+                self._in_string = True
+                self._chars = []
+                if self._depth == 1:
+                    self._string_role = "key" if self._expect_key else "value"
+                else:
+                    self._string_role = "nested"
+            elif self._depth == 1 and ch == ":":
+                self._expect_key = False
+            elif self._depth == 1 and ch == ",":
+                self._expect_key = True
+            self._pos += 1
+
+        if streamed:
+            events.append((self.stream_field, "".join(streamed)))
+        return events
+
+    def _is_streaming(self) -> bool:
+        return self._string_role == "value" and self._current_key == self.stream_field
+
+    def _close_string(self, events, streamed):
+        value = "".join(self._chars)
+        if self._string_role == "key":
+            self._current_key = value
+        elif self._string_role == "value":
+            self.fields[self._current_key] = value
+            if self._current_key in self.watch_fields:
+                # flush ข้อความที่ stream ค้างไว้ก่อน เพื่อรักษาลำดับ event
+                if streamed:
+                    events.append((self.stream_field, "".join(streamed)))
+                    streamed.clear()
+                events.append((self._current_key, value))
+        self._in_string = False
+        self._string_role = None
+
+    @staticmethod
+    def _decode_escape(buf: str, pos: int) -> Tuple[str, int]:
+        if pos + 1 >= len(buf):
+            return "", 0
+        code = buf[pos + 1]
+        if code == "u":
+            if pos + 6 > len(buf):
+                return "", 0
+            try:
+                return chr(int(buf[pos + 2:pos + 6], 16)), 6
+            except ValueError:
+                return buf[pos:pos + 6], 6
+        return JSON_ESCAPES.get(code, code), 2
+
+    def result(self) -> Optional[dict]:
+        """
+        คืนผล JSON ทั้งก้อนหลัง stream จบ (None ถ้าไม่ใช่ JSON)
+        """
+        text = self.buffer.strip()
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            match = re.search(r"\{.*\}", text, re.DOTALL)
+            if not match:
+                return None
+            try:
+                return json.loads(match.group(0))
+            except json.JSONDecodeError:
+                logger.warning("⚠️ Streamed reply is not valid JSON")
+                return None
+
+
+def ndjson_line(event: dict) -> str:
+    return json.dumps(event, ensure_ascii=False) + "\n"
@@ -0,0 +1,193 @@
+# server/shared/llm_gateway.py
+import asyncio
+import threading
+import time
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from server.config.config import (
+    OPENAI_API_KEY,
+    OPENAI_MODEL,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_SYNC_CONCURRENCY,
+    LLM_MAX_CONNECTIONS,
+    LLM_MAX_KEEPALIVE_CONNECTIONS,
+    LLM_KEEPALIVE_EXPIRY,
+    LLM_CONNECT_TIMEOUT,
+    LLM_REQUEST_TIMEOUT,
+    LLM_MAX_RETRIES,
+)
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class LLMGateway:
+    """
+    จุดเดียวสำหรับเรียก LLM ของทุก product (HANA / MIRA / VERA)
+    - ใช้ AsyncOpenAI ตัวเดียวบน httpx connection pool (keep-alive) ร่วมกันทั้ง server
+    - จำกัดจำนวน request ที่ยิงพร้อมกันด้วย semaphore เพื่อไม่ให้ชน rate limit
+      max_concurrency คือเพดานรวม: แบ่ง max_sync_concurrency ให้ chat_sync ที่เหลือให้ async (สอง semaphore รวมกันไม่เกินเพดาน)
+    - มี chat_sync() สำหรับ background thread ที่ไม่มี event loop
+    """
+
+    def __init__(
+        self,
+        api_key: str = OPENAI_API_KEY,
+        model: str = OPENAI_MODEL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_sync_concurrency: int = LLM_MAX_SYNC_CONCURRENCY,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        max_keepalive_connections: int = LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT,
+        request_timeout: float = LLM_REQUEST_TIMEOUT,
+        max_retries: int = LLM_MAX_RETRIES,
+    ):
+        logger.info(f"LLMGateway initialized (max_concurrency={max_concurrency}, sync={max_sync_concurrency}, max_connections={max_connections})")
+        self.api_key = api_key
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.max_sync_concurrency = max(1, min(max_sync_concurrency, max_concurrency - 1))
+        self.max_async_concurrency = max(1, max_concurrency - self.max_sync_concurrency)
+        self.max_retries = max_retries
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._timeout = httpx.Timeout(request_timeout, connect=connect_timeout)
+
+        self._async_client = None
+        self._sync_client = None
+        self._client_lock = threading.Lock()
+        self._semaphore = asyncio.Semaphore(self.max_async_concurrency)
+        self._sync_semaphore = threading.BoundedSemaphore(self.max_sync_concurrency)
+
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_errors = 0
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key,
+                max_retries=self.max_retries,
+                http_client=httpx.AsyncClient(limits=self._limits, timeout=self._timeout),
+            )
+        return self._async_client
+
+    @property
+    def sync_client(self) -> OpenAI:
+        with self._client_lock:
+            if self._sync_client is None:
+                self._sync_client = OpenAI(
+                    api_key=self.api_key,
+                    max_retries=self.max_retries,
+                    http_client=httpx.Client(limits=self._limits, timeout=self._timeout),
+                )
+        return self._sync_client
+
+    async def chat(self, messages: list, model: str = None, **kwargs):
+        """
+        ส่ง chat completion แบบ async คืนค่า response object ของ OpenAI ตามเดิม
+        (caller ยังอ่าน response.choices / response.usage ได้เหมือนเดิม)
+        """
+        async with self._semaphore:
+            return await self._timed(self.async_client.chat.completions.create(
+                model=model or self.model,
+                messages=messages,
+                **kwargs
+            ))
+
+    async def stream_chat(self, messages: list, model: str = None, on_usage=None, **kwargs):
+        """
+        ส่ง chat completion แบบ stream แล้ว yield ข้อความ (delta) ทีละส่วนตามที่ LLM ส่งมา
+        usage ของ request จะถูกส่งให้ on_usage(usage) เมื่อ stream จบ
+        """
+        async with self._semaphore:
+            start = self._begin()
+            try:
+                stream = await self.async_client.chat.completions.create(
+                    model=model or self.model,
+                    messages=messages,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    **kwargs
+                )
+                async for chunk in stream:
+                    if chunk.usage is not None and on_usage is not None:
+                        on_usage(chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+            except Exception:
+                self.total_errors += 1
+                raise
+            finally:
+                self._end(start)
+
+    def chat_sync(self, messages: list, model: str = None, **kwargs):
+        """
+        ใช้เฉพาะใน background thread เท่านั้น ห้ามเรียกจาก async route
+        """
+        with self._sync_semaphore:
+            start = self._begin()
+            try:
+                return self.sync_client.chat.completions.create(
+                    model=model or self.model,
+                    messages=messages,
+                    **kwargs
+                )
+            except Exception:
+                self.total_errors += 1
+                raise
+            finally:
+                self._end(start)
+
+    async def _timed(self, request):
+        start = self._begin()
+        try:
+            return await request
+        except Exception:
+            self.total_errors += 1
+            raise
+        finally:
+            self._end(start)
+
+    def _begin(self) -> float:
+        self.in_flight += 1
+        self.total_requests += 1
+        return time.perf_counter()
+
+    def _end(self, start: float):
+        self.in_flight -= 1
+        logger.debug(f"⏱️ LLM call done in {time.perf_counter() - start:.2f}s (in_flight={self.in_flight})")
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "total_requests": self.total_requests,
+            "total_errors": self.total_errors,
+            "max_concurrency": self.max_concurrency,
+            "max_async_concurrency": self.max_async_concurrency,
+            "max_sync_concurrency": self.max_sync_concurrency,
+        }
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+        with self._client_lock:
+            if self._sync_client is not None:
+                self._sync_client.close()
+                self._sync_client = None
+        logger.info("🛑 LLMGateway closed.")
+
+
+# Singleton instance for global use
+llm_gateway = LLMGateway()
@@ -0,0 +1,141 @@
+# server/shared/memory_compactor.py
+import threading
+import time
+
+from server.config.config import (
+    MEMORY_HOT_KEEP_RAW,
+    MEMORY_HOT_MAX_ROWS,
+    MEMORY_HOT_MAX_SUMMARIES,
+    MEMORY_ARCHIVE_AFTER_DAYS,
+    MEMORY_COMPACT_INTERVAL_SEC,
+    MEMORY_VACUUM_PAGES,
+)
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+ARCHIVE_BATCH = 500  # แถวต่อ transaction (ไม่ถือ writer lock นานจนผู้ใช้ต้องรอ)
+
+
+class MemoryCompactor:
+    """
+    คุมขนาด memory (hot table) ของแต่ละ namespace ให้คงที่ ไม่ว่าจะใช้งานมากี่เดือน
+    ทุก interval_sec ย้ายแถวเหล่านี้ไป memory_archive (ไม่ลบทิ้ง) แล้ว incremental VACUUM:
+    1. ข้อความดิบที่สรุปแล้ว เก่ากว่า archive_after_days (ยกเว้น keep_raw แถวล่าสุด ที่ get_recent_memories ใช้)
+    2. summary เก่าที่เกิน max_summaries ต่อชนิด (memory / history)
+    3. ถ้ายังเกิน max_rows: ข้อความดิบที่สรุปแล้วที่เก่าที่สุด (แถวที่ยังไม่สรุปไม่ถูกย้าย ให้ summarizer ทำก่อน, summary ไม่ถูกย้าย)
+    namespace: MemoryManager ของแต่ละผู้ใช้ / partition ที่ลงทะเบียนไว้ด้วย register()
+    housekeeping: งานเก็บกวาดอื่นที่ทำรอบเดียวกัน (เช่น ลบไฟล์ partition ที่เลิกใช้) ลงทะเบียนด้วย add_housekeeping()
+    """
+
+    def __init__(self, keep_raw=MEMORY_HOT_KEEP_RAW, max_rows=MEMORY_HOT_MAX_ROWS,
+                 max_summaries=MEMORY_HOT_MAX_SUMMARIES, archive_after_days=MEMORY_ARCHIVE_AFTER_DAYS,
+                 interval_sec=MEMORY_COMPACT_INTERVAL_SEC, vacuum_pages=MEMORY_VACUUM_PAGES):
+        self.keep_raw = keep_raw
+        self.max_rows = max_rows
+        self.max_summaries = max_summaries
+        self.archive_after_days = archive_after_days
+        self.interval_sec = interval_sec
+        self.vacuum_pages = vacuum_pages
+
+        self._namespaces = {}
+        self._housekeeping = {}
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+
+        self.runs = 0
+        self.last_run = {}
+
+    def register(self, namespace, memory_manager):
+        with self._lock:
+            self._namespaces[namespace] = memory_manager
+
+    def unregister(self, namespace, memory_manager=None):
+        """memory_manager: ถอนเฉพาะเมื่อยังเป็นตัวเดิม (partition ที่ถูกปิดช้าไม่ถอนตัวที่เปิดใหม่แทนแล้ว)"""
+        with self._lock:
+            if memory_manager is None or self._namespaces.get(namespace) is memory_manager:
+                self._namespaces.pop(namespace, None)
+
+    def add_housekeeping(self, name, task):
+        """task(): เรียกหลัง compact ทุก namespace ในแต่ละรอบ ค่าที่คืนเก็บไว้ใน last_run[name]"""
+        with self._lock:
+            self._housekeeping[name] = task
+
+    def start(self):
+        if not self._thread.is_alive():
+            logger.info("🚀 Memory compactor started.")
+            self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        logger.info("🛑 Memory compactor stopped.")
+
+    def _run_loop(self):
+        while not self._stop_event.wait(self.interval_sec):
+            try:
+                self.compact_all()
+            except Exception as e:
+                logger.error(f"❌ Memory compaction failed: {e}")
+
+    def compact_all(self) -> dict:
+        with self._lock:
+            namespaces = list(self._namespaces.items())
+            housekeeping = list(self._housekeeping.items())
+        results = {}
+        for namespace, memory_manager in namespaces:
+            try:
+                results[namespace] = self.compact(memory_manager)
+            except Exception as e:
+                logger.error(f"❌ Memory compaction failed for {namespace}: {e}")
+        for name, task in housekeeping:
+            try:
+                results[name] = task()
+            except Exception as e:
+                logger.error(f"❌ Memory housekeeping {name} failed: {e}")
+        self.runs += 1
+        self.last_run = results
+        return results
+
+    def compact(self, memory_manager) -> dict:
+        with self._run_lock:
+            start = time.perf_counter()
+            archived = self._archive(memory_manager, memory_manager.summarized_raw_ids(self.archive_after_days, self.keep_raw))
+            archived += self._archive(memory_manager, memory_manager.old_summary_ids(self.max_summaries))
+            excess = memory_manager.count_rows() - self.max_rows
+            if excess > 0:
+                archived += self._archive(memory_manager, memory_manager.oldest_summarized_ids(excess))
+            vacuumed = memory_manager.incremental_vacuum(self.vacuum_pages)
+            result = {
+                "archived": archived,
+                "vacuumed_pages": vacuumed,
+                "hot_rows": memory_manager.count_rows(),
+                "seconds": round(time.perf_counter() - start, 3),
+            }
+        if archived:
+            logger.info(f"🧹 Compacted {memory_manager.db_path}: {result}")
+        return result
+
+    @staticmethod
+    def _archive(memory_manager, ids):
+        moved = 0
+        for i in range(0, len(ids), ARCHIVE_BATCH):
+            moved += memory_manager.archive(ids[i:i + ARCHIVE_BATCH])
+        return moved
+
+    def stats(self) -> dict:
+        with self._lock:
+            namespaces = list(self._namespaces)
+        return {
+            "running": self._thread.is_alive(),
+            "namespaces": namespaces,
+            "runs": self.runs,
+            "last_run": self.last_run,
+        }
+
+
+# Singleton instance for global use
+memory_compactor = MemoryCompactor()
@@ -1,13 +1,77 @@
 import sqlite3
 import os
+import queue
 import threading
+from contextlib import contextmanager
+
+from server.config.config import (
+    MEMORY_DB_PATH,
+    MEMORY_READ_POOL_SIZE,
+    MEMORY_BUSY_TIMEOUT_MS,
+    MEMORY_EMBEDDING_MODEL,
+    MEMORY_RECALL_K,
+    MEMORY_RECALL_MAX_TOKENS,
+    MEMORY_RECALL_MIN_SIMILARITY,
+    MEMORY_RECALL_MIN_OVERLAP,
+)
+from server.shared.context_builder import token_counter
+from server.shared.memory_recall import EmbeddingIndex, fts_query, fts_tokens, load_embedder, np, rrf_fuse, term_overlap
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# index ตาม query ที่ใช้บ่อย: งานค้างสรุป (is_history, is_summarized, id) และสรุปล่าสุด (... , timestamp)
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_memory_pending ON memory (is_history, is_summarized, id)",
+    "CREATE INDEX IF NOT EXISTS idx_memory_summary_time ON memory (is_history, is_summarized, timestamp)",
+)
+EMBEDDING_BATCH = 256
+
 
 class MemoryManager:
-    def __init__(self, db_path="memory.db"):
+    """
+    memory.db แบบ WAL: writer 1 connection (ล็อกเฉพาะงานเขียน) + pool ของ connection แบบ read-only
+    ผู้อ่าน (get_recent_memories ฯลฯ) จึงไม่ต้องรอ transaction ของ background summarizer
+    ถ้า db_path = ":memory:" ไม่มี WAL / read-only connection ให้ใช้ ทุกงานจะผ่าน writer connection
+
+    recall(): ค้นความจำที่เกี่ยวกับคำถามด้วย FTS5 (bm25) + embedding index (cosine) ถ้ามี NumPy
+    """
+
+    def __init__(self, db_path=MEMORY_DB_PATH, read_pool_size=MEMORY_READ_POOL_SIZE, embedding_model=MEMORY_EMBEDDING_MODEL):
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)        
-        self.lock = threading.Lock()
+        self.lock = threading.Lock()  # ล็อกของ writer
+        self.conn = self._connect()
+        self._fts = True
+        self._listeners = []  # callback(content, is_history) หลังเขียนข้อความใหม่ (เช่น SummaryScheduler)
         self._create_table()
+        self._readers = queue.Queue()
+        self._in_memory = db_path == ":memory:"
+        if not self._in_memory:
+            for _ in range(max(1, read_pool_size)):
+                self._readers.put(self._connect(read_only=True))
+        self._sync_fts()
+
+        self.embeddings = None
+        self._embed_lock = threading.Lock()  # กัน recall / background embed แถวเดียวกันซ้ำ
+        self._closed = False
+        name, embed_fn = load_embedder(embedding_model)
+        if embed_fn is not None:
+            self.embeddings = EmbeddingIndex(name, embed_fn)
+            self._load_embeddings()
+
+    def _connect(self, read_only=False):
+        if read_only:
+            conn = sqlite3.connect(f"file:{os.path.abspath(self.db_path)}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            # มีผลกับ DB ใหม่เท่านั้น (DB เดิม MemoryCompactor จะ VACUUM ให้ครั้งแรก) → คืนพื้นที่ทีละส่วนด้วย incremental_vacuum
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            if self.db_path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+                # WAL + NORMAL: ไม่ fsync ทุก commit (ข้อมูลไม่เสีย แค่ commit ล่าสุดอาจหายถ้าไฟดับ)
+                conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={MEMORY_BUSY_TIMEOUT_MS}")
+        return conn
 
     def _create_table(self):
         with self.conn:
@@ -21,81 +85,340 @@ class MemoryManager:
                     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
-
-    def add_message(self, role, content, is_history=False):
-        with self.lock:
+            for statement in INDEXES:
+                self.conn.execute(statement)
+            # แถวที่ MemoryCompactor ย้ายออกจาก memory (hot) มาเก็บไว้ ไม่ถูก query ตอนตอบคำถาม
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS memory_archive (
+                    id INTEGER PRIMARY KEY,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    is_summarized INTEGER DEFAULT 0,
+                    is_history INTEGER DEFAULT 0,
+                    timestamp DATETIME,
+                    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS memory_vectors (
+                    id INTEGER PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    vector BLOB NOT NULL
+                )
+            ''')
+        try:
             with self.conn:
-                self.conn.execute(
-                    'INSERT INTO memory (role, content, is_history) VALUES (?, ?, ?)',
-                    (role, content, int(is_history))
+                # rowid = memory.id, tokens = ข้อความที่ตัดคำไทยแล้ว (ดู fts_tokens)
+                self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS memory_fts USING fts5(tokens)")
+        except sqlite3.OperationalError as e:
+            self._fts = False
+            logger.warning(f"⚠️ SQLite FTS5 not available, memory recall uses embeddings only: {e}")
+
+    def _sync_fts(self):
+        """เติม memory_fts ให้ครบ (แถวที่เขียนก่อนมี FTS หรือจาก process อื่น)"""
+        if not self._fts:
+            return
+        with self._writer() as conn:
+            last = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM memory_fts").fetchone()[0]
+            rows = conn.execute("SELECT id, content FROM memory WHERE id > ? ORDER BY id", (last,)).fetchall()
+            conn.executemany("INSERT INTO memory_fts (rowid, tokens) VALUES (?, ?)", ((i, fts_tokens(c)) for i, c in rows))
+        if rows:
+            logger.info(f"🔎 Indexed {len(rows)} memory rows for full-text recall")
+
+    def _load_embeddings(self):
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT id, vector FROM memory_vectors WHERE model = ? ORDER BY id", (self.embeddings.name,)
+            ).fetchall()
+        if rows:
+            self.embeddings.add([row[0] for row in rows], np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows]))
+        # แถวที่ยังไม่มี vector (เช่น DB เดิมทั้งก้อน) embed ใน background ไม่ให้การเปิด DB ช้า
+        threading.Thread(target=self._background_embed, daemon=True).start()
+
+    def _background_embed(self):
+        try:
+            self._sync_embeddings()
+        except Exception as e:
+            if not self._closed:
+                logger.error(f"❌ Background embedding of {self.db_path} failed: {e}")
+
+    def _sync_embeddings(self, blocking=True):
+        """
+        embed แถวใหม่ที่ยังไม่มี vector (ทำตอน recall ไม่ให้ add_message ช้า) แล้วเก็บลง memory_vectors
+        blocking=False: ถ้า background กำลัง embed อยู่ ไม่ต้องรอ (recall ใช้ vector เท่าที่มี)
+        """
+        if not self._embed_lock.acquire(blocking=blocking):
+            return
+        try:
+            self._embed_pending()
+        finally:
+            self._embed_lock.release()
+
+    def _embed_pending(self):
+        while not self._closed:
+            with self._reader() as conn:
+                rows = conn.execute(
+                    "SELECT id, content FROM memory WHERE id > ? ORDER BY id LIMIT ?",
+                    (self.embeddings.last_id, EMBEDDING_BATCH),
+                ).fetchall()
+            if not rows:
+                return
+            ids = [row[0] for row in rows]
+            vectors = self.embeddings.embed([row[1] for row in rows])
+            with self._writer() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO memory_vectors (id, model, vector) VALUES (?, ?, ?)",
+                    ((i, self.embeddings.name, v.tobytes()) for i, v in zip(ids, vectors)),
                 )
+            self.embeddings.add(ids, vectors)
 
-    def get_recent_memories(self, limit=5):
+    @contextmanager
+    def _reader(self):
+        if self._in_memory:
+            with self.lock:
+                yield self.conn
+            return
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def _writer(self):
         with self.lock:
             with self.conn:
-                cursor = self.conn.execute('SELECT role, content FROM memory ORDER BY id DESC LIMIT ?', (limit,))
-                return cursor.fetchall()
+                yield self.conn
+
+    def _insert(self, conn, role, content, is_summarized=0, is_history=0):
+        cursor = conn.execute(
+            'INSERT INTO memory (role, content, is_summarized, is_history) VALUES (?, ?, ?, ?)',
+            (role, content, int(is_summarized), int(is_history))
+        )
+        if self._fts:
+            conn.execute("INSERT INTO memory_fts (rowid, tokens) VALUES (?, ?)", (cursor.lastrowid, fts_tokens(content)))
+        return cursor.lastrowid
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def add_message(self, role, content, is_history=False):
+        with self._writer() as conn:
+            self._insert(conn, role, content, is_history=is_history)
+        for callback in self._listeners:
+            callback(content, is_history)
+
+    def get_recent_memories(self, limit=5):
+        with self._reader() as conn:
+            cursor = conn.execute('SELECT role, content FROM memory ORDER BY id DESC LIMIT ?', (limit,))
+            return cursor.fetchall()
 
     def get_unsummarized(self, limit=5):
-        with self.lock:
-            with self.conn:
-                cursor = self.conn.execute(
-                    'SELECT id, role, content FROM memory WHERE is_summarized = 0 AND is_history = 0 ORDER BY id ASC LIMIT ?',
-                    (limit,)
-                )
-                rows = cursor.fetchall()
-                return [{"id": row[0], "role": row[1], "content": row[2]} for row in rows]
+        with self._reader() as conn:
+            cursor = conn.execute(
+                'SELECT id, role, content FROM memory WHERE is_history = 0 AND is_summarized = 0 ORDER BY id ASC LIMIT ?',
+                (limit,)
+            )
+            rows = cursor.fetchall()
+            return [{"id": row[0], "role": row[1], "content": row[2]} for row in rows]
+
+    def count_unsummarized(self, is_history=False):
+        with self._reader() as conn:
+            cursor = conn.execute(
+                'SELECT COUNT(*) FROM memory WHERE is_history = ? AND is_summarized = 0', (int(is_history),)
+            )
+            return cursor.fetchone()[0]
 
     def add_summary(self, summary):
-        with self.lock:
-            with self.conn:
-                self.conn.execute(
-                    'INSERT INTO memory (role, content, is_summarized, is_history) VALUES (?, ?, 1, 0)',
-                    ("summary", summary)
-                )
+        with self._writer() as conn:
+            self._insert(conn, "summary", summary, is_summarized=1, is_history=0)
 
     def mark_as_summarized(self, ids):
-        with self.lock:
-            if not ids:
-                return
-            placeholders = ','.join(['?'] * len(ids))
-            with self.conn:
-                self.conn.execute(f'UPDATE memory SET is_summarized = 1 WHERE id IN ({placeholders})', ids)
+        if not ids:
+            return
+        placeholders = ','.join(['?'] * len(ids))
+        with self._writer() as conn:
+            conn.execute(f'UPDATE memory SET is_summarized = 1 WHERE id IN ({placeholders})', ids)
 
     def get_unsummarized_history(self, limit=5):
-        with self.lock:
-            with self.conn:
-                cursor = self.conn.execute(
-                    'SELECT id, role, content FROM memory WHERE is_summarized = 0 AND is_history = 1 ORDER BY id ASC LIMIT ?',
-                    (limit,)
-                )
-                rows = cursor.fetchall()
-                return [{"id": row[0], "role": row[1], "content": row[2]} for row in rows]
+        with self._reader() as conn:
+            cursor = conn.execute(
+                'SELECT id, role, content FROM memory WHERE is_history = 1 AND is_summarized = 0 ORDER BY id ASC LIMIT ?',
+                (limit,)
+            )
+            rows = cursor.fetchall()
+            return [{"id": row[0], "role": row[1], "content": row[2]} for row in rows]
 
     def get_latest_history_summary(self):
-        with self.lock:
-            with self.conn:
-                cursor = self.conn.execute('''
-                    SELECT content FROM memory
-                    WHERE is_history = 1 AND is_summarized = 1
-                    ORDER BY timestamp DESC
-                    LIMIT 1
-                ''')
-                row = cursor.fetchone()
-                return row[0] if row else ""
+        with self._reader() as conn:
+            cursor = conn.execute('''
+                SELECT content FROM memory
+                WHERE is_history = 1 AND is_summarized = 1
+                ORDER BY timestamp DESC, id DESC
+                LIMIT 1
+            ''')
+            row = cursor.fetchone()
+            return row[0] if row else ""
 
     def add_history_summary(self, summary):
+        with self._writer() as conn:
+            self._insert(conn, "summary", summary, is_summarized=1, is_history=1)
+
+    def recall(self, query, k=MEMORY_RECALL_K, max_tokens=MEMORY_RECALL_MAX_TOKENS):
+        """
+        ความจำ / สรุปที่เกี่ยวกับ query มากที่สุดไม่เกิน k แถว และรวมกันไม่เกิน max_tokens
+        รวมอันดับจาก FTS5 (bm25) กับ embedding (cosine) ด้วย reciprocal rank fusion
+        คืน list ของ dict (id, role, content, timestamp, score) เรียงจากเกี่ยวข้องมากสุด
+        """
+        candidates = k * 4
+        rankings = []
+        match = fts_query(query) if self._fts else ""
+        if match:
+            with self._reader() as conn:
+                rows = conn.execute(
+                    "SELECT rowid FROM memory_fts WHERE memory_fts MATCH ? ORDER BY rank LIMIT ?", (match, candidates)
+                ).fetchall()
+            rankings.append([row[0] for row in rows])
+        if self.embeddings is not None:
+            self._sync_embeddings(blocking=False)
+            rankings.append([row_id for row_id, _ in self.embeddings.search(query, candidates)])
+
+        scores = rrf_fuse(rankings)
+        if not scores:
+            return []
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        placeholders = ','.join(['?'] * len(ranked))
+        with self._reader() as conn:
+            rows = conn.execute(
+                f'SELECT id, role, content, timestamp FROM memory WHERE id IN ({placeholders})', ranked
+            ).fetchall()
+        by_id = {row[0]: row for row in rows if row[0] in scores}
+        by_id = self._relevant(query, by_id)
+
+        selected, used, seen = [], 0, set()
+        for row_id in ranked:
+            row = by_id.get(row_id)
+            if row is None or row[2] in seen:  # ข้อความซ้ำ (ถามเรื่องเดิมหลายครั้ง) เอาแค่อันที่อันดับดีสุด
+                continue
+            cost = token_counter.count(f"{row[1]}: {row[2]}")
+            if used + cost > max_tokens:
+                continue
+            selected.append({"id": row[0], "role": row[1], "content": row[2], "timestamp": row[3], "score": round(scores[row_id], 4)})
+            used += cost
+            seen.add(row[2])
+            if len(selected) >= k:
+                break
+        logger.debug(f"🧠 Recalled {len(selected)} memories (~{used} tokens) for: {query}")
+        return selected
+
+    # ---------- compaction (ใช้โดย MemoryCompactor) ----------
+
+    def count_rows(self):
+        with self._reader() as conn:
+            return conn.execute('SELECT COUNT(*) FROM memory').fetchone()[0]
+
+    def summarized_raw_ids(self, older_than_days, keep_recent):
+        """ข้อความดิบที่สรุปแล้ว เก่ากว่า older_than_days วัน และไม่อยู่ใน keep_recent แถวล่าสุด"""
+        with self._reader() as conn:
+            rows = conn.execute(
+                '''
+                SELECT id FROM memory
+                WHERE role != 'summary' AND is_summarized = 1
+                  AND timestamp < datetime('now', ?)
+                  AND id < COALESCE((SELECT MIN(id) FROM (SELECT id FROM memory ORDER BY id DESC LIMIT ?)), 0)
+                ''',
+                (f"-{older_than_days} days", keep_recent),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def old_summary_ids(self, keep_latest):
+        """summary ที่เก่ากว่า keep_latest อันล่าสุด (แยก memory / history)"""
+        ids = []
+        with self._reader() as conn:
+            for is_history in (0, 1):
+                rows = conn.execute(
+                    '''
+                    SELECT id FROM memory
+                    WHERE role = 'summary' AND is_history = ? AND is_summarized = 1
+                    ORDER BY id DESC LIMIT -1 OFFSET ?
+                    ''',
+                    (is_history, keep_latest),
+                ).fetchall()
+                ids.extend(row[0] for row in rows)
+        return ids
+
+    def oldest_summarized_ids(self, limit):
+        """ข้อความดิบที่สรุปแล้วที่เก่าที่สุด (ไม่รวม summary ซึ่งก็ is_summarized = 1: ตัดด้วย old_summary_ids เท่านั้น)"""
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT id FROM memory WHERE is_summarized = 1 AND role != 'summary' ORDER BY id ASC LIMIT ?", (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def archive(self, ids):
+        """ย้ายแถวจาก memory ไป memory_archive พร้อมลบ FTS / vector ของแถวนั้น"""
+        if not ids:
+            return 0
+        placeholders = ','.join(['?'] * len(ids))
+        with self._writer() as conn:
+            conn.execute(
+                f'''INSERT OR REPLACE INTO memory_archive (id, role, content, is_summarized, is_history, timestamp)
+                    SELECT id, role, content, is_summarized, is_history, timestamp FROM memory WHERE id IN ({placeholders})''',
+                ids,
+            )
+            moved = conn.execute(f'DELETE FROM memory WHERE id IN ({placeholders})', ids).rowcount
+            conn.execute(f'DELETE FROM memory_vectors WHERE id IN ({placeholders})', ids)
+            if self._fts:
+                conn.execute(f'DELETE FROM memory_fts WHERE rowid IN ({placeholders})', ids)
+        if self.embeddings is not None:
+            self.embeddings.remove(ids)
+        return moved
+
+    def incremental_vacuum(self, pages):
+        """
+        คืนพื้นที่ว่างให้ระบบไม่เกิน pages หน้า (ไม่ lock นานแบบ VACUUM เต็ม)
+        DB ที่สร้างก่อนเปิด auto_vacuum=INCREMENTAL ต้อง VACUUM เต็มหนึ่งครั้งก่อน
+        """
         with self.lock:
-            with self.conn:
-                self.conn.execute(
-                    'INSERT INTO memory (role, content, is_summarized, is_history) VALUES (?, ?, 1, 1)',
-                    ("summary", summary)
-                )
+            if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                logger.info(f"🧹 Enabling incremental auto_vacuum on {self.db_path} (one-time VACUUM)")
+                self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                self.conn.execute("VACUUM")
+            free = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+            self.conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+            return min(free, int(pages))
+
+    def _relevant(self, query, rows_by_id):
+        """
+        ตัดแถวที่ไม่เกี่ยวกับคำถามออก (RRF ให้อันดับอย่างเดียว แถวที่แค่มีตัวอักษรบางตัวซ้ำก็ติดมาด้วย)
+        มี embedding: cosine ≥ MEMORY_RECALL_MIN_SIMILARITY, ไม่มี: token ของคำถามอยู่ในแถว ≥ MEMORY_RECALL_MIN_OVERLAP
+        """
+        ids = list(rows_by_id)
+        if not ids:
+            return rows_by_id
+        texts = [rows_by_id[row_id][2] for row_id in ids]
+        if self.embeddings is not None:
+            relevance = self.embeddings.similarities(query, ids, texts)
+            cutoff = MEMORY_RECALL_MIN_SIMILARITY
+        else:
+            relevance = [term_overlap(query, text) for text in texts]
+            cutoff = MEMORY_RECALL_MIN_OVERLAP
+        return {row_id: rows_by_id[row_id] for row_id, value in zip(ids, relevance) if value >= cutoff}
 
     def clear_memory(self):
-        with self.lock:
-            with self.conn:
-                self.conn.execute('DELETE FROM memory')
+        with self._writer() as conn:
+            conn.execute('DELETE FROM memory')
+            conn.execute('DELETE FROM memory_archive')
+            conn.execute('DELETE FROM memory_vectors')
+            if self._fts:
+                conn.execute('DELETE FROM memory_fts')
+        if self.embeddings is not None:
+            self.embeddings.clear()
 
     def close(self):
-        self.conn.close()
\ No newline at end of file
+        self._closed = True
+        with self._embed_lock:  # รอ background embed จบ batch ที่ทำอยู่ก่อนปิด connection
+            pass
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+        self.conn.close()
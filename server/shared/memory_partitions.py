@@ -0,0 +1,256 @@
+# server/shared/memory_partitions.py
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
+
+from server.config.config import (
+    MEMORY_DB_PATH,
+    MEMORY_PARTITION_DIR,
+    MEMORY_MAX_OPEN_PARTITIONS,
+    MEMORY_SESSION_PARTITION_TTL_DAYS,
+)
+from server.shared.memory_manager import MemoryManager
+from server.shared.chat_manager import new_chat_session
+from server.shared.background_summarizer import MemoryBackgroundSummarizer, HistoryBackgroundSummarizer, SummaryScheduler
+from server.shared.memory_compactor import memory_compactor
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_NAMESPACE = "default"
+UNKNOWN_SPEAKER = "unknown"  # ค่าที่ VoiceProfileManager.identify_speaker คืนเมื่อไม่รู้ว่าใคร
+
+
+def _slug(value: str) -> str:
+    """ชื่อไฟล์จาก speaker / session_id (คงตัวอักษรไทยรวมวรรณยุกต์ไว้ แทนเฉพาะอักขระที่ใช้ใน path ไม่ได้)"""
+    return re.sub(r'[\\/:*?"<>|\s.]+', "_", value.strip())[:64] or "_"
+
+
+class MemoryPartition:
+    """
+    ความจำ + สถานะบทสนทนาของผู้ใช้หนึ่งคน (หรือหนึ่ง session ถ้าไม่รู้ว่าใครพูด)
+    - memory_manager: ไฟล์ DB ของตัวเอง → writer lock / WAL ไม่ชนกับผู้ใช้คนอื่น
+    - summary_scheduler: สรุปความจำเฉพาะของ partition นี้
+    - previous_question / last_interaction_time: แทนค่าเดียวทั้ง server ใน GPTClient เดิม
+    - chat_session: คำถาม / คำตอบล่าสุดสำหรับ escalation prompt (เดิมอยู่ใน ChatManager.session ใช้ร่วมทั้ง server)
+    - turn_lock: turn ของผู้ใช้คนเดียวกันทำทีละ turn (ความจำ / previous_question ไม่สลับกัน)
+    - leases: จำนวน turn ที่ถือ partition นี้อยู่ (MemoryPartitions.lease) ยังมีอยู่ → ห้าม evict
+    """
+
+    def __init__(self, namespace: str, db_path: str):
+        self.namespace = namespace
+        self.memory_manager = MemoryManager(db_path)
+        self.memory_summarizer = MemoryBackgroundSummarizer(memory_manager=self.memory_manager)
+        self.history_summarizer = HistoryBackgroundSummarizer(memory_manager=self.memory_manager)
+        self.summary_scheduler = SummaryScheduler(self.memory_manager, [self.memory_summarizer, self.history_summarizer])
+        self.previous_question = None
+        self.chat_session = new_chat_session()
+        self.last_interaction_time = time.time()
+        self.turn_lock = asyncio.Lock()
+        self.leases = 0  # แก้ภายใต้ MemoryPartitions._lock เท่านั้น
+
+    def start(self):
+        self.summary_scheduler.start()
+        memory_compactor.register(self.namespace, self.memory_manager)
+        memory_compactor.start()
+
+    def close(self):
+        memory_compactor.unregister(self.namespace, self.memory_manager)
+        self.summary_scheduler.stop()
+        self.memory_manager.close()
+
+
+class MemoryPartitions:
+    """
+    partition ตาม speaker (จาก VoiceProfileManager.identify_speaker) หรือ session_id
+    เปิดค้างไว้ไม่เกิน max_open partition (LRU) ตัวที่ไม่ได้ใช้นานสุดและไม่มี lease ค้างจะถูกปิด
+    partition "default" (memory.db เดิม) เปิดไว้ตลอด และเป็นที่ recall สำรองของทุก partition (ดู recall())
+    session_id ใหม่ทุกตัวได้ไฟล์ session-*.db ของตัวเอง → ไฟล์ที่ไม่ได้ใช้นานถูกลบโดย prune_idle_sessions() (รันพร้อม compactor)
+    """
+
+    def __init__(self, partition_dir: str = MEMORY_PARTITION_DIR, max_open: int = MEMORY_MAX_OPEN_PARTITIONS):
+        self.partition_dir = partition_dir
+        self.max_open = max_open
+        self._partitions = OrderedDict()
+        self._opening = Counter()  # namespace ที่กำลังเปิด DB อยู่นอก lock (ห้าม prune ไฟล์)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def namespace_for(session_id: str = None, speaker: str = None) -> str:
+        if speaker and speaker != UNKNOWN_SPEAKER:
+            return f"speaker-{_slug(speaker)}"
+        if session_id:
+            return f"session-{_slug(session_id)}"
+        return DEFAULT_NAMESPACE
+
+    def db_path(self, namespace: str) -> str:
+        if namespace == DEFAULT_NAMESPACE:
+            return MEMORY_DB_PATH
+        os.makedirs(self.partition_dir, exist_ok=True)
+        return os.path.join(self.partition_dir, f"{namespace}.db")
+
+    def get(self, namespace: str = DEFAULT_NAMESPACE, lease: bool = False) -> MemoryPartition:
+        """
+        partition ของ namespace (เปิดใหม่ถ้ายังไม่เปิด) — เปิด DB / sync FTS เป็น I/O ใน async code ให้ใช้ open()
+        lease=True: นับ lease ภายใต้ lock เดียวกับที่หา / เปิด partition (ไม่มีช่องให้ถูก evict ก่อน turn เริ่ม)
+        ผู้เรียกต้อง release() เอง — ปกติใช้ผ่าน lease()
+        """
+        partition = self._cached(namespace, lease)
+        if partition is not None:
+            return partition
+
+        # เปิดนอก lock: ผู้ใช้คนอื่นที่ partition เปิดอยู่แล้วไม่ต้องรอ
+        with self._lock:
+            self._opening[namespace] += 1
+        try:
+            opened = MemoryPartition(namespace, self.db_path(namespace))
+        except Exception:
+            with self._lock:
+                self._opening -= Counter({namespace: 1})
+            raise
+        evicted = []
+        with self._lock:
+            self._opening -= Counter({namespace: 1})
+            partition = self._partitions.get(namespace)
+            if partition is None:
+                partition = opened
+                partition.start()
+                self._partitions[namespace] = partition
+                logger.info(f"🧠 Opened memory partition {namespace}")
+                evicted = self._evict(keep=namespace)
+            else:
+                evicted = [opened]  # อีก thread เปิด namespace เดียวกันเสร็จก่อน
+            if lease:
+                partition.leases += 1
+
+        self._close_in_background(evicted)
+        return partition
+
+    async def open(self, namespace: str = DEFAULT_NAMESPACE, lease: bool = False) -> MemoryPartition:
+        partition = self._cached(namespace, lease)
+        if partition is not None:
+            return partition
+        return await asyncio.to_thread(self.get, namespace, lease)
+
+    def release(self, partition: MemoryPartition):
+        with self._lock:
+            partition.leases = max(0, partition.leases - 1)
+
+    @asynccontextmanager
+    async def lease(self, session=None):
+        """partition ของ session ที่จะไม่ถูก evict / ปิดจนกว่าจะออกจาก block (ใช้ครอบทั้ง turn)"""
+        partition = await self.open(self._namespace_of(session), lease=True)
+        try:
+            yield partition
+        finally:
+            self.release(partition)
+
+    async def for_session(self, session=None) -> MemoryPartition:
+        return await self.open(self._namespace_of(session))
+
+    def _namespace_of(self, session=None) -> str:
+        if session is None:
+            return DEFAULT_NAMESPACE
+        return self.namespace_for(session.user_id, session.speaker)
+
+    async def recall(self, partition: MemoryPartition, query: str) -> list:
+        """
+        recall จาก partition ของผู้ใช้ ถ้าไม่เจออะไรเลยลอง memory.db เดิม (partition "default") แบบอ่านอย่างเดียว
+        ความจำที่สะสมไว้ก่อนแยก partition จึงยังใช้ตอบได้ ส่วนข้อความใหม่เขียนลง partition ของผู้ใช้เท่านั้น
+        """
+        recalled = await asyncio.to_thread(partition.memory_manager.recall, query)
+        if recalled or partition.namespace == DEFAULT_NAMESPACE or not os.path.exists(MEMORY_DB_PATH):
+            return recalled
+        shared = await self.open(DEFAULT_NAMESPACE)
+        recalled = await asyncio.to_thread(shared.memory_manager.recall, query)
+        if recalled:
+            logger.debug(f"🧠 Recalled {len(recalled)} memories for {partition.namespace} from {MEMORY_DB_PATH}")
+        return recalled
+
+    def _cached(self, namespace: str, lease: bool = False):
+        with self._lock:
+            partition = self._partitions.get(namespace)
+            if partition is not None:
+                self._partitions.move_to_end(namespace)
+                if lease:
+                    partition.leases += 1
+            return partition
+
+    def _evict(self, keep: str) -> list:
+        """เอา partition ที่ไม่ได้ใช้นานสุด (และไม่มี lease ค้าง) ออกจนเหลือไม่เกิน max_open — เรียกขณะถือ _lock"""
+        evicted = []
+        for name, candidate in list(self._partitions.items()):
+            if len(self._partitions) <= self.max_open:
+                break
+            if name in (DEFAULT_NAMESPACE, keep) or candidate.leases:
+                continue
+            evicted.append(self._partitions.pop(name))
+        return evicted
+
+    @staticmethod
+    def _close_in_background(partitions: list):
+        """scheduler.stop() ต้องรอ batch ที่กำลังสรุปอยู่ (LLM call) → ปิดใน thread แยก ไม่ให้ turn ที่เปิด partition ใหม่ต้องรอ"""
+        if not partitions:
+            return
+
+        def close():
+            for old in partitions:
+                try:
+                    old.close()
+                    logger.info(f"💤 Closed idle memory partition {old.namespace}")
+                except Exception as e:
+                    logger.error(f"❌ Failed to close memory partition {old.namespace}: {e}")
+
+        threading.Thread(target=close, daemon=True).start()
+
+    def prune_idle_sessions(self, max_idle_days: float = MEMORY_SESSION_PARTITION_TTL_DAYS) -> int:
+        """ลบไฟล์ session-*.db (+ -wal / -shm) ที่ไม่ได้เขียนนานเกิน max_idle_days และไม่ได้เปิดอยู่ คืนจำนวน partition ที่ลบ"""
+        if max_idle_days <= 0 or not os.path.isdir(self.partition_dir):
+            return 0
+        cutoff = time.time() - max_idle_days * 86400
+        removed = 0
+        with self._lock:  # กัน get() เปิด namespace ที่กำลังลบ
+            busy = set(self._partitions) | set(self._opening)
+            for filename in os.listdir(self.partition_dir):
+                namespace, ext = os.path.splitext(filename)
+                if ext != ".db" or not namespace.startswith("session-") or namespace in busy:
+                    continue
+                path = os.path.join(self.partition_dir, filename)
+                files = [path + suffix for suffix in ("", "-wal", "-shm") if os.path.exists(path + suffix)]
+                if max(os.path.getmtime(file) for file in files) > cutoff:
+                    continue
+                for file in files:
+                    os.remove(file)
+                removed += 1
+        if removed:
+            logger.info(f"🗑️ Removed {removed} idle session memory partitions from {self.partition_dir}")
+        return removed
+
+    def close_all(self):
+        with self._lock:
+            partitions = list(self._partitions.values())
+            self._partitions.clear()
+        for partition in partitions:
+            partition.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            partitions = list(self._partitions.values())
+        return {
+            partition.namespace: {
+                "busy": partition.turn_lock.locked(),
+                "leases": partition.leases,
+                "idle_sec": round(time.time() - partition.last_interaction_time, 1),
+                "summarizer": partition.summary_scheduler.stats(),
+            }
+            for partition in partitions
+        }
+
+
+# Singleton instance for global use
+memory_partitions = MemoryPartitions()
+memory_compactor.add_housekeeping("idle_session_partitions", memory_partitions.prune_idle_sessions)
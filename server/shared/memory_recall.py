@@ -0,0 +1,152 @@
+# server/shared/memory_recall.py
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from server.shared.extractive_summarizer import tokenize
+from server.shared.response_cache import EMBEDDING_DIM, embed
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# optional: cosine top-k ด้วย NumPy matrix, ถ้าไม่มี numpy ใช้ FTS อย่างเดียว
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# optional: embedding เชิงความหมายจาก model ในเครื่อง (ตั้ง MEMORY_EMBEDDING_MODEL)
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+
+RRF_K = 60  # ค่าคงที่ของ reciprocal rank fusion
+
+
+def fts_tokens(text: str) -> str:
+    """
+    ข้อความสำหรับเก็บใน FTS5: token ภาษาไทย (คำจาก pythainlp หรือ character bigram) คั่นด้วยช่องว่าง
+    tokenizer ของ SQLite (unicode61) ตัดคำไทยที่ไม่มีช่องว่างไม่ได้ จึงตัดในฝั่ง Python ก่อน
+    """
+    return " ".join(tokenize(text))
+
+
+def fts_query(text: str) -> str:
+    """MATCH expression: token ที่ไม่ซ้ำของคำถาม OR กัน (bm25 ให้คะแนนแถวที่ตรงหลาย token สูงกว่า)"""
+    terms = dict.fromkeys(tokenize(text))
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def term_overlap(query: str, text: str) -> float:
+    """สัดส่วนของ token ในคำถามที่อยู่ในข้อความ (ใช้วัดความเกี่ยวข้องเมื่อไม่มี embedding)"""
+    terms = set(tokenize(query))
+    if not terms:
+        return 0.0
+    return len(terms & set(tokenize(text))) / len(terms)
+
+
+def rrf_fuse(rankings: Sequence[Sequence[int]], k: int = RRF_K) -> Dict[int, float]:
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row_id in enumerate(ranking):
+            scores[row_id] = scores.get(row_id, 0.0) + 1.0 / (k + rank + 1)
+    return scores
+
+
+@lru_cache(maxsize=None)  # model เดียวใช้ร่วมกันทุก MemoryManager (หนึ่งตัวต่อ partition)
+def load_embedder(model_name: str) -> Tuple[Optional[str], Optional[Callable[[List[str]], "np.ndarray"]]]:
+    """
+    คืน (ชื่อ backend, ฟังก์ชัน list[str] → matrix ที่ normalize แล้ว)
+    "" = character n-gram hash (ในเครื่อง ไม่ต้องโหลด model), "none" = ปิด, อื่น ๆ = ชื่อ model ของ sentence-transformers
+    """
+    if np is None or model_name == "none":
+        return None, None
+    if model_name:
+        if SentenceTransformer is None:
+            logger.warning(f"⚠️ sentence-transformers not installed, using n-gram hash embeddings instead of {model_name}")
+        else:
+            model = SentenceTransformer(model_name)
+            return model_name, lambda texts: np.asarray(model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    def hash_embed(texts: List[str]) -> "np.ndarray":
+        matrix = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for column, value in embed(text.lower()).items():
+                matrix[row, column] = value
+        return matrix
+
+    return "ngram-hash", hash_embed
+
+
+class EmbeddingIndex:
+    """
+    vector ของแต่ละแถวใน memory เก็บเป็น NumPy matrix (normalize แล้ว) ค้นด้วย cosine top-k ครั้งเดียวทั้ง matrix
+    """
+
+    def __init__(self, name: str, embed_fn: Callable[[List[str]], "np.ndarray"]):
+        self.name = name
+        self.embed_fn = embed_fn
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.matrix = None
+        self.last_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids: List[int], vectors: "np.ndarray"):
+        if not ids:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self.matrix = vectors if self.matrix is None else np.vstack([self.matrix, vectors])
+            self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+            self.last_id = max(self.last_id, int(max(ids)))
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        return self.embed_fn(texts)
+
+    def similarities(self, query: str, ids: List[int], texts: List[str]) -> List[float]:
+        """cosine ของคำถามกับแต่ละแถว ใช้ vector ใน index ถ้ามี ไม่งั้น embed texts ของแถวนั้นเลย"""
+        query_vector = self.embed_fn([query])[0]
+        with self._lock:
+            matrix, index_ids = self.matrix, self.ids
+        vectors = [None] * len(ids)
+        if matrix is not None and len(index_ids):
+            positions = np.minimum(np.searchsorted(index_ids, ids), len(index_ids) - 1)
+            for i, (row_id, position) in enumerate(zip(ids, positions)):
+                if index_ids[position] == row_id:
+                    vectors[i] = matrix[position]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            for i, vector in zip(missing, self.embed_fn([texts[i] for i in missing])):
+                vectors[i] = vector
+        return [float(vector @ query_vector) for vector in vectors]
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        with self._lock:
+            matrix, ids = self.matrix, self.ids
+        if matrix is None or not len(ids):
+            return []
+        scores = matrix @ self.embed_fn([query])[0]
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+    def remove(self, ids: List[int]):
+        if not ids:
+            return
+        with self._lock:
+            if self.matrix is None:
+                return
+            keep = ~np.isin(self.ids, np.asarray(ids, dtype=np.int64))
+            self.matrix = self.matrix[keep]
+            self.ids = self.ids[keep]
+
+    def clear(self):
+        with self._lock:
+            self.ids = np.zeros(0, dtype=np.int64)
+            self.matrix = None
+            self.last_id = 0
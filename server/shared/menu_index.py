@@ -0,0 +1,222 @@
+# server/shared/menu_index.py
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+
+from server.config.config import MENU_INDEX_RELOAD_INTERVAL, MENU_FUZZY_MIN_SCORE, MENU_FUZZY_MARGIN
+from server.shared.fuzzy_matcher import FuzzyMatcher, MatchCandidate
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+SPACES = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return unicodedata.normalize("NFKC", SPACES.sub(" ", text.strip().lower()))
+
+
+class _TrieNode:
+    __slots__ = ("children", "items", "prefix_items")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.items = set()         # รายการที่มีข้อความนี้อยู่ในชื่อ (substring)
+        self.prefix_items = set()  # รายการที่ชื่อขึ้นต้นด้วยข้อความนี้
+
+
+class MenuIndex:
+    """
+    index ของเมนูที่สร้างครั้งเดียวตอนโหลด menu.json (แทนการ normalize + วนทั้งเมนูทุกครั้งที่เรียก)
+    - ชื่อที่ normalize แล้ว / ชื่อแบบไม่มีช่องว่าง / aliases → รายการ: O(1)
+    - suffix trie ของชื่อ: ค้นแบบขึ้นต้นด้วย / มีคำนี้อยู่ในชื่อ ได้ใน O(len(คำค้น))
+    - id → รายการ
+    - fuzzy: FuzzyMatcher (key เสียงอ่านภาษาไทย + edit distance) สำหรับชื่อที่ ASR สะกดเพี้ยน
+    โหลดใหม่อัตโนมัติเมื่อไฟล์ menu.json ถูกแก้ (เช็ค mtime ไม่เกินทุก reload_interval วินาที)
+    """
+
+    def __init__(self, path: str, reload_interval: float = MENU_INDEX_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.version = 0
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._load()
+
+    # ---------- load / reload ----------
+
+    def _load(self):
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        self._build(items)
+        self._mtime = mtime
+        self._checked_at = time.monotonic()
+        self.version += 1
+        logger.info(f"📋 Menu index built: {len(items)} items from {self.path} (v{self.version})")
+
+    def _build(self, items: List[dict]):
+        by_name, by_id, aliases = {}, {}, {}
+        root = _TrieNode()
+        names = []
+
+        for index, item in enumerate(items):
+            name = normalize_text(item["name"])
+            by_name.setdefault(name, index)
+            if "id" in item:
+                by_id[str(item["id"])] = index
+            keys = {name, name.replace(" ", "")}
+            keys.update(normalize_text(alias) for alias in item.get("aliases", []))
+            for key in keys:
+                aliases.setdefault(key, index)
+                aliases.setdefault(key.replace(" ", ""), index)
+                self._insert(root, key, index)
+            names.append((item["name"], item))
+            names.extend((alias, item) for alias in item.get("aliases", []))
+
+        # สลับทั้งชุดทีเดียว ผู้อ่านที่ถือ reference เก่าอยู่ยังใช้ต่อได้
+        self._state = (items, by_name, by_id, aliases, root, FuzzyMatcher(names))
+
+    @staticmethod
+    def _insert(root: _TrieNode, key: str, index: int):
+        for start in range(len(key)):
+            node = root
+            for char in key[start:]:
+                node = node.children.setdefault(char, _TrieNode())
+                node.items.add(index)
+                if start == 0:
+                    node.prefix_items.add(index)
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return
+            self._checked_at = now
+            try:
+                if os.path.getmtime(self.path) != self._mtime:
+                    logger.info(f"🔄 {self.path} changed, rebuilding menu index")
+                    self._load()
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ Menu reload failed, keeping previous index: {e}")
+
+    def _current(self):
+        self._maybe_reload()
+        return self._state
+
+    # ---------- lookups ----------
+
+    @property
+    def items(self) -> List[dict]:
+        return self._current()[0]
+
+    def get(self, item_id) -> Optional[dict]:
+        items, _, by_id, *_ = self._current()
+        index = by_id.get(str(item_id))
+        return items[index] if index is not None else None
+
+    def find(self, name: str) -> Optional[dict]:
+        """
+        ชื่อตรงกัน → alias / ชื่อแบบไม่มีช่องว่าง → ชื่อที่ขึ้นต้นด้วย → ชื่อที่มีคำนี้อยู่ (ลำดับตามเมนู)
+        """
+        items, by_name, _, aliases, root, *_ = self._current()
+        key = normalize_text(name)
+        if not key:
+            return None
+        index = self._exact_index(by_name, aliases, key)
+        if index is None:
+            node = self._walk(root, key) or self._walk(root, key.replace(" ", ""))
+            if node is not None:
+                index = min(node.prefix_items or node.items)
+        return items[index] if index is not None else None
+
+    def starts_with(self, prefix: str) -> List[dict]:
+        items, _, _, _, root, *_ = self._current()
+        node = self._walk(root, normalize_text(prefix))
+        return [items[i] for i in sorted(node.prefix_items)] if node else []
+
+    def search(self, fragment: str) -> List[dict]:
+        items, _, _, _, root, *_ = self._current()
+        node = self._walk(root, normalize_text(fragment))
+        return [items[i] for i in sorted(node.items)] if node else []
+
+    def fuzzy(self, name: str, min_score: float = MENU_FUZZY_MIN_SCORE, limit: int = 3) -> List[MatchCandidate]:
+        """ชื่อเมนูที่ใกล้เคียงกับข้อความจาก ASR เรียงตามคะแนน (candidate.value = รายการเมนู)"""
+        return self._current()[5].match(name, limit=limit, min_score=min_score)
+
+    def resolve(self, name: str, min_score: float = MENU_FUZZY_MIN_SCORE) -> Optional[dict]:
+        """
+        ชื่อตรง / alias → ชื่อที่ขึ้นต้นด้วย (หรือมีคำนี้อยู่) ถ้ามีเมนูเดียว → ชื่อที่ใกล้เคียงที่สุดจาก fuzzy()
+        คืน None ถ้ากำกวม (ควรถามผู้ใช้): คำนี้เป็นส่วนของหลายเมนู เช่น "ข้าวผัด" → ข้าวผัดกุ้ง / ข้าวผัดปู
+        หรือผู้สมัครอันดับ 1 กับ 2 ของ fuzzy คะแนนห่างกันไม่ถึง MENU_FUZZY_MARGIN
+        """
+        items, by_name, _, aliases, root, *_ = self._current()
+        key = normalize_text(name)
+        if not key:
+            return None
+        index = self._exact_index(by_name, aliases, key)
+        if index is not None:
+            return items[index]
+        node = self._walk(root, key) or self._walk(root, key.replace(" ", ""))
+        if node is not None:
+            matches = node.prefix_items or node.items
+            if len(matches) == 1:
+                return items[next(iter(matches))]
+            logger.debug(f"Ambiguous partial menu match for {name!r}: {[items[i]['name'] for i in sorted(matches)]}")
+            return None
+
+        candidates = self.fuzzy(name, min_score=min_score, limit=2)
+        if not candidates:
+            return None
+        best = candidates[0]
+        if len(candidates) > 1 and best.score - candidates[1].score < MENU_FUZZY_MARGIN:
+            logger.debug(f"Ambiguous menu match for {name!r}: {[(c.name, c.score) for c in candidates]}")
+            return None
+        logger.debug(f"Fuzzy menu match: {name!r} → {best.value['name']!r} ({best.score})")
+        return best.value
+
+    def suggest(self, name: str, limit: int = 3) -> List[dict]:
+        """ตัวเลือกให้ผู้ใช้เลือกเมื่อ resolve() กำกวม: เมนูที่ขึ้นต้นด้วย / มีคำนี้ ก่อน แล้วตามด้วย fuzzy()"""
+        items, _, _, _, root, *_ = self._current()
+        key = normalize_text(name)
+        node = self._walk(root, key) or self._walk(root, key.replace(" ", ""))
+        indexes = sorted(node.prefix_items) + sorted(node.items - node.prefix_items) if node else []
+        suggestions = [items[i] for i in indexes[:limit]]
+        for candidate in self.fuzzy(name, limit=limit):
+            if len(suggestions) >= limit:
+                break
+            if candidate.value not in suggestions:
+                suggestions.append(candidate.value)
+        return suggestions
+
+    def lookup_price(self, name: str) -> Optional[float]:
+        item = self.find(name)
+        return item["price"] if item else None
+
+    def validate_item(self, name: str) -> bool:
+        return self.find(name) is not None
+
+    @staticmethod
+    def _exact_index(by_name: dict, aliases: dict, key: str) -> Optional[int]:
+        index = by_name.get(key)
+        if index is None:
+            index = aliases.get(key, aliases.get(key.replace(" ", "")))
+        return index
+
+    @staticmethod
+    def _walk(root: _TrieNode, key: str) -> Optional[_TrieNode]:
+        if not key:
+            return None
+        node = root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
@@ -0,0 +1,191 @@
+# server/shared/response_cache.py
+import hashlib
+import math
+import re
+import threading
+import time
+import unicodedata
+import zlib
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from server.config.config import (
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_SIMILARITY,
+    RESPONSE_CACHE_TTLS,
+)
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+# คำขึ้นต้น / ลงท้าย / คำสุภาพที่ไม่เปลี่ยนความหมายของคำถาม (ตัดเฉพาะที่หัวและท้ายประโยค)
+LEADING_WORDS = ["ผิงผิง", "ช่วย", "ขอ"]
+TRAILING_WORDS = [
+    "ค่ะ", "คะ", "ครับ", "คับ", "จ้ะ", "จ้า", "จ๊ะ", "นะ", "หน่อย", "ผิงผิง",
+    "เป็นยังไง", "เป็นไง", "ยังไง", "อย่างไร", "อะไร", "บ้าง", "ไหม", "มั้ย", "เท่าไหร่", "เท่าไร", "มี",
+]
+LEADING_PATTERN = re.compile("^(?:" + "|".join(map(re.escape, LEADING_WORDS)) + ")+")
+TRAILING_PATTERN = re.compile("(?:" + "|".join(sorted(map(re.escape, TRAILING_WORDS), key=len, reverse=True)) + ")+$")
+THAI_DIGITS = str.maketrans("๐๑๒๓๔๕๖๗๘๙", "0123456789")
+EMBEDDING_DIM = 1024
+DEFAULT_TTL = 6 * 60 * 60
+
+
+def normalize_question(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower().translate(THAI_DIGITS)
+    text = re.sub(r"[^\w฀-๿]+", "", text)
+    stripped = TRAILING_PATTERN.sub("", LEADING_PATTERN.sub("", text))
+    # ถ้าตัดแล้วไม่เหลืออะไร (เช่น "อะไร") ใช้ข้อความเดิม
+    return stripped or text
+
+
+def numeric_tokens(text: str) -> Tuple[str, ...]:
+    """
+    ตัวเลขในคำถามตามลำดับ (12 กับ 012 ถือว่าเท่ากัน) embedding ของ n-gram มองข้ามตัวเลขต่างกันแค่ตัวเดียว
+    เช่น "นายกคนที่ 28" กับ "คนที่ 29" จึงต้องเทียบตัวเลขแยกก่อนยอมรับ semantic hit
+    """
+    return tuple(str(int(token)) for token in re.findall(r"\d+", text))
+
+
+def embed(text: str) -> Dict[int, float]:
+    """
+    embedding แบบเบา: character 2-3 gram hash ลง EMBEDDING_DIM ช่อง แล้ว L2-normalize
+    ภาษาไทยไม่มีช่องว่างระหว่างคำ จึงใช้ n-gram ระดับตัวอักษรแทนการตัดคำ
+    """
+    counts = Counter()
+    for n in (2, 3):
+        for i in range(len(text) - n + 1):
+            counts[zlib.crc32(text[i:i + n].encode("utf-8")) % EMBEDDING_DIM] += 1
+    norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+    return {k: v / norm for k, v in counts.items()}
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+@dataclass
+class CacheEntry:
+    normalized: str
+    vector: Dict[int, float]
+    numbers: Tuple[str, ...]
+    intent: str
+    fingerprint: str
+    answer: Any  # SSML ของ chat หรือ result dict ของ handler
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    Cache คำตอบของ HANA สำหรับคำถามที่ถามซ้ำ
+    - ตรงกันหลัง normalize → hit ทันที, ไม่ตรงแต่ cosine similarity ของ embedding ≥ threshold
+      และตัวเลขในคำถามตรงกันทุกตัว (วันที่ / ลำดับ / จำนวน) → hit
+    - TTL ตาม intent (ข่าว / อากาศ / ค้นเว็บ สั้น, ความรู้ทั่วไปยาว)
+    - fingerprint ของ context (memory / history) ต้องตรงกัน ถ้า context เปลี่ยนถือว่า miss
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        similarity_threshold: float = RESPONSE_CACHE_SIMILARITY,
+        ttls: Dict[str, float] = RESPONSE_CACHE_TTLS,
+    ):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.ttls = dict(ttls)
+        self._entries = OrderedDict()  # (normalized, intent, fingerprint) → CacheEntry
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(parts: List[str]) -> str:
+        if not parts:
+            return ""
+        return hashlib.sha1("\n\n".join(parts).encode("utf-8")).hexdigest()
+
+    def ttl_for(self, intent: str) -> float:
+        return self.ttls.get(intent, self.ttls.get("default", DEFAULT_TTL))
+
+    def lookup(self, question: str, intent: str, fingerprint: str = "") -> Optional[Tuple[Any, float]]:
+        """
+        คืน (answer, similarity) ถ้า hit (similarity = 1.0 เมื่อตรงกันหลัง normalize) ไม่งั้นคืน None
+        """
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        now = time.time()
+        with self._lock:
+            self._purge(now)
+            entry = self._entries.get((normalized, intent, fingerprint))
+            if entry is not None:
+                self._entries.move_to_end((normalized, intent, fingerprint))
+                self.hits += 1
+                logger.info(f"🎯 Response cache hit (exact): {question}")
+                return entry.answer, 1.0
+
+            vector = embed(normalized)
+            numbers = numeric_tokens(normalized)
+            best_key, best_score = None, 0.0
+            for key, candidate in self._entries.items():
+                if candidate.intent != intent or candidate.fingerprint != fingerprint or candidate.numbers != numbers:
+                    continue
+                score = cosine(vector, candidate.vector)
+                if score > best_score:
+                    best_key, best_score = key, score
+
+            if best_key is not None and best_score >= self.similarity_threshold:
+                self._entries.move_to_end(best_key)
+                self.hits += 1
+                self.semantic_hits += 1
+                logger.info(f"🎯 Response cache hit (similarity={best_score:.2f}): {question}")
+                return self._entries[best_key].answer, best_score
+
+            self.misses += 1
+            return None
+
+    def store(self, question: str, intent: str, answer: Any, fingerprint: str = ""):
+        normalized = normalize_question(question)
+        if not normalized or not answer:
+            return
+        key = (normalized, intent, fingerprint)
+        with self._lock:
+            self._entries[key] = CacheEntry(
+                normalized=normalized,
+                vector=embed(normalized),
+                numbers=numeric_tokens(normalized),
+                intent=intent,
+                fingerprint=fingerprint,
+                answer=answer,
+                expires_at=time.time() + self.ttl_for(intent),
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _purge(self, now: float):
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+            }
+
+
+# Singleton instance for global use (None = ปิด cache)
+response_cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
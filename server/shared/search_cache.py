@@ -0,0 +1,292 @@
+# server/shared/search_cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+from server.config.config import (
+    SEARCH_CACHE_ENABLED,
+    SEARCH_CACHE_DB,
+    SEARCH_CACHE_MAX_QUERIES,
+    SEARCH_CACHE_MAX_PAGES,
+    SEARCH_CACHE_MAX_PAGE_BYTES,
+    SEARCH_CACHE_QUERY_TTL,
+    SEARCH_CACHE_PAGE_TTLS,
+)
+from core.utils.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+QUERY = "query"
+PAGE = "page"
+DEFAULT_PAGE_TTL = 60 * 60
+
+
+@dataclass
+class CachedItem:
+    value: Any
+    expires_at: float
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def is_fresh(self, now: float = None) -> bool:
+        return self.expires_at > (now if now is not None else time.time())
+
+    @property
+    def revalidatable(self) -> bool:
+        return bool(self.etag or self.last_modified)
+
+
+def page_ttl(url: str, ttls: Dict[str, float]) -> float:
+    """
+    TTL ของหน้าเว็บตาม domain (ตรงกับ host หรือ subdomain ของ host) ไม่เจอใช้ "default"
+    """
+    host = (urlparse(url).hostname or "").lower()
+    for domain, ttl in ttls.items():
+        if domain != "default" and (host == domain or host.endswith("." + domain)):
+            return ttl
+    return ttls.get("default", DEFAULT_PAGE_TTL)
+
+
+class SearchCache:
+    """
+    Cache 2 ระดับของ SearchManager
+    - query: (query, lang, top_k) → organic results ของ Serper, TTL เดียว
+    - page: URL → ข้อความที่ extract แล้ว, TTL ตาม domain
+      หน้าที่หมดอายุแต่มี ETag / Last-Modified ยังเก็บไว้เพื่อทำ conditional GET (304 → ต่ออายุ)
+    แต่ละระดับเป็น LRU จำกัดจำนวน entry (page จำกัดจำนวน byte ด้วย)
+    ถ้าตั้ง db_path จะเขียนลง SQLite ด้วย และโหลดกลับตอนเริ่ม server
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = SEARCH_CACHE_DB,
+        max_queries: int = SEARCH_CACHE_MAX_QUERIES,
+        max_pages: int = SEARCH_CACHE_MAX_PAGES,
+        max_page_bytes: int = SEARCH_CACHE_MAX_PAGE_BYTES,
+        query_ttl: float = SEARCH_CACHE_QUERY_TTL,
+        page_ttls: Dict[str, float] = SEARCH_CACHE_PAGE_TTLS,
+    ):
+        self.db_path = db_path or None
+        self.max_entries = {QUERY: max_queries, PAGE: max_pages}
+        self.max_bytes = {QUERY: None, PAGE: max_page_bytes}
+        self.query_ttl = query_ttl
+        self.page_ttls = dict(page_ttls)
+
+        self._levels = {QUERY: OrderedDict(), PAGE: OrderedDict()}
+        self._bytes = {QUERY: 0, PAGE: 0}
+        self._lock = threading.Lock()
+        self.conn = None
+
+        self.hits = {QUERY: 0, PAGE: 0}
+        self.misses = {QUERY: 0, PAGE: 0}
+        self.stale = {QUERY: 0, PAGE: 0}  # หมดอายุแต่คืนไปให้ revalidate (conditional GET)
+        self.revalidations = 0
+        self.evictions = 0
+
+        if self.db_path:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._create_table()
+            self._load()
+
+    @property
+    def persistent(self) -> bool:
+        """True = ทุก get / put อาจเขียน SQLite (commit) → caller ใน async code ควรเรียกผ่าน asyncio.to_thread"""
+        return self.conn is not None
+
+    # ---------- Query results ----------
+
+    @staticmethod
+    def query_key(query: str, lang_code: str, top_k: int) -> str:
+        return json.dumps([" ".join(query.lower().split()), lang_code, top_k], ensure_ascii=False)
+
+    def get_results(self, query: str, lang_code: str, top_k: int) -> Optional[list]:
+        item = self._get(QUERY, self.query_key(query, lang_code, top_k))
+        if item is None or not item.is_fresh():
+            return None
+        return item.value
+
+    def put_results(self, query: str, lang_code: str, top_k: int, results: list):
+        if not results:
+            return
+        size = len(json.dumps(results, ensure_ascii=False))
+        self._put(QUERY, self.query_key(query, lang_code, top_k), CachedItem(results, time.time() + self.query_ttl, size))
+
+    # ---------- Page content ----------
+
+    def get_page(self, url: str) -> Optional[CachedItem]:
+        """
+        คืน CachedItem ของหน้า (อาจหมดอายุแล้วแต่ยัง revalidate ได้ → ใช้ conditional_headers) หรือ None
+        """
+        return self._get(PAGE, url)
+
+    @staticmethod
+    def conditional_headers(item: Optional[CachedItem]) -> dict:
+        headers = {}
+        if item is not None:
+            if item.etag:
+                headers["If-None-Match"] = item.etag
+            if item.last_modified:
+                headers["If-Modified-Since"] = item.last_modified
+        return headers
+
+    def put_page(self, url: str, text: str, etag: str = None, last_modified: str = None):
+        item = CachedItem(
+            value=text,
+            expires_at=time.time() + page_ttl(url, self.page_ttls),
+            size=len(text.encode("utf-8")),
+            etag=etag,
+            last_modified=last_modified,
+        )
+        self._put(PAGE, url, item)
+
+    def revalidate_page(self, url: str) -> Optional[str]:
+        """
+        server ตอบ 304 Not Modified → ต่ออายุหน้าเดิมแล้วคืนข้อความ
+        """
+        with self._lock:
+            item = self._levels[PAGE].get(url)
+            if item is None:
+                return None
+            item.expires_at = time.time() + page_ttl(url, self.page_ttls)
+            self.revalidations += 1
+            self._persist(PAGE, url, item)
+            return item.value
+
+    # ---------- Internals ----------
+
+    def _get(self, level: str, key: str) -> Optional[CachedItem]:
+        now = time.time()
+        with self._lock:
+            entries = self._levels[level]
+            item = entries.get(key)
+            if item is not None and not item.is_fresh(now) and not item.revalidatable:
+                self._remove(level, key)
+                item = None
+            if item is None:
+                self.misses[level] += 1
+                return None
+            entries.move_to_end(key)
+            if item.is_fresh(now):
+                self.hits[level] += 1
+            else:
+                self.stale[level] += 1
+            return item
+
+    def _put(self, level: str, key: str, item: CachedItem):
+        with self._lock:
+            self._remove(level, key)
+            self._levels[level][key] = item
+            self._bytes[level] += item.size
+            self._persist(level, key, item)
+            self._evict(level)
+
+    def _evict(self, level: str):
+        entries = self._levels[level]
+        max_bytes = self.max_bytes[level]
+        while entries and (
+            len(entries) > self.max_entries[level] or (max_bytes is not None and self._bytes[level] > max_bytes)
+        ):
+            self._remove(level, next(iter(entries)))
+            self.evictions += 1
+
+    def _remove(self, level: str, key: str):
+        item = self._levels[level].pop(key, None)
+        if item is None:
+            return
+        self._bytes[level] -= item.size
+        if self.conn is not None:
+            with self.conn:
+                self.conn.execute("DELETE FROM search_cache WHERE level = ? AND key = ?", (level, key))
+
+    # ---------- SQLite persistence ----------
+
+    def _create_table(self):
+        with self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    level TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    expires_at REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (level, key)
+                )
+            ''')
+
+    def _persist(self, level: str, key: str, item: CachedItem):
+        if self.conn is None:
+            return
+        with self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO search_cache (level, key, value, etag, last_modified, expires_at, size, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (level, key, json.dumps(item.value, ensure_ascii=False), item.etag, item.last_modified,
+                 item.expires_at, item.size, time.time())
+            )
+
+    def _load(self):
+        now = time.time()
+        with self.conn:
+            # หมดอายุและ revalidate ไม่ได้ → ไม่ต้องโหลด
+            self.conn.execute(
+                "DELETE FROM search_cache WHERE expires_at <= ? AND etag IS NULL AND last_modified IS NULL", (now,)
+            )
+            rows = self.conn.execute(
+                "SELECT level, key, value, etag, last_modified, expires_at, size FROM search_cache ORDER BY updated_at ASC"
+            ).fetchall()
+
+        with self._lock:
+            for level, key, value, etag, last_modified, expires_at, size in rows:
+                if level not in self._levels:
+                    continue
+                self._levels[level][key] = CachedItem(json.loads(value), expires_at, size, etag, last_modified)
+                self._bytes[level] += size
+            for level in self._levels:
+                self._evict(level)
+        logger.info(
+            f"🗂️ Search cache loaded: {len(self._levels[QUERY])} queries, {len(self._levels[PAGE])} pages"
+        )
+
+    # ---------- Metrics ----------
+
+    def clear(self):
+        with self._lock:
+            for level in self._levels:
+                self._levels[level].clear()
+                self._bytes[level] = 0
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute("DELETE FROM search_cache")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                level: {
+                    "entries": len(self._levels[level]),
+                    "bytes": self._bytes[level],
+                    "hits": self.hits[level],
+                    "misses": self.misses[level],
+                    "stale": self.stale[level],
+                }
+                for level in self._levels
+            }
+            stats.update(
+                revalidations=self.revalidations,
+                evictions=self.evictions,
+                persistent=self.conn is not None,
+            )
+            return stats
+
+# Singleton instance for global use (None = ปิด cache)
+search_cache = SearchCache() if SEARCH_CACHE_ENABLED else None
@@ -1,12 +1,28 @@
 # assistant/search_manager.py (refactored with context builder integration)
 
+import asyncio
+import threading
+import httpx
 import requests
 from bs4 import BeautifulSoup
 from datetime import datetime
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
-from server.config.config import SERPER_API_KEY
+from server.config.config import (
+    SERPER_API_KEY,
+    SEARCH_MAX_CONNECTIONS,
+    SEARCH_MAX_KEEPALIVE_CONNECTIONS,
+    SEARCH_CONNECT_TIMEOUT,
+    SEARCH_REQUEST_TIMEOUT,
+    SEARCH_LEG_TIMEOUT,
+    WEB_FETCH_TIMEOUT,
+    WEB_SUMMARY_MODE,
+)
+from server.shared.search_cache import search_cache
+from server.shared.html_extractor import extract_paragraphs
+from server.shared.extractive_summarizer import extractive_summarizer
+from server.shared.context_builder import token_counter
 from core.utils.logger_config import get_logger
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from core.utils.latency_logger import LatencyLogger
@@ -14,6 +30,16 @@ from urllib.parse import urlparse
 
 logger = get_logger(__name__)
 
+# optional: ถ้าไม่ได้ติดตั้ง จะถือว่าเป็นภาษาไทยและไม่แปล (ค้นด้วยคำเดิม)
+try:
+    from langdetect import detect
+except ImportError:
+    detect = None
+try:
+    from deep_translator import GoogleTranslator
+except ImportError:
+    GoogleTranslator = None
+
 import re
 from datetime import datetime, timedelta
 from typing import List, Union
@@ -30,12 +56,41 @@ THAI_MONTHS = {
     "ต.ค.": 10, "พ.ย.": 11, "ธ.ค.": 12
 }
 
+SERPER_URL = "https://google.serper.dev/search"
+
+# httpx.AsyncClient ตัวเดียวใช้ร่วมกันทุก SearchManager (keep-alive ไปที่ Serper)
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_search_http_client() -> httpx.AsyncClient:
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=SEARCH_MAX_CONNECTIONS,
+                    max_keepalive_connections=SEARCH_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                timeout=httpx.Timeout(SEARCH_REQUEST_TIMEOUT, connect=SEARCH_CONNECT_TIMEOUT),
+            )
+        return _http_client
+
+
+async def close_search_http_client():
+    global _http_client
+    with _http_client_lock:
+        client, _http_client = _http_client, None
+    if client is not None:
+        await client.aclose()
+
 
 class SearchManager:
     def __init__(self, gpt_client):
         logger.info("SearchManager initialized")
         self.serper_api_key = SERPER_API_KEY
         self.gpt_client = gpt_client
+        self.search_cache = search_cache
 
     import re
 
@@ -97,39 +152,73 @@ class SearchManager:
         lang = self.detect_language(query)
 
         # Primary: Original language
+        results_secondary = []
         if lang == 'en':
             results_primary = self.search_serper(query, top_k=top_k, lang_code='en')
         else:
             results_primary = self.search_serper(query, top_k=top_k, lang_code='th')
             results_secondary = self.search_serper(self.translate_for_search(query), top_k=top_k, lang_code="en")
 
+        return self._merge_results([results_primary, results_secondary], top_k)
+
+    async def search_dual_language_async(self, query, top_k=5, timeout=SEARCH_LEG_TIMEOUT):
+        """
+        เหมือน search_dual_language แต่ค้นไทย กับ (แปล → ค้นอังกฤษ) พร้อมกัน
+        แต่ละ leg มี deadline = timeout วินาที leg ที่ช้าหรือ error จะถูกทิ้ง ใช้ผลของ leg ที่เหลือ
+        """
+        lang = self.detect_language(query)
+        if lang == 'en':
+            legs = {"en": self.search_serper_async(query, top_k=top_k, lang_code='en')}
+        else:
+            legs = {
+                "th": self.search_serper_async(query, top_k=top_k, lang_code='th'),
+                "en": self._search_translated_async(query, top_k=top_k),
+            }
 
-        # # Secondary: Parallel search in other language
-        # alt_lang = 'th' if lang == 'en' else 'en'
-        # results_secondary = self.search_serper(query, top_k=top_k, lang_code=alt_lang)
+        results = await asyncio.gather(*(self._run_leg(name, leg, timeout) for name, leg in legs.items()))
+        return self._merge_results(results, top_k)
+
+    async def _search_translated_async(self, query, top_k=5):
+        translated = await asyncio.to_thread(self.translate_for_search, query)
+        return await self.search_serper_async(translated, top_k=top_k, lang_code="en")
+
+    async def _run_leg(self, name, leg, timeout):
+        try:
+            return await asyncio.wait_for(leg, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ Search leg '{name}' exceeded {timeout}s, dropped")
+        except Exception as e:
+            logger.warning(f"⚠️ Search leg '{name}' failed: {e}")
+        return []
 
+    def _merge_results(self, result_lists, top_k):
         # Combine & de-duplicate by URL
         seen = set()
         combined = []
-        for item in results_primary + results_secondary:
-            url = item.get("link")
-            if url and url not in seen:
-                seen.add(url)
-                combined.append(item)
+        for results in result_lists:
+            for item in results:
+                url = item.get("link")
+                if url and url not in seen:
+                    seen.add(url)
+                    combined.append(item)
 
         return combined[:top_k * 2]  # return up to 2x top_k entries
 
-
     def search_serper(self, query, top_k=5, lang_code="th"):
         #logger.debug(f"Enter search_serper : query = {query} : top_k={top_k}")
-        url = "https://google.serper.dev/search"
+        cached = self._cached_results(query, top_k, lang_code)
+        if cached is not None:
+            return cached
+
         headers = {"X-API-KEY": self.serper_api_key}
         payload = {"q": query, "hl": lang_code, "gl": lang_code, "num": top_k}
 
-        res = requests.post(url, headers=headers, json=payload)
+        res = requests.post(SERPER_URL, headers=headers, json=payload)
         res.raise_for_status()
         data = res.json()
         results = data.get("organic", [])[:top_k]
+        if self.search_cache is not None:
+            self.search_cache.put_results(query, lang_code, top_k, results)
         # logger.debug("calling normalize_thai_date")
         # for item in results:
         #     original_snippet = item.get("snippet", "")
@@ -139,6 +228,35 @@ class SearchManager:
         # logger.debug("Exit search_serper")
         return results
 
+    async def search_serper_async(self, query, top_k=5, lang_code="th"):
+        cached = await self._cache_call(self._cached_results, query, top_k, lang_code)
+        if cached is not None:
+            return cached
+
+        headers = {"X-API-KEY": self.serper_api_key}
+        payload = {"q": query, "hl": lang_code, "gl": lang_code, "num": top_k}
+
+        res = await get_search_http_client().post(SERPER_URL, headers=headers, json=payload)
+        res.raise_for_status()
+        results = res.json().get("organic", [])[:top_k]
+        if self.search_cache is not None:
+            await self._cache_call(self.search_cache.put_results, query, lang_code, top_k, results)
+        return results
+
+    async def _cache_call(self, fn, *args):
+        """cache ที่เขียนลง SQLite (SEARCH_CACHE_DB) commit ทุก get / put → ไม่ทำบน event loop, cache ในหน่วยความจำเรียกตรง"""
+        if self.search_cache is not None and self.search_cache.persistent:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _cached_results(self, query, top_k, lang_code):
+        if self.search_cache is None:
+            return None
+        results = self.search_cache.get_results(query, lang_code, top_k)
+        if results is not None:
+            logger.info(f"🗂️ Search cache hit ({lang_code}): {query}")
+        return results
+
     def should_fetch(self, link, snippet):
         if not snippet or len(snippet) < 80:
             return True
@@ -212,16 +330,33 @@ class SearchManager:
                 "Chrome/114.0.0.0 Safari/537.36"
             )
         }
+        cached = self.search_cache.get_page(url) if self.search_cache is not None else None
+        if cached is not None:
+            if cached.is_fresh():
+                return cached.value
+            # หมดอายุแต่มี ETag / Last-Modified → conditional GET
+            headers.update(self.search_cache.conditional_headers(cached))
         try:
             logger.debug("Enter fetch_webpage_content")
-            response = requests.get(url, headers=headers, timeout=5)
-            soup = BeautifulSoup(response.text, "html.parser")
-            paragraphs = soup.find_all("p")
-            text = "\n".join(p.get_text() for p in paragraphs)
+            # stream=True: อ่าน body ทีละ chunk และหยุดทันทีที่ได้ข้อความครบ budget
+            with requests.get(url, headers=headers, timeout=WEB_FETCH_TIMEOUT, stream=True) as response:
+                if response.status_code == 304 and cached is not None:
+                    logger.debug(f"Not modified, reuse cached page: {url}")
+                    return self.search_cache.revalidate_page(url) or ""
+                # ไม่มี charset ใน header → requests เดาเป็น ISO-8859-1 ซึ่งทำให้ภาษาไทยเพี้ยน ใช้ utf-8 แทน
+                has_charset = "charset" in response.headers.get("Content-Type", "").lower()
+                encoding = response.encoding if has_charset else "utf-8"
+                text = extract_paragraphs(response.iter_content(chunk_size=16 * 1024), encoding=encoding)
+            if response.ok and self.search_cache is not None:
+                self.search_cache.put_page(
+                    url, text,
+                    etag=response.headers.get("ETag"),
+                    last_modified=response.headers.get("Last-Modified"),
+                )
             logger.debug("Exit fetch_webpage_content")
-            return text.strip()
+            return text
         except Exception as e:
-            logger.error(f"â Error fetching {url}: {e}")
+            logger.error(f"â Error fetching {url}: {e}")
             return ""
 
 
@@ -278,9 +413,29 @@ class SearchManager:
         logger.debug(f"context={context}")
         return context.strip()
     
-    def summarize_web_context(self, context_str, user_question):
+    async def summarize_web_context(self, context_str, user_question):
         logger.debug("Enter summarize_web_context")        
         logger.debug(f"context_str={context_str}")
+        if WEB_SUMMARY_MODE == "extractive":
+            return self.summarize_web_context_extractive(context_str, user_question)
+        return await self.summarize_web_context_llm(context_str, user_question)
+
+    def summarize_web_context_extractive(self, context_str, user_question, max_tokens=None):
+        """
+        เลือกประโยคที่เกี่ยวกับคำถามที่สุดจากผลค้นหา (BM25 ในเครื่อง) แทนการให้ LLM สรุปอีกรอบ
+        max_tokens รวมบรรทัดวันที่ที่นำหน้าด้วย (WEB_SUMMARY_MAX_TOKENS เป็นเพดานจริง)
+        """
+        today_th = datetime.today().strftime("%-d %B %Y")
+        prefix = f"(ข้อมูลค้นเมื่อวันที่ {today_th})\n"
+        budget = (max_tokens or extractive_summarizer.max_tokens) - token_counter.count(prefix)
+        if budget <= 0:
+            return ""
+        summary = extractive_summarizer.summarize(context_str, user_question, max_tokens=budget)
+        if not summary:
+            return ""
+        return prefix + summary
+
+    async def summarize_web_context_llm(self, context_str, user_question):
         # context_str = self.build_context_from_search_results(results)
 
         # if not context_str:
@@ -311,7 +466,7 @@ class SearchManager:
 
 
         try:
-            summary = self.gpt_client.chat_manager.ask_simple(prompt)
+            summary = await self.gpt_client.chat_manager.ask_simple(prompt)
             print(f"summarized = {summary}")
             return summary.strip() if summary else ""
         except Exception as e:
@@ -11,6 +11,7 @@ SESSION_TIMEOUT = 300  # seconds (5 minutes)
 class Session:
     def __init__(self, user_id: str):
         self.user_id = user_id
+        self.speaker = None  # ชื่อผู้พูดจาก VoiceProfileManager.identify_speaker (ใช้แยกความจำ)
         self.intent = None
         self.state = None
         self.context = {}
@@ -32,6 +33,7 @@ class Session:
     def to_dict(self):
         return {
             "user_id": self.user_id,
+            "speaker": self.speaker,
             "intent": self.intent,
             "state": self.state,
             "context": self.context,
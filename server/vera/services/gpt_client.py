@@ -1,13 +1,12 @@
-from openai import OpenAI
 from server.config.config import OPENAI_API_KEY, OPENAI_MODEL
+from server.shared.llm_gateway import llm_gateway
 from core.utils.logger_config import get_logger
 
 logger = get_logger(__name__)
-client = OpenAI(api_key=OPENAI_API_KEY)
 
-def ask_gpt(messages: list) -> str:
+async def ask_gpt(messages: list) -> str:
     logger.info("Sending conversation history to OpenAI")
-    response = client.chat.completions.create(
+    response = await llm_gateway.chat(
         model=OPENAI_MODEL,
         messages=messages
     )
@@ -15,3 +14,18 @@ def ask_gpt(messages: list) -> str:
     usage = response.usage
     logger.info(f"🔢 Token usage: input={usage.prompt_tokens}, output={usage.completion_tokens}, total={usage.total_tokens}")
     return reply
+
+def _log_usage(usage):
+    logger.info(f"🔢 Token usage: input={usage.prompt_tokens}, output={usage.completion_tokens}, total={usage.total_tokens}")
+
+async def ask_gpt_stream(messages: list):
+    """
+    เหมือน ask_gpt แต่ yield ข้อความทีละส่วนตามที่ LLM stream กลับมา
+    """
+    logger.info("Streaming conversation history to OpenAI")
+    async for delta in llm_gateway.stream_chat(
+        model=OPENAI_MODEL,
+        messages=messages,
+        on_usage=_log_usage
+    ):
+        yield delta
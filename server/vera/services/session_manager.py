@@ -3,13 +3,16 @@ from core.utils.logger_config import get_logger
 from server.vera.services.order import OrderItem
 from typing import List, Dict, Optional
 from server.vera.services.gpt_client import ask_gpt
+from server.config.config import VERA_HISTORY_MAX_TOKENS
+from server.shared.context_builder import context_builder, token_counter
 
 logger = get_logger(__name__)
 
 class SessionManager:
-    def __init__(self, max_history=30):
+    def __init__(self, max_history=30, max_history_tokens=VERA_HISTORY_MAX_TOKENS):
         self.sessions: Dict[str, Dict] = {}
         self.max_history = max_history
+        self.max_history_tokens = max_history_tokens
 
     def init_session(self, session_id: str, system_prompt: str):
         self.sessions[session_id] = {
@@ -18,21 +21,38 @@ class SessionManager:
         }
         logger.info(f"🆕 Session initialized: {session_id}")
 
-    def get_history(self, session_id: str):
+    async def get_history(self, session_id: str, max_tokens: Optional[int] = None):
+        """
+        สรุปบทสนทนาเมื่อยาวเกิน max_history message หรือ max_history_tokens token
+        max_tokens: คืนเฉพาะ system prompt / summary + message ล่าสุดที่พอดี budget (None = คืนทั้งหมด)
+        """
         messages = self.sessions[session_id]["messages"]
-        if len(messages) > self.max_history:
-            logger.info(f"🧠 Summarizing session: {session_id} ({len(messages)} messages)")
+        history_tokens = sum(token_counter.count_message(m) for m in messages if m["role"] != "system")
+        if len(messages) > self.max_history or history_tokens > self.max_history_tokens:
+            logger.info(f"🧠 Summarizing session: {session_id} ({len(messages)} messages, {history_tokens} tokens)")
             summary_prompt = [
                 {"role": "system", "content": "กรุณาสรุปสาระสำคัญของบทสนทนาให้กระชับในรูปแบบที่ GPT สามารถเข้าใจและตอบต่อได้ โดยไม่ต้องอธิบายบริบทเพิ่มเติม"},
                 *messages
             ]
-            summary_text = ask_gpt(summary_prompt)
+            summary_text = await ask_gpt(summary_prompt)
             logger.info(f"📝 Summary: {summary_text[:60]}...")
-            # Replace all history with 1 summarized message
+            # Replace history with 1 summarized message (เก็บ system prompt ตั้งต้นไว้ เพราะมีเมนูและกติกา)
             self.sessions[session_id]["messages"] = [
+                messages[0],
                 {"role": "system", "content": summary_text}
             ]
-        return self.sessions[session_id]["messages"]
+            messages = self.sessions[session_id]["messages"]
+
+        if max_tokens is None:
+            return messages
+
+        split = 0
+        while split < len(messages) and messages[split]["role"] == "system":
+            split += 1
+        packed = context_builder.pack_messages(
+            messages[:split], messages[split:], budget=max_tokens, label=f"[{session_id}] VERA context"
+        )
+        return packed.messages
 
     def add_user_message(self, session_id: str, text: str):
         self.sessions[session_id]["messages"].append({"role": "user", "content": text})
@@ -1,17 +1,29 @@
 from google.cloud import texttospeech
 from server.config.config import TTS_PROVIDER
+from core.audio.tts_cache import tts_cache, make_cache_key
+from core.audio.tts_manager import get_tts_client
 from core.utils.logger_config import get_logger
 import os
 
 logger = get_logger(__name__)
 
-def generate_tts(text: str, output_path: str):
+VOICE_LANGUAGE_CODE = "th-TH"
+VOICE_NAME = "th-TH-Standard-A"  # ✅ ปลอดภัย ใช้ได้ทั่วไป
+AUDIO_ENCODING = "MP3"
+
+def _is_ssml(text: str) -> bool:
+    return text.strip().startswith("<speak>")
+
+def tts_cache_key(text: str) -> str:
+    return make_cache_key(text, voice=VOICE_NAME, encoding=AUDIO_ENCODING, is_ssml=_is_ssml(text))
+
+def synthesize_tts_bytes(text: str) -> bytes:
     if TTS_PROVIDER == "GoogleCloudTTS":
 
-        client = texttospeech.TextToSpeechClient()
+        client = get_tts_client()
 
         # ตรวจว่าเป็น SSML หรือไม่
-        if text.strip().startswith("<speak>"):
+        if _is_ssml(text):
             synthesis_input = texttospeech.SynthesisInput(ssml=text)
             logger.info("🔤 Using SSML input")
         else:
@@ -19,11 +31,11 @@ def generate_tts(text: str, output_path: str):
             logger.info("🔤 Using plain text input")
 
         voice = texttospeech.VoiceSelectionParams(
-            language_code="th-TH",
-            name="th-TH-Standard-A"  # ✅ ปลอดภัย ใช้ได้ทั่วไป
+            language_code=VOICE_LANGUAGE_CODE,
+            name=VOICE_NAME
         )
         audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3
+            audio_encoding=texttospeech.AudioEncoding[AUDIO_ENCODING]
         )
 
         response = client.synthesize_speech(
@@ -31,11 +43,27 @@ def generate_tts(text: str, output_path: str):
             voice=voice,
             audio_config=audio_config
         )
-
-        with open(output_path, "wb") as out:
-            out.write(response.audio_content)
-        logger.info(f"🔊 TTS audio saved to: {output_path}")
+        return response.audio_content
 
     else:
         raise NotImplementedError(f"TTS provider '{TTS_PROVIDER}' is not supported.")
-    
\ No newline at end of file
+
+def generate_tts_bytes(text: str) -> bytes:
+    if tts_cache is not None:
+        return tts_cache.get_or_synthesize(tts_cache_key(text), lambda: synthesize_tts_bytes(text))
+    return synthesize_tts_bytes(text)
+
+def generate_tts(text: str, output_path: str):
+    audio = generate_tts_bytes(text)
+
+    with open(output_path, "wb") as out:
+        out.write(audio)
+    logger.info(f"🔊 TTS audio saved to: {output_path}")
+
+def warm_up_tts_cache(phrases: list) -> int:
+    """
+    สังเคราะห์ประโยคตายตัวด้วยเสียงของ VERA เก็บลง cache ล่วงหน้า
+    """
+    if tts_cache is None or not phrases:
+        return 0
+    return tts_cache.warm_up(phrases, synthesize=synthesize_tts_bytes, make_key=tts_cache_key)